@@ -1,26 +1,32 @@
 
 # backend/app.py
 import asyncio
+import hmac
+import json
 import logging
 import os
+import time
 import uuid
-from collections import defaultdict
 from datetime import datetime
 from pathlib import Path
 import uvicorn
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks,status
+from fastapi import FastAPI, Header, HTTPException, Request, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
 from langgraph.graph import END
-from vector_store_manager import load_all_vector_stores
+from vector_store_manager import (
+    load_all_vector_stores, embeddings, get_embedding_cache_stats, start_snapshot_worker, stop_snapshot_worker,
+    reload_vector_store, get_vector_store_info, DB_PATHS
+)
 from backend.services.youtube_service import process_youtube_url
 # --- NEW: Import StaticFiles ---
 from fastapi.staticfiles import StaticFiles
 
 # --- Import your Agent and WebSocket Manager ---
 try:
-    from backend.graph import CodeGenerationAgent as Graph
+    from backend.graph import get_agent
     from backend.services.websocket_manager import WebSocketManager
 except ImportError as e:
     print(f"Error importing agent components: {e}")
@@ -28,12 +34,23 @@ except ImportError as e:
     exit(1)
 
 from backend.services.update_KB_step1_service import AddKnowledgeBaseService1
+from backend.services.job_scheduler import JobScheduler, JobQueueFullError
+from backend.services.job_store import create_job_store
+from backend.services.answer_cache import AnswerCache, ANSWER_CACHE_ENABLED
+from backend.services.request_coalescer import RequestCoalescer
+from backend.utils.token_utils import summarize_token_usage
+import metrics
+from metrics import CallbackMetric, JOBS, JOB_SECONDS
 
 # --- Basic Setup ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 load_dotenv()
 
+# Shared secret for the /admin endpoints (sent as X-Admin-Key). While it is
+# unset, the admin endpoints refuse every request.
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "")
+
 # --- FastAPI App Initialization ---
 app = FastAPI(title="Verse Code Generation Agent API......")
 
@@ -48,9 +65,61 @@ app.add_middleware(
 #------Loading Vector stores------------
 load_all_vector_stores()
 
+#------Building the agent graph once for the whole process------------
+get_agent()
+
 # --- Singleton Instances ---
 manager = WebSocketManager()
-job_statuses = defaultdict(lambda: {"status": "pending", "result": None, "error": None})
+job_store = create_job_store()
+answer_cache = AnswerCache(embeddings)
+coalescer = RequestCoalescer()
+
+
+async def notify_queue_position(job_id: str, position: int, queue_depth: int):
+    """Tells a waiting job's subscribers where it is in the queue."""
+    await manager.broadcast_to_job(job_id, {
+        "type": "queue_position",
+        "data": {"position": position, "queue_depth": queue_depth}
+    })
+
+scheduler = JobScheduler(on_queue_position=notify_queue_position)
+
+# --- Metrics read from their owners at scrape time ---
+CallbackMetric("verse_agent_jobs_in_flight", "Jobs currently running on a worker.", lambda: scheduler.running_count)
+CallbackMetric("verse_agent_queue_depth", "Jobs waiting for a worker.", lambda: scheduler.queue_depth)
+CallbackMetric(
+    "verse_agent_websocket_connections", "Open job status WebSocket connections.",
+    lambda: sum(len(connections) for connections in manager.active_connections.values())
+)
+CallbackMetric(
+    "verse_agent_answer_cache_lookups_total", "Answer cache lookups, by result.",
+    lambda: {(result,): answer_cache.stats()[key] for result, key in (("exact", "exact_hits"), ("semantic", "semantic_hits"), ("miss", "misses"))},
+    metric_type="counter", labelnames=["result"]
+)
+CallbackMetric(
+    "verse_agent_embedding_cache_lookups_total", "Embedding cache lookups, by result.",
+    lambda: {(result,): get_embedding_cache_stats()[key] for result, key in (("memory_hit", "hits"), ("disk_hit", "disk_hits"), ("miss", "misses"))},
+    metric_type="counter", labelnames=["result"]
+)
+
+
+@app.on_event("startup")
+async def start_job_scheduler():
+    await scheduler.start()
+    start_snapshot_worker()
+    # Create the cached system prompts before the first job needs them
+    if get_agent().prompt_cache:
+        await get_agent().prompt_cache.warm()
+
+
+@app.on_event("shutdown")
+async def stop_job_scheduler():
+    await scheduler.stop()
+    if get_agent().prompt_cache:
+        await get_agent().prompt_cache.close()
+    # Folds the knowledge base write-ahead log into the saved index
+    await asyncio.get_running_loop().run_in_executor(None, stop_snapshot_worker)
+    await job_store.close()
 
 
 # --- Pydantic Models for API Requests ---
@@ -66,36 +135,96 @@ class YouTubeSummarizationRequest(BaseModel):
     youtube_url: str = Field(..., description="The URL of the YouTube video to summarize.")
 
 
+async def set_job_status(job_id: str, status: str, result: str = None, error: str = None, usage: dict = None):
+    """Records a job's status, and that of every job coalesced into it."""
+    for affected_job_id in [job_id, *coalescer.followers(job_id)]:
+        await job_store.set(affected_job_id, status, result=result, error=error, usage=usage)
+
+
+async def complete_from_cache(job_id: str, hit: dict):
+    """Finishes a job with a cached answer instead of running the agent."""
+    logger.info(f"Job {job_id} served from the answer cache ({hit['match']} match, similarity {hit['similarity']:.3f}).")
+    await set_job_status(job_id, "completed", result=hit["final_code"])
+    await manager.broadcast_to_job(job_id, {
+        "type": "final_result",
+        "data": {
+            "status": "complete",
+            "final_code": hit["final_code"],
+            "cached": True,
+            "cache_match": hit["match"],
+            "similarity": hit["similarity"],
+            "cached_question": hit["cached_question"]
+        }
+    })
+
+
 # --- Background Task to Run the Agent ---
 async def process_code_generation(job_id: str, request: GenerationRequest):
     """
-    This function runs in the background, creating an agent instance and
-    executing its `run` method.
+    This function runs in the background, executing the shared agent's
+    `run` method with this job's id and the WebSocket manager.
+    Jobs coalesced into this one receive the same events and result.
     """
     logger.info(f"Starting agent processing for job_id: {job_id}")
-    job_statuses[job_id] = {"status": "processing", "result": None, "error": None}
+    await set_job_status(job_id, "processing")
+    # Marks the end of queueing; node timings are measured from here
+    await manager.send_status_update(job_id, "processing")
+    started = time.perf_counter()
+    outcome = "failed"
     
     final_state_result = None
+    token_usage = []
     try:
-        agent = Graph(
-            websocket_manager=manager, 
-            job_id=job_id
-        )
+        if ANSWER_CACHE_ENABLED:
+            hit = await answer_cache.lookup(request.user_question)
+            if hit and (hit["match"] == "exact" or answer_cache.near_match_mode == "serve"):
+                await complete_from_cache(job_id, hit)
+                outcome = "cached"
+                return
+            if hit:
+                # Offer the near-duplicate answer right away; the agent still runs.
+                await manager.broadcast_to_job(job_id, {
+                    "type": "cached_suggestion",
+                    "data": {
+                        "final_code": hit["final_code"],
+                        "similarity": hit["similarity"],
+                        "cached_question": hit["cached_question"]
+                    }
+                })
+
+        agent = get_agent()
 
         final_state_result = None  # Initialize to None before the loop
 
         # This loop will run for every step in the graph
-        async for state_update in agent.run(user_question=request.user_question, max_iterations=3, thread={}):
+        async for state_update in agent.run(
+            user_question=request.user_question,
+            max_iterations=3,
+            thread={},
+            job_id=job_id,
+            websocket_manager=manager,
+        ):
             #logger.info(f"my states:--------------------{state_update}")
             final_state_result = state_update
+            # Each LLM node returns the job's usage list so far
+            for node_update in state_update.values():
+                if isinstance(node_update, dict) and node_update.get("token_usage"):
+                    token_usage = node_update["token_usage"]
 
+        usage = summarize_token_usage(token_usage)
         if final_state_result:
             final_code=final_state_result["OutputParserNode"].get("final_code")
-            logger.info(f"Job {job_id} completed successfully.")
-            job_statuses[job_id] = {"status": "completed", "result": final_code}
+            logger.info(
+                f"Job {job_id} completed successfully "
+                f"({usage['input_tokens']} input / {usage['output_tokens']} output tokens in {len(token_usage)} LLM calls)."
+            )
+            await set_job_status(job_id, "completed", result=final_code, usage=usage)
+            outcome = "completed"
+            if ANSWER_CACHE_ENABLED:
+                await answer_cache.store(request.user_question, final_code)
             await manager.broadcast_to_job(job_id, {
                 "type": "final_result",
-                "data": {"status": "complete", "final_code": final_code}
+                "data": {"status": "complete", "final_code": final_code, "token_usage": usage}
             })
         else:
             # This will handle the case where the graph ended but final_code wasn't produced
@@ -105,6 +234,7 @@ async def process_code_generation(job_id: str, request: GenerationRequest):
                 error_message = final_state_result.get("build_error_feedback", error_message)
                 
             logger.error(f"Job {job_id} failed: {error_message}")
+            await set_job_status(job_id, "failed", error=error_message, usage=usage)
             await manager.broadcast_to_job(job_id, {
                 "type": "error",
                 "data": {"status": "failed", "message": error_message}
@@ -114,42 +244,140 @@ async def process_code_generation(job_id: str, request: GenerationRequest):
     except Exception as e:
         logger.error(f"Error processing job {job_id}: {e}", exc_info=True)
         error_message = f"An error occurred: {e}"
-        job_statuses[job_id] = {"status": "failed", "error": error_message}
+        await set_job_status(job_id, "failed", error=error_message, usage=summarize_token_usage(token_usage))
         await manager.broadcast_to_job(job_id, {
             "type": "error",
             "data": {"status": "failed", "message": error_message}
         })
+    finally:
+        JOBS.inc(outcome=outcome)
+        JOB_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+        # Followers that joined after the final status was set get it now
+        final_record = await job_store.get(job_id)
+        for follower_job_id in coalescer.finish(request.user_question, job_id):
+            if final_record:
+                await job_store.set(
+                    follower_job_id, final_record["status"],
+                    result=final_record["result"], error=final_record["error"], usage=final_record["usage"]
+                )
+        manager.detach_followers(job_id)
 
 
 # --- API Endpoints ---
 
 @app.post("/generate-code", summary="Start Code Generation Job")
-async def generate_code(request: GenerationRequest, background_tasks: BackgroundTasks):
+async def generate_code(request: GenerationRequest):
     job_id = str(uuid.uuid4())
     logger.info(f"Received generation request. Assigned job_id: {job_id}")
+
+    # Exact repeats are answered without queueing or calling any model
+    cached = answer_cache.get_exact(request.user_question) if ANSWER_CACHE_ENABLED else None
+    if cached:
+        await complete_from_cache(job_id, cached)
+        return {
+            "message": "Served from the answer cache.",
+            "job_id": job_id,
+            "queue_position": None,
+            "cached": True,
+            "final_code": cached["final_code"],
+            "websocket_url": f"/ws/status/{job_id}"
+        }
     
-    background_tasks.add_task(process_code_generation, job_id, request)
+    # The same question is already queued or running: share that execution
+    leader_job_id = coalescer.in_flight_leader(request.user_question)
+    if leader_job_id:
+        # Written before joining: once it is a follower, the leader's status
+        # updates cover it, and this copy must not land after them.
+        leader_status = await job_store.get(leader_job_id) or {"status": "queued"}
+        await job_store.set(job_id, leader_status["status"])
+    if leader_job_id and coalescer.in_flight_leader(request.user_question) == leader_job_id:
+        coalescer.add_follower(leader_job_id, job_id)
+        await manager.attach_follower(job_id, leader_job_id)
+        return {
+            "message": "An identical request is already in progress. Connect to the WebSocket for real-time updates.",
+            "job_id": job_id,
+            "coalesced_with": leader_job_id,
+            "queue_position": scheduler.queue_position(leader_job_id),
+            "websocket_url": f"/ws/status/{job_id}"
+        }
+
+    # Jobs wait in a bounded queue for one of a fixed number of workers
+    try:
+        queue_position = scheduler.submit(job_id, lambda: process_code_generation(job_id, request))
+    except JobQueueFullError as e:
+        logger.warning(f"Rejected job {job_id}: queue is full.")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The server is busy. Please retry later.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    # Registered before the first await, so the job cannot finish unregistered
+    coalescer.register_leader(request.user_question, job_id)
+    await job_store.set(job_id, "queued")
     
     return {
         "message": "Code generation process started. Connect to the WebSocket for real-time updates.",
         "job_id": job_id,
+        "queue_position": queue_position,
         "websocket_url": f"/ws/status/{job_id}"
     }
 
 
+@app.get("/jobs/{job_id}", summary="Get the status of a Code Generation Job")
+async def get_job_status(job_id: str):
+    current_status = await job_store.get(job_id)
+    if current_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found or expired."
+        )
+    leader_job_id = coalescer.leader_of(job_id) or job_id
+    return {"job_id": job_id, **current_status, "queue_position": scheduler.queue_position(leader_job_id)}
+
+
+@app.get("/cache/stats", summary="Answer and embedding cache statistics")
+async def get_cache_stats():
+    return {
+        "answer_cache": answer_cache.stats(),
+        "embedding_cache": get_embedding_cache_stats(),
+        "prompt_cache": get_agent().prompt_cache.stats() if get_agent().prompt_cache else None
+    }
+
+
+@app.get("/metrics", summary="Prometheus metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.websocket("/ws/status/{job_id}")
 async def websocket_status_endpoint(websocket: WebSocket, job_id: str):
+    """
+    Streams a job's events. Everything broadcast before the client connected
+    is replayed first; a reconnecting client can pass `?last_seq=<n>` to only
+    receive the events it missed.
+    """
     await websocket.accept()
+
+    try:
+        last_seq = int(websocket.query_params.get("last_seq", 0))
+    except ValueError:
+        last_seq = 0
+
+    ack = None
+    current_status = await job_store.get(job_id)
+    if current_status is not None:
+        ack = {
+            "type": "connection_ack",
+            "data": {
+                "current_status": current_status,
+                "queue_position": scheduler.queue_position(coalescer.leader_of(job_id) or job_id),
+                "latest_seq": manager.latest_seq(job_id)
+            }
+        }
     
-    await manager.connect(websocket, job_id)
+    await manager.connect(websocket, job_id, last_seq=last_seq, ack=ack)
     logger.info(f"Client connected to WebSocket for job_id: {job_id}")
     try:
-        if job_id in job_statuses:
-             await websocket.send_json({
-                 "type": "connection_ack",
-                 "data": {"current_status": job_statuses[job_id]}
-            })
-        
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
@@ -193,6 +421,115 @@ async def add_knowledge1_entry(entry: KnowledgeBase1Request):
         )
 
 
+async def _ndjson_records(request: Request):
+    """Yields one parsed record per NDJSON line as the body streams in (None for bad lines)."""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    yield None
+    if buffer.strip():
+        try:
+            yield json.loads(buffer)
+        except json.JSONDecodeError:
+            yield None
+
+
+async def _json_array_records(records: list):
+    for record in records:
+        yield record
+
+
+@app.post("/add-knowledge1/bulk", summary="Add many entries to the step1 Knowledge Base")
+async def add_knowledge1_bulk(request: Request):
+    """
+    Receives many question / Verse code pairs, either as a JSON array or as
+    NDJSON (`Content-Type: application/x-ndjson`, one object per line), embeds
+    them in batches and adds them to the live knowledge base in one write.
+    Returns a result for every record read; records past KB_BULK_MAX_RECORDS
+    are ignored and reported by one "truncated" result.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        records = _ndjson_records(request)
+    else:
+        try:
+            body = json.loads(await request.body())
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The body is not valid JSON.")
+        if not isinstance(body, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a JSON array of entries.")
+        records = _json_array_records(body)
+
+    service = AddKnowledgeBaseService1()
+    try:
+        results = await service.add_entries(records)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+    counts = {"added": 0, "invalid": 0, "failed": 0}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    return {
+        "status": "success" if counts["added"] == len(results) else "partial",
+        **counts,
+        "results": results
+    }
+
+
+
+
+# --- Vector Store Administration ---
+vector_store_reloads = {}
+
+
+def require_admin(x_admin_key: str):
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin endpoints are disabled: ADMIN_API_KEY is not set.")
+    if not hmac.compare_digest(x_admin_key.encode("utf-8"), ADMIN_API_KEY.encode("utf-8")):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin key.")
+
+
+async def run_vector_store_reload(name: str):
+    """Loads the published version off the event loop, then swaps it in."""
+    try:
+        version = await asyncio.get_running_loop().run_in_executor(None, reload_vector_store, name)
+        vector_store_reloads[name] = {"status": "completed", "version": version, "error": None}
+    except Exception as e:
+        logger.error(f"Reloading vector store '{name}' failed: {e}", exc_info=True)
+        vector_store_reloads[name] = {"status": "failed", "version": None, "error": str(e)}
+
+
+@app.get("/admin/vector-stores", summary="Versions of the loaded vector stores")
+async def list_vector_stores(x_admin_key: str = Header(default="")):
+    require_admin(x_admin_key)
+    info = get_vector_store_info()
+    for name in info:
+        info[name]["last_reload"] = vector_store_reloads.get(name)
+    return info
+
+
+@app.post("/admin/vector-stores/{name}/reload", status_code=status.HTTP_202_ACCEPTED,
+          summary="Load the published version of a vector store without downtime")
+async def reload_vector_store_endpoint(name: str, x_admin_key: str = Header(default="")):
+    """
+    Loads the currently published version of a store in the background and
+    atomically swaps it in. Queries already running finish on the old version.
+    """
+    require_admin(x_admin_key)
+    if name not in DB_PATHS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown vector store '{name}'.")
+    if vector_store_reloads.get(name, {}).get("status") == "running":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"'{name}' is already being reloaded.")
+
+    vector_store_reloads[name] = {"status": "running", "version": None, "error": None}
+    asyncio.create_task(run_vector_store_reload(name))
+    return {"message": f"Reloading '{name}'.", "status_url": "/admin/vector-stores"}
 
 
 # # --- NEW: YouTube Summarization Endpoint ---
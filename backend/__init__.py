@@ -32,8 +32,8 @@ if not os.getenv("GOOGLE_API_KEY"):
 # --- Define the Public API for this Package ---
 
 # Import the main agent class from your graph module
-from .graph import CodeGenerationAgent
+from .graph import CodeGenerationAgent, get_agent
 
 # This line controls what is imported with 'from backend import *'
 # It makes your package cleaner to use.
-__all__ = ["CodeGenerationAgent"]
\ No newline at end of file
+__all__ = ["CodeGenerationAgent", "get_agent"]
\ No newline at end of file
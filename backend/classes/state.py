@@ -61,6 +61,8 @@ class AgentState(TypedDict, total=False):
     
     # === LLM INTERACTION ===
     messages: List[Dict[str, Any]]
+    # One {"call", "input_tokens", "output_tokens", "total_tokens"} entry per LLM call
+    token_usage: List[Dict[str, Any]]
     
     # === GENERATION & REFINEMENT LOOP ===
     iterations: int
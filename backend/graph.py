@@ -1,14 +1,14 @@
 # backend/graph.py
 
-import os
+import inspect
 import logging
+import threading
 from dotenv import load_dotenv
-from typing import Any, AsyncIterator, Dict
+from typing import Any, AsyncIterator, Dict, Optional
 
 # LangChain and LangGraph imports
 from langgraph.graph import StateGraph, END, START
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 # --- Import all our custom agent components ---
 
@@ -24,6 +24,14 @@ from backend.nodes.correct_verse_code_node import CorrectionNode
 from backend.nodes.build_check_node import BuildCheckNode
 from backend.nodes.OutputParserNode import OutputParserNode
 
+# Per-node timing and prompt size estimates
+from metrics import NODE_SECONDS
+from backend.utils.token_utils import estimate_tokens
+
+# Chat model backends (Gemini, or the fake one for benchmarks)
+from backend.services.chat_model_provider import create_chat_model
+from backend.services.prompt_cache import cached_prefix_chain, create_prompt_cache, render_static_system_prompt
+
 # RAG services
 from backend.services.step1_rag_service import gen_RagService
 from backend.services.step2_rag_service import correct_RagService
@@ -41,6 +49,17 @@ load_dotenv()
 logger.info("Environment variables loaded if .env file exists.")
 
 
+def _timed_node(name: str, node_run):
+    """Wraps a (sync or async) node function to record its duration."""
+    async def run(state: AgentState):
+        with NODE_SECONDS.time(node=name):
+            result = node_run(state)
+            if inspect.isawaitable(result):
+                result = await result
+        return result
+    return run
+
+
 # =================================================================================
 # AGENT CLASS
 # =================================================================================
@@ -49,22 +68,24 @@ class CodeGenerationAgent:
     """
     Encapsulates the entire state, tools, and logic for the Verse code generation agent.
     This class sets up the graph and provides a simple interface to run it.
+
+    Building the agent (LLM client, prompt templates, RAG services and the
+    compiled graph) is expensive, so one instance is shared by all jobs via
+    `get_agent()`; job-specific data is passed to `run` and travels in the
+    graph state.
     """
 
-    def __init__(self, websocket_manager=None, job_id=None,user_question=None,max_iterations=None):
+    def __init__(self, websocket_manager=None, job_id=None):
         """
-        Initializes the agent for a specific job, setting up all dependencies.
+        Sets up all dependencies and compiles the graph.
+
+        Args:
+            websocket_manager: Default manager for WebSocket updates, used when
+                `run` is not given one.
+            job_id: Default job id, used when `run` is not given one.
         """
         self.websocket_manager = websocket_manager
         self.job_id = job_id
-        self.initial_state = AgentState(
-            original_question=user_question,
-            job_id=self.job_id,
-            websocket_manager=self.websocket_manager,
-            max_iterations=max_iterations,
-            messages=[],
-            iterations=0,
-        )
         self._initialize_dependencies()
         self._build_graph()
 
@@ -75,11 +96,10 @@ class CodeGenerationAgent:
         logger.info("Initializing agent dependencies...")
         
         # --- LLM Model ---
-        self.model = ChatGoogleGenerativeAI(
-            model="gemini-2.5-pro-preview-05-06",
-            google_api_key=os.getenv("GOOGLE_API_KEY"),
-            temperature=0.1,
-        )
+        # Picked by LLM_PROVIDER; "fake" returns canned, schema-valid answers
+        self.model = create_chat_model()
+        # Provider-side cache of the static system prompts (None if disabled)
+        self.prompt_cache = create_prompt_cache()
 
         # --- Generation Chain ---
         self.history_placeholder = MessagesPlaceholder(variable_name="chat_history")
@@ -88,22 +108,46 @@ class CodeGenerationAgent:
             self.history_placeholder,
             ("user", step1_User_Template)], 
             template_format="jinja2")
-        self.code_gen_chain = self.code_gen_prompt_template | self.model.with_structured_output(VerseCodeSolution)
+        # include_raw keeps the model's message, whose usage metadata has the token counts
+        if self.prompt_cache:
+            self.prompt_cache.register("step1_system", render_static_system_prompt(step1_CODE_GENERATION_System_PROMPT_TEMPLATE))
+            self.code_gen_chain = cached_prefix_chain(
+                self.prompt_cache, "step1_system", self.code_gen_prompt_template,
+                ChatPromptTemplate.from_messages([self.history_placeholder, ("user", step1_User_Template)], template_format="jinja2"),
+                self.model, VerseCodeSolution
+            )
+        else:
+            self.code_gen_chain = self.code_gen_prompt_template | self.model.with_structured_output(VerseCodeSolution, include_raw=True)
         
         # --- Correction Chain ---
         self.code_correct_prompt_template = ChatPromptTemplate.from_messages([
             ("system", step2_CODE_Correct_System_PROMPT_TEMPLATE), 
             ("user", step2_Code_correct_user_prompt)
         ], template_format="jinja2")
-        self.code_correct_chain = self.code_correct_prompt_template | self.model.with_structured_output(CorrectingCodeSolution)
+        if self.prompt_cache:
+            self.prompt_cache.register("step2_system", render_static_system_prompt(step2_CODE_Correct_System_PROMPT_TEMPLATE))
+            self.code_correct_chain = cached_prefix_chain(
+                self.prompt_cache, "step2_system", self.code_correct_prompt_template,
+                ChatPromptTemplate.from_messages([("user", step2_Code_correct_user_prompt)], template_format="jinja2"),
+                self.model, CorrectingCodeSolution
+            )
+        else:
+            self.code_correct_chain = self.code_correct_prompt_template | self.model.with_structured_output(CorrectingCodeSolution, include_raw=True)
         
         # --- Services ---
         self.gen_rag_service = gen_RagService()
         self.correct_rag_service = correct_RagService()
         
         # --- Nodes ---
-        self.generator_node = GenerationNode(code_gen_chain=self.code_gen_chain, rag_service=self.gen_rag_service)
-        self.correction_node = CorrectionNode(code_correct_chain=self.code_correct_chain, device_rag_service=self.correct_rag_service)
+        # The static templates count against each call's prompt budget
+        self.generator_node = GenerationNode(
+            code_gen_chain=self.code_gen_chain, rag_service=self.gen_rag_service,
+            prompt_overhead_tokens=estimate_tokens(step1_CODE_GENERATION_System_PROMPT_TEMPLATE, step1_User_Template)
+        )
+        self.correction_node = CorrectionNode(
+            code_correct_chain=self.code_correct_chain, device_rag_service=self.correct_rag_service,
+            prompt_overhead_tokens=estimate_tokens(step2_CODE_Correct_System_PROMPT_TEMPLATE, step2_Code_correct_user_prompt)
+        )
         self.build_check_node = BuildCheckNode()
         self.OutputParserNode = OutputParserNode()
         logger.info("All agent dependencies initialized.")
@@ -114,12 +158,12 @@ class CodeGenerationAgent:
         """
         self.workflow = StateGraph(AgentState)
         
-        # Add nodes
-        self.workflow.add_node("generator", self.generator_node.run)
+        # Add nodes (each one timed into the node histogram)
+        self.workflow.add_node("generator", _timed_node("generator", self.generator_node.run))
         # Using the name 'corrector' for clarity, as it runs the CorrectionNode
-        self.workflow.add_node("corrector", self.correction_node.run)
-        self.workflow.add_node("build_checker", self.build_check_node.run)
-        self.workflow.add_node("OutputParserNode", self.OutputParserNode.run)
+        self.workflow.add_node("corrector", _timed_node("corrector", self.correction_node.run))
+        self.workflow.add_node("build_checker", _timed_node("build_checker", self.build_check_node.run))
+        self.workflow.add_node("OutputParserNode", _timed_node("OutputParserNode", self.OutputParserNode.run))
 
         # Define graph edges
         self.workflow.set_entry_point("generator")
@@ -156,27 +200,40 @@ class CodeGenerationAgent:
 
 
 
-    async def run(self, thread: Dict[str, Any], user_question: str, max_iterations: int = 3) -> AsyncIterator[Dict[str, Any]]:
+    async def run(
+        self,
+        thread: Dict[str, Any],
+        user_question: str,
+        max_iterations: int = 3,
+        job_id: Optional[str] = None,
+        websocket_manager: Optional[Any] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
         """
         The public method to execute the agent's workflow. The name 'run' is kept
         to match the reference project's style.
+
+        The compiled graph is shared, so everything that belongs to one job is
+        passed in here and carried in the initial state.
         """
+        job_id = job_id or self.job_id
+        websocket_manager = websocket_manager or self.websocket_manager
         initial_state = AgentState(
             original_question=user_question,
-            job_id=self.job_id,
-            websocket_manager=self.websocket_manager,
+            job_id=job_id,
+            websocket_manager=websocket_manager,
             max_iterations=max_iterations,
             messages=[],
+            token_usage=[],
             iterations=0,
         )
-        logger.info(f"Starting agent stream for job_id: {self.job_id}")
+        logger.info(f"Starting agent stream for job_id: {job_id}")
 
         async for state in self.compiled_graph.astream(initial_state,thread):
-            if self.websocket_manager and self.job_id:
-                await self._handle_ws_update(state)
+            if websocket_manager and job_id:
+                await self._handle_ws_update(state, job_id, websocket_manager)
             yield state
 
-    async def _handle_ws_update(self, state: Dict[str, Any]):
+    async def _handle_ws_update(self, state: Dict[str, Any], job_id: str, websocket_manager: Any):
         """Handle WebSocket updates based on state changes"""
         update = {
             "type": "state_update",
@@ -184,14 +241,31 @@ class CodeGenerationAgent:
                 "current_node": list(state.keys())[0]
             }
         }
-        await self.websocket_manager.broadcast_to_job(
-            self.job_id,
+        await websocket_manager.broadcast_to_job(
+            job_id,
             update
         )
     
     def compile(self):
         graph = self.compiled_graph
         return graph
-    
-   
 
+
+# =================================================================================
+# PROCESS-WIDE AGENT FACTORY
+# =================================================================================
+
+_shared_agent: Optional[CodeGenerationAgent] = None
+_shared_agent_lock = threading.Lock()
+
+
+def get_agent() -> CodeGenerationAgent:
+    """
+    Returns the process-wide agent, building and compiling it on first use.
+    """
+    global _shared_agent
+    if _shared_agent is None:
+        with _shared_agent_lock:
+            if _shared_agent is None:
+                _shared_agent = CodeGenerationAgent()
+    return _shared_agent
@@ -3,6 +3,9 @@
 import logging
 from langchain_core.runnables import Runnable
 
+from backend.utils.token_utils import context_token_budget, structured_output_usage
+from metrics import LLM_ERRORS, LLM_SECONDS
+
 # Import the RAG service specialized for fetching device context
 from backend.services.step2_rag_service import correct_RagService
 
@@ -21,16 +24,20 @@ class  CorrectionNode:
     4. Saving the final, polished code to the agent's state.
     """
 
-    def __init__(self, code_correct_chain: Runnable, device_rag_service: correct_RagService):
+    def __init__(self, code_correct_chain: Runnable, device_rag_service: correct_RagService, prompt_overhead_tokens: int = 0):
         """
         Initializes the node with its required dependencies.
         
         Args:
             code_correct_chain: An initialized LangChain runnable for correcting and refining Verse code.
+                Its structured output must be built with `include_raw=True`.
             device_rag_service: A service object for fetching context about specific Verse devices.
+            prompt_overhead_tokens: Estimated tokens of the static prompt
+                templates, counted against the prompt budget.
         """
         self.code_correct_chain = code_correct_chain
         self.device_rag_service = device_rag_service
+        self.prompt_overhead_tokens = prompt_overhead_tokens
 
     async def refine(self, state: AgentState) -> dict:
         """
@@ -51,7 +58,12 @@ class  CorrectionNode:
         
         try:
             # The service takes the list of devices and returns relevant documentation/examples
-            device_context = await self.device_rag_service.fetch_device_context(devices_used)
+            device_context = await self.device_rag_service.fetch_device_context(
+                devices_used,
+                events_used=events_used,
+                draft_code=draft_solution_verse_code,
+                max_tokens=context_token_budget(draft_solution_verse_code, fixed_tokens=self.prompt_overhead_tokens)
+            )
             logger.info("Successfully fetched device-specific context.")
         except Exception as e:
             logger.error(f"---ERROR in Device RAG Service: {e}---", exc_info=True)
@@ -62,10 +74,17 @@ class  CorrectionNode:
         try:
             # Using the exact keys from your chain definition
             # The output should be a `CorrectingCodeSolution` Pydantic model
-            corrected_solution: CorrectingCodeSolution = await self.code_correct_chain.ainvoke({
-                "Generated_Verse_Code": draft_solution_verse_code,
-                "Device_Context": device_context
-            })
+            try:
+                with LLM_SECONDS.time(chain="correct"):
+                    response = await self.code_correct_chain.ainvoke({
+                        "Generated_Verse_Code": draft_solution_verse_code,
+                        "Device_Context": device_context
+                    })
+                corrected_solution: CorrectingCodeSolution
+                corrected_solution, usage = structured_output_usage("correct", response)
+            except Exception:
+                LLM_ERRORS.inc(chain="correct")
+                raise
             
             # --- 4. Process the Output and Prepare State Update ---
             logger.info("---SUCCESS: Code refinement complete---")
@@ -76,6 +95,7 @@ class  CorrectionNode:
             # Construct the final state update
             updated_state = {
                 "final_code": corrected_verse_code,
+                "token_usage": state.get("token_usage", []) + [usage],
                 "build_error_flag": False,
                 "build_error_feedback": ""
             }
@@ -3,6 +3,9 @@
 import logging
 from langchain_core.runnables import Runnable
 
+from backend.utils.token_utils import context_token_budget, structured_output_usage
+from metrics import LLM_ERRORS, LLM_SECONDS
+
 # We need a placeholder for the RAG service that will be injected.
 from backend.services.step1_rag_service import gen_RagService 
 
@@ -18,16 +21,20 @@ class GenerationNode:
     It can learn from validation feedback and retry.
     """
 
-    def __init__(self, code_gen_chain: Runnable, rag_service: gen_RagService ):
+    def __init__(self, code_gen_chain: Runnable, rag_service: gen_RagService, prompt_overhead_tokens: int = 0):
         """
         Initializes the node with its required dependencies.
         
         Args:
             code_gen_chain: An initialized LangChain runnable that includes a MessagesPlaceholder.
+                Its structured output must be built with `include_raw=True`.
             rag_service: A service object for fetching RAG context.
+            prompt_overhead_tokens: Estimated tokens of the static prompt
+                templates, counted against the prompt budget.
         """
         self.code_gen_chain = code_gen_chain
         self.rag_service = rag_service
+        self.prompt_overhead_tokens = prompt_overhead_tokens
 
     async def generate(self, state: AgentState) -> dict:
         """
@@ -43,7 +50,12 @@ class GenerationNode:
         if state.get("iterations", 0) <= 1:
             logger.info("First attempt: Fetching RAG context...")
             try:
-                rag_context = await self.rag_service.fetch_context(question)
+                # Whatever the prompts, question and history leave of the budget
+                max_tokens = context_token_budget(
+                    question, *(str(m.get("content", "")) for m in messages),
+                    fixed_tokens=self.prompt_overhead_tokens
+                )
+                rag_context = await self.rag_service.fetch_context(question, max_tokens=max_tokens)
                 logger.info("Successfully fetched RAG context.")
             except Exception as e:
                 logger.error(f"---ERROR in RAG Service: {e}---", exc_info=True)
@@ -68,11 +80,18 @@ class GenerationNode:
         # --- 3. Invoke the Generation Chain ---
         try:
             # The chain now accepts "chat_history" which is filled by the MessagesPlaceholder
-            code_solution: VerseCodeSolution= await self.code_gen_chain.ainvoke({
-                "user_question": question,
-                "helper_context": rag_context,
-                "chat_history": messages # Pass the entire conversation history
-            })
+            try:
+                with LLM_SECONDS.time(chain="generate"):
+                    response = await self.code_gen_chain.ainvoke({
+                        "user_question": question,
+                        "helper_context": rag_context,
+                        "chat_history": messages # Pass the entire conversation history
+                    })
+                code_solution: VerseCodeSolution
+                code_solution, usage = structured_output_usage("generate", response)
+            except Exception:
+                LLM_ERRORS.inc(chain="generate")
+                raise
             
             # --- 4. Process the Output and Prepare State Update ---
             logger.info("---SUCCESS: Code generation complete---")
@@ -93,6 +112,7 @@ class GenerationNode:
                 "draft_solution_verse_code": full_draft_code,
                 "devices_used": code_solution.devices_used,
                 "events_used": code_solution.events_used,
+                "token_usage": state.get("token_usage", []) + [usage],
                 "build_error_flag": False,
                 "build_error_feedback": "",
             }
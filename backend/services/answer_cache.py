@@ -0,0 +1,192 @@
+# backend/services/answer_cache.py
+
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- Answer Cache Configuration ---
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+# Minimum cosine similarity for a near-duplicate question to count as a hit.
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+# What to do with a near-duplicate hit: "serve" it as the job's result,
+# "offer" it to the client while the agent runs anyway, or "off".
+ANSWER_CACHE_NEAR_MATCH_MODE = os.getenv("ANSWER_CACHE_NEAR_MATCH_MODE", "offer")
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))
+
+
+def normalize_question(question: str) -> str:
+    """
+    Lowercases a question, collapses whitespace and drops trailing
+    punctuation, so trivially different phrasings share a cache key.
+    """
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip(" ?!.")
+
+
+def question_key(question: str) -> str:
+    return hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Caches the final code of finished generation jobs in front of the agent.
+
+    Exact repeats of a question (after normalization) are answered without
+    any model call. Near-duplicates are found by cosine similarity between
+    question embeddings, using the shared cached embeddings. Entries expire
+    after a TTL and the least recently used ones are evicted past a size cap.
+
+    All methods are meant to be called from the event loop.
+    """
+
+    def __init__(
+        self,
+        embeddings: Any,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        near_match_mode: str = ANSWER_CACHE_NEAR_MATCH_MODE,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            embeddings: A LangChain `Embeddings` used for the question vectors.
+            similarity_threshold: Minimum cosine similarity of a near-duplicate hit.
+            near_match_mode: "serve", "offer" or "off".
+            ttl_seconds: Age after which an entry is dropped.
+            max_entries: Maximum number of cached answers.
+            clock: Returns the current time in seconds, for entry ages.
+        """
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.near_match_mode = near_match_mode
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.clock = clock
+
+        # key -> (created_at, question, unit vector or None, final_code)
+        self._entries: "OrderedDict[str, Tuple[float, str, Optional[np.ndarray], str]]" = OrderedDict()
+        # Stacked unit vectors of the entries, rebuilt lazily after changes
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, entry: Tuple[float, str, Optional[np.ndarray], str], now: float) -> bool:
+        return now - entry[0] > self.ttl_seconds
+
+    def _evict(self, now: float) -> None:
+        # The order is by last use, not creation, so expired entries can sit
+        # anywhere; drop them all before trimming the least recently used.
+        evicted = {key for key, entry in self._entries.items() if self._expired(entry, now)}
+        overflow = len(self._entries) - len(evicted) - self.max_entries
+        for key in self._entries:
+            if overflow <= 0:
+                break
+            if key not in evicted:
+                evicted.add(key)
+                overflow -= 1
+        for key in evicted:
+            del self._entries[key]
+            self.evictions += 1
+        if evicted:
+            self._matrix = None
+
+    @staticmethod
+    def _hit(match: str, similarity: float, question: str, final_code: str) -> Dict[str, Any]:
+        return {"match": match, "similarity": similarity, "cached_question": question, "final_code": final_code}
+
+    def get_exact(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached answer to the same (normalized) question, or None.
+        This never calls the embedding model.
+        """
+        now = self.clock()
+        self._evict(now)
+        key = question_key(question)
+        entry = self._entries.get(key)
+        if entry is None or self._expired(entry, now):
+            return None
+        self._entries.move_to_end(key)
+        self.exact_hits += 1
+        return self._hit("exact", 1.0, entry[1], entry[3])
+
+    async def _embed(self, question: str) -> Optional[np.ndarray]:
+        try:
+            vector = np.asarray(await self.embeddings.aembed_query(normalize_question(question)), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Could not embed question for the answer cache: {e}")
+            return None
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+
+    def _similarity_matrix(self) -> Tuple[Optional[np.ndarray], List[str]]:
+        if self._matrix is None:
+            keys = [key for key, entry in self._entries.items() if entry[2] is not None]
+            self._matrix_keys = keys
+            self._matrix = np.vstack([self._entries[key][2] for key in keys]) if keys else None
+        return self._matrix, self._matrix_keys
+
+    async def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Looks a question up, first by exact key and then by similarity.
+
+        Returns:
+            `{"match", "similarity", "cached_question", "final_code"}` where
+            match is "exact" or "semantic", or None on a miss.
+        """
+        hit = self.get_exact(question)
+        if hit is not None:
+            return hit
+
+        if self.near_match_mode != "off" and self._entries:
+            vector = await self._embed(question)
+            matrix, keys = self._similarity_matrix()
+            if vector is not None and matrix is not None and matrix.shape[1] == vector.shape[0]:
+                similarities = matrix @ vector
+                best = int(np.argmax(similarities))
+                similarity = float(similarities[best])
+                entry = self._entries.get(keys[best])
+                if entry is not None and not self._expired(entry, self.clock()) and similarity >= self.similarity_threshold:
+                    self._entries.move_to_end(keys[best])
+                    self.semantic_hits += 1
+                    return self._hit("semantic", similarity, entry[1], entry[3])
+
+        self.misses += 1
+        return None
+
+    async def store(self, question: str, final_code: str) -> None:
+        """Caches the final code generated for a question."""
+        if not final_code:
+            return
+        vector = await self._embed(question) if self.near_match_mode != "off" else None
+        now = self.clock()
+        key = question_key(question)
+        self._entries.pop(key, None)
+        self._entries[key] = (now, question, vector, final_code)
+        self._matrix = None
+        self._evict(now)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "similarity_threshold": self.similarity_threshold,
+            "near_match_mode": self.near_match_mode,
+        }
@@ -0,0 +1,155 @@
+# backend/services/chat_model_provider.py
+
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import typing
+from typing import Any, Dict, Optional, Type
+
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import BaseModel
+
+from backend.classes.state import CorrectingCodeSolution, VerseCodeSolution
+from backend.utils.token_utils import estimate_tokens
+
+# Load environment variables at the earliest possible moment
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Chat Model Configuration ---
+# "google" (Gemini) or "fake", a local stub for benchmarks and offline runs
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "google").lower()
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-pro-preview-05-06")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.1"))
+# Simulated latency of one fake LLM call, +/- the jitter fraction
+FAKE_LLM_LATENCY_SECONDS = float(os.getenv("FAKE_LLM_LATENCY_SECONDS", "1.0"))
+FAKE_LLM_LATENCY_JITTER = float(os.getenv("FAKE_LLM_LATENCY_JITTER", "0.2"))
+
+PROVIDERS = ("google", "fake")
+
+
+class FakeStructuredChatModel:
+    """
+    A stand-in for the chat model that sleeps for a configurable time and
+    returns a schema-valid object, so the rest of the pipeline (RAG, graph,
+    job queue, WebSockets) can be measured without the LLM.
+
+    Only `with_structured_output` is supported, which is all the agent uses.
+    With `include_raw=True` the raw message carries estimated token usage.
+    """
+
+    def __init__(self, latency_seconds: float = FAKE_LLM_LATENCY_SECONDS, jitter: float = FAKE_LLM_LATENCY_JITTER,
+                 cached_content: Optional[str] = None):
+        self.latency_seconds = latency_seconds
+        self.jitter = jitter
+        self.cached_content = cached_content
+        self.calls = 0
+
+    def with_cached_content(self, cached_content: str) -> "FakeStructuredChatModel":
+        return FakeStructuredChatModel(self.latency_seconds, self.jitter, cached_content)
+
+    def _latency(self) -> float:
+        return max(0.0, self.latency_seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def with_structured_output(self, schema: Type[BaseModel], include_raw: bool = False, **kwargs: Any) -> Runnable:
+        def invoke(prompt: PromptValue) -> Any:
+            self.calls += 1
+            parsed = fake_solution(schema, prompt)
+            if not include_raw:
+                return parsed
+            input_tokens = estimate_tokens(prompt.to_string() if isinstance(prompt, PromptValue) else str(prompt))
+            output_tokens = estimate_tokens(parsed.model_dump_json())
+            raw = AIMessage(content="", usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            })
+            return {"raw": raw, "parsed": parsed, "parsing_error": None}
+
+        async def ainvoke(prompt: PromptValue) -> BaseModel:
+            await asyncio.sleep(self._latency())
+            return invoke(prompt)
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"Fake{schema.__name__}")
+
+
+def _prompt_digest(prompt: Any) -> str:
+    text = prompt.to_string() if isinstance(prompt, PromptValue) else str(prompt)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:8]
+
+
+def fake_solution(schema: Type[BaseModel], prompt: Any) -> BaseModel:
+    """Builds a deterministic, schema-valid answer to a prompt."""
+    digest = _prompt_digest(prompt)
+    code = (
+        f"fake_device_{digest} := class(creative_device):\n"
+        f"    @editable\n"
+        f"    Trigger : trigger_device = trigger_device{{}}\n\n"
+        f"    OnBegin<override>()<suspends> : void =\n"
+        f"        Trigger.TriggeredEvent.Subscribe(OnTriggered)\n\n"
+        f"    OnTriggered(Agent : ?agent) : void =\n"
+        f"        Print(\"Triggered\")"
+    )
+    imports = "using { /Fortnite.com/Devices }\nusing { /Verse.org/Simulation }"
+    if schema is VerseCodeSolution:
+        return VerseCodeSolution(
+            prefix=f"Fake solution {digest}.",
+            imports=imports,
+            code=code,
+            devices_used=["trigger_device"],
+            events_used=["trigger_device.TriggeredEvent"],
+            user_question_summary=f"Fake summary {digest}.",
+        )
+    if schema is CorrectingCodeSolution:
+        return CorrectingCodeSolution(
+            corrected_prefix=f"Fake correction {digest}.",
+            corrected_imports=imports,
+            corrected_code=code,
+        )
+
+    # Any other schema: placeholders for the required fields
+    values: Dict[str, Any] = {}
+    for name, field in schema.model_fields.items():
+        if not field.is_required():
+            continue
+        origin = typing.get_origin(field.annotation) or field.annotation
+        values[name] = [] if origin in (list, typing.List) else f"fake {name} {digest}"
+    return schema(**values)
+
+
+def with_cached_content(model: Any, cached_content: str) -> Any:
+    """
+    Returns a copy of a chat model whose requests run against a
+    provider-side cached prompt prefix (see prompt_cache.py).
+    """
+    if isinstance(model, FakeStructuredChatModel):
+        return model.with_cached_content(cached_content)
+    return model.model_copy(update={"cached_content": cached_content})
+
+
+def create_chat_model(provider: Optional[str] = None) -> Any:
+    """
+    Creates the agent's chat model for a provider (LLM_PROVIDER by default).
+    """
+    provider = (provider or LLM_PROVIDER).lower()
+    if provider == "google":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        return ChatGoogleGenerativeAI(
+            model=GEMINI_MODEL,
+            google_api_key=os.getenv("GOOGLE_API_KEY"),
+            temperature=LLM_TEMPERATURE,
+        )
+    if provider == "fake":
+        logger.warning(
+            f"Using the fake chat model ({FAKE_LLM_LATENCY_SECONDS}s +/- {FAKE_LLM_LATENCY_JITTER:.0%} per call). "
+            "Answers are placeholders."
+        )
+        return FakeStructuredChatModel()
+    raise ValueError(f"Unknown LLM provider '{provider}'. Expected one of {PROVIDERS}.")
@@ -0,0 +1,145 @@
+# backend/services/job_scheduler.py
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- Scheduler Configuration ---
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "4"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "100"))
+# Assumed job duration until the first jobs have finished.
+DEFAULT_JOB_SECONDS = float(os.getenv("DEFAULT_JOB_SECONDS", "30"))
+
+JobFactory = Callable[[], Awaitable[None]]
+QueuePositionCallback = Callable[[str, int, int], Awaitable[None]]
+
+
+class JobQueueFullError(Exception):
+    """
+    Raised when a job is submitted while the queue is at capacity.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"The job queue is full. Retry after {retry_after} seconds.")
+        self.retry_after = retry_after
+
+
+class JobScheduler:
+    """
+    Runs code generation jobs on a fixed pool of worker tasks fed by a bounded
+    queue, so a burst of requests cannot start an unbounded number of
+    concurrent LLM calls and searches.
+    """
+
+    def __init__(
+        self,
+        worker_count: int = MAX_CONCURRENT_JOBS,
+        max_queue_size: int = MAX_QUEUED_JOBS,
+        on_queue_position: Optional[QueuePositionCallback] = None,
+    ):
+        """
+        Args:
+            worker_count: Number of jobs that may run at the same time.
+            max_queue_size: Number of jobs that may wait for a worker.
+            on_queue_position: Awaited with `(job_id, position, queue_depth)`
+                for every waiting job whenever the queue moves.
+        """
+        self.worker_count = max(1, worker_count)
+        self.max_queue_size = max(1, max_queue_size)
+        self.on_queue_position = on_queue_position
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: "OrderedDict[str, None]" = OrderedDict()
+        self._workers: List[asyncio.Task] = []
+        self.running_count = 0
+        self._average_job_seconds = DEFAULT_JOB_SECONDS
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of jobs waiting for a worker."""
+        return len(self._pending)
+
+    async def start(self):
+        """Starts the worker tasks. Call once the event loop is running."""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.worker_count)]
+        logger.info(f"Job scheduler started with {self.worker_count} workers and a queue of {self.max_queue_size}.")
+
+    async def stop(self):
+        """Cancels the worker tasks."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def retry_after_seconds(self) -> int:
+        """Estimated seconds until a queue slot frees up."""
+        return max(1, math.ceil(self._average_job_seconds / self.worker_count))
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """1-based position of a waiting job, or None if it is not waiting."""
+        for position, pending_id in enumerate(self._pending, start=1):
+            if pending_id == job_id:
+                return position
+        return None
+
+    def submit(self, job_id: str, job_factory: JobFactory) -> int:
+        """
+        Queues a job without waiting for it to run.
+
+        Args:
+            job_id: The id of the job.
+            job_factory: A zero-argument callable returning the coroutine to run.
+
+        Returns:
+            The job's 1-based position in the queue.
+
+        Raises:
+            JobQueueFullError: If the queue is at capacity.
+        """
+        if self._queue is None:
+            raise RuntimeError("JobScheduler.start() must be awaited before submitting jobs.")
+        try:
+            self._queue.put_nowait((job_id, job_factory))
+        except asyncio.QueueFull:
+            raise JobQueueFullError(self.retry_after_seconds())
+        self._pending[job_id] = None
+        return len(self._pending)
+
+    async def _notify_positions(self):
+        if not self.on_queue_position:
+            return
+        depth = len(self._pending)
+        for position, job_id in enumerate(list(self._pending), start=1):
+            try:
+                await self.on_queue_position(job_id, position, depth)
+            except Exception as e:
+                logger.warning(f"Failed to report queue position for job {job_id}: {e}")
+
+    async def _worker(self, worker_number: int):
+        while True:
+            job_id, job_factory = await self._queue.get()
+            self._pending.pop(job_id, None)
+            self.running_count += 1
+            started = time.monotonic()
+            try:
+                await self._notify_positions()
+                await job_factory()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Worker {worker_number} failed to run job {job_id}: {e}", exc_info=True)
+            finally:
+                self.running_count -= 1
+                elapsed = time.monotonic() - started
+                # Exponential moving average of job durations for Retry-After
+                self._average_job_seconds = 0.8 * self._average_job_seconds + 0.2 * elapsed
+                self._queue.task_done()
@@ -0,0 +1,194 @@
+# backend/services/job_store.py
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# --- Job Store Configuration ---
+JOB_STORE_BACKEND = os.getenv("JOB_STORE_BACKEND", "memory")   # "memory" or "sqlite"
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "jobs.sqlite")
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", "3600"))
+JOB_STORE_MAX_JOBS = int(os.getenv("JOB_STORE_MAX_JOBS", "1000"))
+
+UNFINISHED_STATUSES = ("queued", "processing")
+
+
+def _as_record(status: str, result: Optional[str], error: Optional[str], usage: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {"status": status, "result": result, "error": error, "usage": usage}
+
+
+class JobStore(ABC):
+    """
+    Keeps the status of code generation jobs with TTL and max-size eviction,
+    so a long-running server does not accumulate every job it ever ran.
+
+    The methods are coroutines so that stores doing I/O can keep it off the
+    event loop.
+    """
+
+    def __init__(self, ttl_seconds: float = JOB_TTL_SECONDS, max_jobs: int = JOB_STORE_MAX_JOBS):
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max(1, max_jobs)
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns `{"status", "result", "error", "usage"}` for a job, or None."""
+
+    @abstractmethod
+    async def set(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None,
+                  usage: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Creates or replaces the record of a job. `usage` is the job's token
+        usage summary.
+        """
+
+    @abstractmethod
+    async def count(self) -> int:
+        """The number of jobs currently kept."""
+
+    async def close(self) -> None:
+        """Releases the store's resources once pending writes are done."""
+
+
+class InMemoryJobStore(JobStore):
+    """
+    A bounded in-process job store. Records are kept in update order, so both
+    TTL and size eviction only ever look at the oldest entries.
+    """
+
+    def __init__(self, ttl_seconds: float = JOB_TTL_SECONDS, max_jobs: int = JOB_STORE_MAX_JOBS):
+        super().__init__(ttl_seconds, max_jobs)
+        # job_id -> (updated_at, status, result, error, usage)
+        self._jobs: "OrderedDict[str, Tuple[float, str, Optional[str], Optional[str], Optional[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        while self._jobs:
+            oldest_id, (updated_at, *_) = next(iter(self._jobs.items()))
+            if len(self._jobs) > self.max_jobs or now - updated_at > self.ttl_seconds:
+                del self._jobs[oldest_id]
+            else:
+                break
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._evict(time.time())
+            entry = self._jobs.get(job_id)
+        if entry is None:
+            return None
+        return _as_record(*entry[1:])
+
+    async def set(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None,
+                  usage: Optional[Dict[str, Any]] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._jobs[job_id] = (now, status, result, error, usage)
+            self._evict(now)
+
+    async def count(self) -> int:
+        with self._lock:
+            return len(self._jobs)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    A job store backed by a local SQLite file, so job state survives restarts.
+    Jobs that were still queued or running when the server stopped are marked
+    as failed on startup.
+
+    Every query runs on one dedicated thread: the event loop never waits on
+    SQLite or on a commit's fsync, and writes are applied in the order they
+    were made.
+    """
+
+    def __init__(self, path: str = JOB_STORE_PATH, ttl_seconds: float = JOB_TTL_SECONDS, max_jobs: int = JOB_STORE_MAX_JOBS):
+        super().__init__(ttl_seconds, max_jobs)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, status TEXT NOT NULL, result TEXT, error TEXT, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)")
+        # Files created before token accounting lack the usage column
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "usage" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN usage TEXT")
+        self._conn.execute(
+            f"UPDATE jobs SET status = 'failed', error = ? WHERE status IN ({','.join('?' * len(UNFINISHED_STATUSES))})",
+            ("The server restarted before the job finished.", *UNFINISHED_STATUSES),
+        )
+        self._evict(time.time())
+        self._conn.commit()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+        logger.info(f"Using SQLite job store at '{path}'.")
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM jobs WHERE updated_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM jobs WHERE job_id IN ("
+            "SELECT job_id FROM jobs ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_jobs,),
+        )
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT status, result, error, usage, updated_at FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None or time.time() - row[4] > self.ttl_seconds:
+            return None
+        return _as_record(*row[:3], json.loads(row[3]) if row[3] else None)
+
+    def _set(self, job_id: str, status: str, result: Optional[str], error: Optional[str],
+             usage: Optional[Dict[str, Any]], now: float) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO jobs (job_id, status, result, error, usage, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, status, result, error, json.dumps(usage) if usage is not None else None, now),
+        )
+        self._evict(now)
+        self._conn.commit()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get, job_id)
+
+    async def set(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None,
+                  usage: Optional[Dict[str, Any]] = None) -> None:
+        await self._run(self._set, job_id, status, result, error, usage, time.time())
+
+    async def count(self) -> int:
+        return await self._run(self._count)
+
+    async def close(self) -> None:
+        await self._run(self._conn.close)
+        self._executor.shutdown(wait=True)
+
+
+def create_job_store() -> JobStore:
+    """
+    Creates the job store selected by JOB_STORE_BACKEND.
+    """
+    if JOB_STORE_BACKEND == "sqlite":
+        try:
+            return SQLiteJobStore()
+        except sqlite3.Error as e:
+            logger.error(f"Could not open SQLite job store at '{JOB_STORE_PATH}': {e}. Falling back to memory.")
+    elif JOB_STORE_BACKEND != "memory":
+        logger.warning(f"Unknown JOB_STORE_BACKEND '{JOB_STORE_BACKEND}'. Using the in-memory job store.")
+    return InMemoryJobStore()
@@ -0,0 +1,281 @@
+# backend/services/prompt_cache.py
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from backend.services.chat_model_provider import LLM_PROVIDER, GEMINI_MODEL, with_cached_content
+
+# Load environment variables at the earliest possible moment
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Prompt Cache Configuration ---
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+# Lifetime of a provider-side cache; it is extended once less than the
+# refresh margin is left, and recreated if it expired anyway.
+PROMPT_CACHE_TTL_SECONDS = int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "3600"))
+PROMPT_CACHE_REFRESH_MARGIN_SECONDS = int(os.getenv("PROMPT_CACHE_REFRESH_MARGIN_SECONDS", "300"))
+# After a failed create/refresh, calls go uncached for this long before retrying.
+PROMPT_CACHE_RETRY_SECONDS = float(os.getenv("PROMPT_CACHE_RETRY_SECONDS", "300"))
+
+
+class GeminiCacheBackend:
+    """Stores prompt prefixes as Gemini cached content (client.caches)."""
+
+    def __init__(self, model_name: str = GEMINI_MODEL):
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from google import genai
+
+            self._client = genai.Client()
+        return self._client
+
+    async def create(self, key: str, text: str, ttl_seconds: int) -> str:
+        from google.genai import types
+
+        cache = await self.client.aio.caches.create(
+            model=self.model_name,
+            config=types.CreateCachedContentConfig(display_name=key, system_instruction=text, ttl=f"{ttl_seconds}s"),
+        )
+        return cache.name
+
+    async def refresh(self, name: str, ttl_seconds: int) -> None:
+        from google.genai import types
+
+        await self.client.aio.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=f"{ttl_seconds}s"))
+
+    async def delete(self, name: str) -> None:
+        await self.client.aio.caches.delete(name=name)
+
+
+class LocalCacheBackend:
+    """
+    An in-process stand-in for the provider cache, used with the fake chat
+    model and in tests. It honours TTLs, so expiry and refresh behave as
+    they do against Gemini.
+    """
+
+    def __init__(self):
+        # name -> (text, expires_at)
+        self.entries: Dict[str, Tuple[str, float]] = {}
+
+    def _alive(self, name: str) -> bool:
+        entry = self.entries.get(name)
+        return entry is not None and entry[1] > time.monotonic()
+
+    async def create(self, key: str, text: str, ttl_seconds: int) -> str:
+        name = f"cachedContents/local-{key}-{uuid.uuid4().hex[:8]}"
+        self.entries[name] = (text, time.monotonic() + ttl_seconds)
+        return name
+
+    async def refresh(self, name: str, ttl_seconds: int) -> None:
+        if not self._alive(name):
+            raise KeyError(f"Cached content {name} not found.")
+        self.entries[name] = (self.entries[name][0], time.monotonic() + ttl_seconds)
+
+    async def delete(self, name: str) -> None:
+        self.entries.pop(name, None)
+
+
+class _CachedPrefix:
+    def __init__(self, text: str):
+        self.text = text
+        self.name: Optional[str] = None
+        self.expires_at = 0.0
+        self.retry_at = 0.0
+        self.lock = asyncio.Lock()
+
+
+class PromptCache:
+    """
+    Keeps static prompt prefixes (the system prompts) registered as
+    provider-side cached content, so they are not resent and re-processed
+    on every call. Names are refreshed lazily: the call that finds a cache
+    close to expiry extends it.
+    """
+
+    def __init__(self, backend: Any, ttl_seconds: int = PROMPT_CACHE_TTL_SECONDS,
+                 refresh_margin_seconds: int = PROMPT_CACHE_REFRESH_MARGIN_SECONDS):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = min(refresh_margin_seconds, ttl_seconds // 2)
+        self._prefixes: Dict[str, _CachedPrefix] = {}
+        self.creates = 0
+        self.refreshes = 0
+        self.failures = 0
+        self.invalidations = 0
+
+    def register(self, key: str, text: str) -> None:
+        self._prefixes[key] = _CachedPrefix(text)
+
+    async def name_for(self, key: str) -> Optional[str]:
+        """
+        Returns the cached content name of a prefix, creating or extending it
+        as needed, or None if caching is currently unavailable (callers then
+        send the prompt uncached).
+        """
+        prefix = self._prefixes[key]
+        now = time.monotonic()
+        if prefix.name and now < prefix.expires_at - self.refresh_margin_seconds:
+            return prefix.name
+        if now < prefix.retry_at:
+            return None
+
+        async with prefix.lock:
+            now = time.monotonic()
+            if prefix.name and now < prefix.expires_at - self.refresh_margin_seconds:
+                return prefix.name
+            try:
+                if prefix.name and now < prefix.expires_at:
+                    try:
+                        await self.backend.refresh(prefix.name, self.ttl_seconds)
+                        self.refreshes += 1
+                    except Exception as e:
+                        logger.warning(f"Could not extend cached prompt '{key}' ({e}); recreating it.")
+                        prefix.name = None
+                if not prefix.name or now >= prefix.expires_at:
+                    prefix.name = await self.backend.create(key, prefix.text, self.ttl_seconds)
+                    self.creates += 1
+                    logger.info(f"Cached prompt '{key}' as {prefix.name} for {self.ttl_seconds}s.")
+                prefix.expires_at = now + self.ttl_seconds
+                return prefix.name
+            except Exception as e:
+                self.failures += 1
+                prefix.name = None
+                prefix.retry_at = now + PROMPT_CACHE_RETRY_SECONDS
+                logger.error(f"Could not cache prompt '{key}': {e}. Sending it uncached for {PROMPT_CACHE_RETRY_SECONDS:.0f}s.")
+                return None
+
+    def invalidate(self, key: str, name: str) -> None:
+        """
+        Forgets a cached content name the provider no longer serves (evicted,
+        expired or deleted elsewhere); the next call creates a new one.
+        """
+        prefix = self._prefixes[key]
+        if prefix.name == name:
+            prefix.name = None
+            prefix.expires_at = 0.0
+            self.invalidations += 1
+
+    async def warm(self) -> None:
+        """Creates every registered cache ahead of the first call."""
+        await asyncio.gather(*(self.name_for(key) for key in self._prefixes))
+
+    async def close(self) -> None:
+        """Deletes the provider-side caches (they are billed while they live)."""
+        for key, prefix in self._prefixes.items():
+            if prefix.name:
+                try:
+                    await self.backend.delete(prefix.name)
+                except Exception as e:
+                    logger.warning(f"Could not delete cached prompt '{key}': {e}")
+                prefix.name = None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "creates": self.creates,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "invalidations": self.invalidations,
+            "prefixes": {
+                key: {"name": prefix.name, "expires_in_seconds": max(0.0, prefix.expires_at - now) if prefix.name else None}
+                for key, prefix in self._prefixes.items()
+            },
+        }
+
+
+def create_prompt_cache() -> Optional[PromptCache]:
+    """
+    Creates the prompt cache for the configured LLM provider: Gemini cached
+    content, or the local stand-in for the fake model. None if disabled.
+    """
+    if not PROMPT_CACHE_ENABLED:
+        return None
+    backend = LocalCacheBackend() if LLM_PROVIDER == "fake" else GeminiCacheBackend()
+    return PromptCache(backend)
+
+
+def is_stale_cache_error(error: Exception) -> bool:
+    """
+    Whether a generate call failed because its cached content is gone or not
+    accessible, rather than for a reason an uncached call would also hit.
+    """
+    try:
+        from google.api_core.exceptions import NotFound, PermissionDenied
+
+        if isinstance(error, (NotFound, PermissionDenied)):
+            return True
+    except ImportError:
+        pass
+    if getattr(error, "code", None) in (403, 404):
+        return True
+    # Expired caches are also reported as invalid arguments naming the cache
+    message = str(error).lower()
+    return "cachedcontent" in message or "cached content" in message
+
+
+def render_static_system_prompt(template: str) -> str:
+    """Renders a system prompt template that has no variables, exactly as the chain would."""
+    return ChatPromptTemplate.from_messages([("system", template)], template_format="jinja2").format_messages()[0].content
+
+
+def cached_prefix_chain(
+    prompt_cache: PromptCache,
+    key: str,
+    uncached_prompt: ChatPromptTemplate,
+    suffix_prompt: ChatPromptTemplate,
+    model: Any,
+    schema: Any,
+) -> Runnable:
+    """
+    Builds a structured-output chain whose system prompt is served from the
+    prompt cache.
+
+    Args:
+        key: The registered prefix holding the rendered system prompt.
+        uncached_prompt: The full prompt (system message included), used
+            whenever the cache is unavailable.
+        suffix_prompt: The same prompt without the system message.
+        schema: The structured output schema. Cached calls use JSON mode,
+            since Gemini does not accept tools alongside cached content.
+    """
+    uncached_chain = uncached_prompt | model.with_structured_output(schema, include_raw=True)
+    chains_by_name: Dict[str, Runnable] = {}
+
+    async def ainvoke(inputs: Dict[str, Any]) -> Any:
+        name = await prompt_cache.name_for(key)
+        if name is None:
+            return await uncached_chain.ainvoke(inputs)
+        if name not in chains_by_name:
+            # A new name only appears when a cache was (re)created
+            chains_by_name.clear()
+            cached_model = with_cached_content(model, name)
+            chains_by_name[name] = suffix_prompt | cached_model.with_structured_output(schema, method="json_mode", include_raw=True)
+        try:
+            return await chains_by_name[name].ainvoke(inputs)
+        except Exception as e:
+            if not is_stale_cache_error(e):
+                raise
+            logger.warning(f"Cached prompt '{key}' ({name}) was rejected: {e}. Retrying uncached.")
+            prompt_cache.invalidate(key, name)
+            chains_by_name.pop(name, None)
+            return await uncached_chain.ainvoke(inputs)
+
+    def invoke(inputs: Dict[str, Any]) -> Any:
+        raise RuntimeError(f"The cached '{key}' chain is async only; call ainvoke().")
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=f"Cached{key}")
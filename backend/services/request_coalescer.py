@@ -0,0 +1,64 @@
+# backend/services/request_coalescer.py
+
+import logging
+from typing import Dict, List, Optional
+
+from backend.services.answer_cache import question_key
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCoalescer:
+    """
+    Single-flight deduplication of generation jobs.
+
+    The first job for a (normalized) question becomes the leader and runs the
+    agent; identical questions submitted while it is queued or running become
+    followers that share its execution instead of starting their own.
+    All methods are meant to be called from the event loop.
+    """
+
+    def __init__(self):
+        # question key -> leader job id
+        self._leaders: Dict[str, str] = {}
+        # leader job id -> follower job ids
+        self._followers: Dict[str, List[str]] = {}
+        # follower job id -> leader job id
+        self._leader_of: Dict[str, str] = {}
+        self.coalesced_count = 0
+
+    def in_flight_leader(self, question: str) -> Optional[str]:
+        """Returns the job id already running this question, if any."""
+        return self._leaders.get(question_key(question))
+
+    def register_leader(self, question: str, job_id: str) -> None:
+        """Marks a job as the one executing this question."""
+        self._leaders[question_key(question)] = job_id
+        self._followers.setdefault(job_id, [])
+
+    def add_follower(self, leader_job_id: str, job_id: str) -> None:
+        """Attaches a job to a leader's execution."""
+        self._followers.setdefault(leader_job_id, []).append(job_id)
+        self._leader_of[job_id] = leader_job_id
+        self.coalesced_count += 1
+        logger.info(f"Job {job_id} coalesced into in-flight job {leader_job_id}.")
+
+    def followers(self, leader_job_id: str) -> List[str]:
+        return list(self._followers.get(leader_job_id, []))
+
+    def leader_of(self, job_id: str) -> Optional[str]:
+        """Returns the leader a follower job is attached to, if any."""
+        return self._leader_of.get(job_id)
+
+    def finish(self, question: str, leader_job_id: str) -> List[str]:
+        """
+        Releases a finished leader. Later identical questions start a new
+        execution. Returns the followers that shared this one.
+        """
+        key = question_key(question)
+        if self._leaders.get(key) == leader_job_id:
+            del self._leaders[key]
+        followers = self._followers.pop(leader_job_id, [])
+        for job_id in followers:
+            self._leader_of.pop(job_id, None)
+        return followers
@@ -1,7 +1,9 @@
 # backend/services/step1_rag_service.py
 
 import logging
+from typing import Optional
 from backend.utils.rag_step1_utils import get_helper_context,get_helper_context_updated
+from metrics import RETRIEVAL_SECONDS
 
 
 logger = logging.getLogger(__name__)
@@ -23,12 +25,14 @@ class gen_RagService:
         # Example: self.retriever = self.load_vector_store()
         pass
 
-    async def fetch_context(self, user_question: str) -> str:
+    async def fetch_context(self, user_question: str, max_tokens: Optional[int] = None) -> str:
         """
         Fetches relevant context for a given user question.
 
         Args:
             user_question: The user's original question.
+            max_tokens: Prompt budget for the context; the least relevant
+                results are left out to fit.
 
         Returns:
             A string containing the retrieved context, or an empty string for this placeholder.
@@ -36,7 +40,8 @@ class gen_RagService:
         #logger.info(f"Placeholder gen_RagService received question: '{user_question}'")
         
         # --- Placeholder Logic ---
-        context = await get_helper_context_updated(user_question,k=5)
+        with RETRIEVAL_SECONDS.time(store="verse_rag"):
+            context = await get_helper_context_updated(user_question, k=5, max_tokens=max_tokens)
 
         #logger.info(f"my context from rag..............................................'{context}")
         
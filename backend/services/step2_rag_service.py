@@ -1,8 +1,10 @@
 # backend/services/step2_rag_service.py
 
 import logging
-from typing import List
-from backend.utils.rag_step2_utils import get_device_context
+from typing import List, Optional
+from backend.utils.rag_step2_utils import get_device_context_by_names
+from device_doc_sections import extract_referenced_names
+from metrics import RETRIEVAL_SECONDS
 
 logger = logging.getLogger(__name__)
 
@@ -22,26 +24,36 @@ class correct_RagService:
         logger.info("Initialized correct_RagService (placeholder).")
         pass
 
-    async def fetch_device_context(self, devices_used: List[str]) -> str:
+    async def fetch_device_context(
+        self,
+        devices_used: List[str],
+        events_used: Optional[List[str]] = None,
+        draft_code: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+    ) -> str:
         """
         Fetches relevant context for a list of specific Verse devices.
 
         Args:
             devices_used: A list of device names (e.g., ['trigger_device', 'button_device']).
+            events_used: Events used by the draft, as 'device_name.EventName'.
+            draft_code: The draft Verse code. Together with `events_used` it
+                narrows each device's docs down to the relevant sections.
+            max_tokens: Prompt budget for the context; the least relevant
+                devices are left out to fit.
 
         Returns:
             A string containing the retrieved context, or an empty string for this placeholder.
         """
         #logger.info(f"Placeholder correct_RagService received devices: {devices_used}")
 
-        if devices_used:
-            devices_query = "The devices used are " + ", ".join(devices_used) + "."
-        else:
-            devices_query = "No devices info."
-        k=len(devices_used)+2
-
-        # --- Placeholder Logic ---
-        devices_context=await get_device_context(devices_query,k)
+        # Known device names resolve by exact lookup; only unknown names
+        # fall back to an embedding + similarity search.
+        referenced_names = None
+        if events_used or draft_code:
+            referenced_names = extract_referenced_names(events_used, draft_code)
+        with RETRIEVAL_SECONDS.time(store="device_rag"):
+            devices_context=await get_device_context_by_names(devices_used or [], referenced_names, draft_code, max_tokens)
 
         #logger.info(f"devices___________________________context_________________________________________: {devices_context}")
 
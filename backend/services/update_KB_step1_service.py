@@ -1,10 +1,10 @@
 # backend/services/add_knowledge_base_service.py
 
 import logging
-from typing import Dict, Any
+from typing import Any, AsyncIterable, Dict, List
 
 # Import the specific async utility function we need
-from backend.utils.update_KB_step1_utils import add_to_knowledge_base_async
+from backend.utils.update_KB_step1_utils import add_to_knowledge_base_async, add_many_to_knowledge_base_async
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +20,7 @@ class AddKnowledgeBaseService1:
         """
         Initializes the AddKnowledgeBaseService.
         There is no heavy initialization needed here as the utility function
-        handles loading the DB on each call.
+        appends to the vector store that is already loaded in memory.
         """
         logger.info("Initialized AddKnowledgeBaseService.")
         pass
@@ -49,3 +49,19 @@ class AddKnowledgeBaseService1:
             # Catch any unexpected errors from the utility function
             logger.error(f"An unexpected error occurred in the add_entry service: {e}")
             return False
+
+    async def add_entries(self, records: AsyncIterable[Any]) -> List[Dict[str, Any]]:
+        """
+        Processes a bulk request to add many entries to the FAISS vector DB.
+
+        Args:
+            records: The entries, each with 'question' and 'verse_code'.
+
+        Returns:
+            One result per record (see `add_many_to_knowledge_base_async`).
+        """
+        logger.info("Service received a bulk request to add knowledge entries.")
+        results = await add_many_to_knowledge_base_async(records)
+        added = sum(1 for result in results if result["status"] == "added")
+        logger.info(f"Bulk add finished: {added} of {len(results)} entries added.")
+        return results
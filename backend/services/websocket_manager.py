@@ -1,65 +1,270 @@
+import asyncio
 import json
 import logging
+import os
+import time
+from collections import OrderedDict, deque
 from datetime import datetime
-from typing import Dict, Set
+from typing import Deque, Dict, List, Optional, Tuple
 
 from fastapi import WebSocket
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# --- Outbound Queue Configuration ---
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+# What to do when a client's queue is full: "drop_oldest", "drop_newest" or
+# "coalesce" (replace a queued message of the same type, else drop the oldest).
+WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "coalesce")
+
+# --- Replay Buffer Configuration ---
+# Events kept per job so late or reconnecting subscribers get the full history.
+WS_REPLAY_BUFFER_SIZE = int(os.getenv("WS_REPLAY_BUFFER_SIZE", "200"))
+WS_REPLAY_TTL_SECONDS = float(os.getenv("WS_REPLAY_TTL_SECONDS", "900"))
+WS_REPLAY_MAX_JOBS = int(os.getenv("WS_REPLAY_MAX_JOBS", "1000"))
+
+# Only the latest message of these types matters to a client.
+COALESCIBLE_MESSAGE_TYPES = {"state_update", "queue_position", "status_update"}
+# These are never dropped, even when the queue is full.
+TERMINAL_MESSAGE_TYPES = {"final_result", "error"}
+
+
+class _ConnectionSender:
+    """
+    A bounded outbound queue for one WebSocket connection, drained by its own
+    task, so a slow client only ever delays itself.
+
+    Replayed history is queued outside the bound and is never coalesced or
+    dropped, so a resuming client gets every event it missed; the bound and
+    overflow policy only apply to live messages.
+    """
+
+    def __init__(self, manager: "WebSocketManager", websocket: WebSocket, job_id: str,
+                 max_size: int = WS_SEND_QUEUE_SIZE, overflow_policy: str = WS_OVERFLOW_POLICY):
+        self.manager = manager
+        self.websocket = websocket
+        self.job_id = job_id
+        self.max_size = max(1, max_size)
+        self.overflow_policy = overflow_policy
+        self.dropped = 0
+        # (message type, serialized message, replayed)
+        self._queue: Deque[Tuple[str, str, bool]] = deque()
+        self._replay_pending = 0
+        self._ready = asyncio.Event()
+        self._task = asyncio.create_task(self._drain())
+
+    def enqueue(self, message_type: str, message_str: str) -> None:
+        """Queues a message without waiting for the network."""
+        if len(self._queue) - self._replay_pending >= self.max_size and message_type not in TERMINAL_MESSAGE_TYPES:
+            if not self._make_room(message_type):
+                self.dropped += 1
+                return
+        self._queue.append((message_type, message_str, False))
+        self._ready.set()
+
+    def enqueue_replay(self, message_type: str, message_str: str) -> None:
+        """Queues a buffered event; it is always delivered, in order."""
+        self._queue.append((message_type, message_str, True))
+        self._replay_pending += 1
+        self._ready.set()
+
+    def _make_room(self, message_type: str) -> bool:
+        """Applies the overflow policy. Returns False if the new message should be dropped."""
+        if self.overflow_policy == "drop_newest":
+            return False
+
+        if self.overflow_policy == "coalesce" and message_type in COALESCIBLE_MESSAGE_TYPES:
+            for queued in reversed(self._queue):
+                if queued[0] == message_type and not queued[2]:
+                    self._queue.remove(queued)
+                    self.dropped += 1
+                    return True
+
+        # drop_oldest (and the coalesce fallback): evict the oldest droppable message
+        for queued in self._queue:
+            if queued[0] not in TERMINAL_MESSAGE_TYPES and not queued[2]:
+                self._queue.remove(queued)
+                self.dropped += 1
+                return True
+        return False
+
+    async def _drain(self):
+        try:
+            while True:
+                if not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                _, message_str, replayed = self._queue.popleft()
+                if replayed:
+                    self._replay_pending -= 1
+                await self.websocket.send_text(message_str)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error sending message to client: {str(e)}", exc_info=True)
+            self.manager.disconnect(self.websocket, self.job_id)
+
+    def close(self):
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+
+
+class _JobEventLog:
+    """
+    A bounded, time-limited ring buffer of the events broadcast for one job.
+    """
+
+    def __init__(self, max_events: int = WS_REPLAY_BUFFER_SIZE):
+        self.last_seq = 0
+        self.updated_at = time.monotonic()
+        # (seq, created_at, message type, serialized message)
+        self.events: Deque[Tuple[int, float, str, str]] = deque(maxlen=max(1, max_events))
+
+    def prune(self, now: float, ttl_seconds: float) -> None:
+        while self.events and now - self.events[0][1] > ttl_seconds:
+            self.events.popleft()
+
+
 class WebSocketManager:
-    def __init__(self):
-        # Store active connections for each job
-        self.active_connections: Dict[str, Set[WebSocket]] = {}
-        
-    async def connect(self, websocket: WebSocket, job_id: str):
-        """Connect a new client to a specific job."""
+    def __init__(self, replay_ttl_seconds: float = WS_REPLAY_TTL_SECONDS, replay_max_jobs: int = WS_REPLAY_MAX_JOBS):
+        # Store active connections for each job, each with its own send queue
+        self.active_connections: Dict[str, Dict[WebSocket, _ConnectionSender]] = {}
+        # Recent events per job, least recently updated first
+        self._event_logs: "OrderedDict[str, _JobEventLog]" = OrderedDict()
+        self.replay_ttl_seconds = replay_ttl_seconds
+        self.replay_max_jobs = max(1, replay_max_jobs)
+        # Jobs whose events are mirrored to other (coalesced) jobs
+        self._followers: Dict[str, List[str]] = {}
+
+    def latest_seq(self, job_id: str) -> int:
+        """Sequence number of the last event broadcast for a job (0 if none)."""
+        event_log = self._event_logs.get(job_id)
+        return event_log.last_seq if event_log else 0
+
+    def _record_event(self, job_id: str, message: dict) -> Tuple[str, str]:
+        """Stamps a message with the job's next sequence number and keeps it for replay."""
+        now = time.monotonic()
+        event_log = self._event_logs.pop(job_id, None) or _JobEventLog()
+        self._event_logs[job_id] = event_log
+
+        event_log.last_seq += 1
+        event_log.updated_at = now
+        message["seq"] = event_log.last_seq
+        message_type = message.get("type", "")
+        message_str = self._serialize(message)
+        event_log.events.append((event_log.last_seq, now, message_type, message_str))
+        event_log.prune(now, self.replay_ttl_seconds)
+
+        # Forget jobs that went quiet, and cap the number of buffered jobs
+        while self._event_logs:
+            oldest_id, oldest = next(iter(self._event_logs.items()))
+            if len(self._event_logs) > self.replay_max_jobs or now - oldest.updated_at > self.replay_ttl_seconds:
+                del self._event_logs[oldest_id]
+            else:
+                break
+        return message_type, message_str
+
+    async def attach_follower(self, follower_job_id: str, leader_job_id: str):
+        """
+        Mirrors a leader job's event stream to a follower job that shares its
+        execution. Events the leader already broadcast are copied into the
+        follower's replay buffer first.
+        """
+        event_log = self._event_logs.get(leader_job_id)
+        history = [json.loads(message_str) for _, _, _, message_str in event_log.events] if event_log else []
+        for message in history:
+            message.pop("seq", None)
+            await self.broadcast_to_job(follower_job_id, message)
+        self._followers.setdefault(leader_job_id, []).append(follower_job_id)
+
+    def detach_followers(self, leader_job_id: str):
+        """Stops mirroring a leader job's events."""
+        self._followers.pop(leader_job_id, None)
+
+    async def connect(self, websocket: WebSocket, job_id: str, last_seq: Optional[int] = None, ack: Optional[dict] = None):
+        """
+        Connect a new client to a specific job.
+
+        Args:
+            websocket: The accepted WebSocket.
+            job_id: The job to subscribe to.
+            last_seq: The last sequence number the client has seen, when it is
+                resuming after a reconnect. Buffered events after it are replayed.
+            ack: An optional message sent to the client before the replay.
+        """
         if job_id not in self.active_connections:
-            self.active_connections[job_id] = set()
-        self.active_connections[job_id].add(websocket)
+            self.active_connections[job_id] = {}
+        sender = _ConnectionSender(self, websocket, job_id)
+        self.active_connections[job_id][websocket] = sender
+
+        if ack is not None:
+            sender.enqueue(ack.get("type", ""), self._serialize(ack))
+
+        # Replay what this client missed, oldest first
+        event_log = self._event_logs.get(job_id)
+        if event_log is not None:
+            event_log.prune(time.monotonic(), self.replay_ttl_seconds)
+            replayed = 0
+            for seq, _, message_type, message_str in event_log.events:
+                if seq > (last_seq or 0):
+                    sender.enqueue_replay(message_type, message_str)
+                    replayed += 1
+            if replayed:
+                logger.info(f"Replayed {replayed} buffered events for job {job_id}")
+
         logger.info(f"New WebSocket connection for job {job_id}")
         logger.info(f"Total connections for job: {len(self.active_connections[job_id])}")
         logger.info(f"All active jobs: {list(self.active_connections.keys())}")
-        
+
     def disconnect(self, websocket: WebSocket, job_id: str):
         """Disconnect a client from a specific job."""
         if job_id in self.active_connections:
-            self.active_connections[job_id].discard(websocket)
+            sender = self.active_connections[job_id].pop(websocket, None)
+            if sender is not None:
+                sender.close()
             if not self.active_connections[job_id]:
                 del self.active_connections[job_id]
             logger.info(f"WebSocket disconnected for job {job_id}")
-            logger.info(f"Remaining connections for job: {len(self.active_connections.get(job_id, set()))}")
+            logger.info(f"Remaining connections for job: {len(self.active_connections.get(job_id, {}))}")
             logger.info(f"Remaining active jobs: {list(self.active_connections.keys())}")
-                
-    async def broadcast_to_job(self, job_id: str, message: dict):
-        """Send a message to all clients connected to a specific job."""
-        if job_id not in self.active_connections:
-            logger.warning(f"No active connections for job {job_id}")
-            return
-            
+
+    @staticmethod
+    def _serialize(message: dict) -> str:
         # Add timestamp to message
         message["timestamp"] = datetime.now().isoformat()
-        
+
         # Convert message to JSON string
-        message_str = json.dumps(message)
+        return json.dumps(message)
+
+    async def send_to_connection(self, websocket: WebSocket, job_id: str, message: dict):
+        """Queue a message for a single client, behind anything already queued for it."""
+        sender = self.active_connections.get(job_id, {}).get(websocket)
+        if sender is not None:
+            sender.enqueue(message.get("type", ""), self._serialize(message))
+
+    async def broadcast_to_job(self, job_id: str, message: dict):
+        """
+        Queue a message for all clients connected to a specific job.
+
+        Every message gets a per-job "seq" number and is kept in the job's
+        replay buffer, so clients that connect later still receive it.
+        This never waits on network I/O: each connection drains its own queue,
+        so the agent is not held up by slow or stalled browsers.
+        """
+        message_type, message_str = self._record_event(job_id, message)
         #logger.info(f"Message content: {message_str}")
-        
-        # Send to all connected clients for this job
-        success_count = 0
-        disconnected = set()
-        for connection in self.active_connections[job_id]:
-            try:
-                await connection.send_text(message_str)
-                success_count += 1
-            except Exception as e:
-                logger.error(f"Error sending message to client: {str(e)}", exc_info=True)
-                disconnected.add(connection)
-        
-        # Clean up disconnected clients
-        for connection in disconnected:
-            self.disconnect(connection, job_id)
-            
+
+        for follower_job_id in list(self._followers.get(job_id, [])):
+            await self.broadcast_to_job(follower_job_id, dict(message))
+
+        if job_id not in self.active_connections:
+            logger.debug(f"No active connections for job {job_id}; event buffered for replay")
+            return
+
+        for sender in list(self.active_connections[job_id].values()):
+            sender.enqueue(message_type, message_str)
+
     async def send_status_update(self, job_id: str, status: str, message: str = None, error: str = None, result: dict = None):
         """Helper method to send formatted status updates."""
         update = {
@@ -72,4 +277,4 @@ class WebSocketManager:
             }
         }
         #logger.info(f"Status: {status}, Message: {message}")
-        await self.broadcast_to_job(job_id, update)
\ No newline at end of file
+        await self.broadcast_to_job(job_id, update)
@@ -1,7 +1,7 @@
 #import google.generativeai as genai
 from google import genai
 from google.genai import types
-client = genai.Client()
+import functools
 import json
 import os
 from dotenv import load_dotenv
@@ -9,6 +9,13 @@ from dotenv import load_dotenv
 # Load environment variables at the earliest possible moment
 load_dotenv()
 
+
+@functools.lru_cache(maxsize=1)
+def get_client() -> genai.Client:
+    # Created on first use, so the app can start (e.g. with the offline
+    # embeddings provider) without GOOGLE_API_KEY.
+    return genai.Client()
+
 class YouTubeSummarizationService:
     def __init__(self):
         # It's good practice to have the API key check here
@@ -65,7 +72,7 @@ class YouTubeSummarizationService:
 
         # The system prompt that instructs the mode
         try:
-            response = await client.aio.models.generate_content(
+            response = await get_client().aio.models.generate_content(
                         model='models/gemini-2.5-pro-preview-05-06',
                         contents=types.Content(
                             parts=[
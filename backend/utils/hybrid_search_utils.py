@@ -0,0 +1,155 @@
+# backend/utils/hybrid_search_utils.py
+
+import os
+import logging
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_community.vectorstores.utils import DistanceStrategy
+
+logger = logging.getLogger(__name__)
+
+# --- Fusion Configuration ---
+# Weights applied to the min-max normalized BM25 and FAISS scores.
+HYBRID_BM25_WEIGHT = float(os.getenv("HYBRID_BM25_WEIGHT", "0.5"))
+HYBRID_DENSE_WEIGHT = float(os.getenv("HYBRID_DENSE_WEIGHT", "0.5"))
+# How many candidates each side contributes, as a multiple of k.
+HYBRID_CANDIDATE_MULTIPLIER = int(os.getenv("HYBRID_CANDIDATE_MULTIPLIER", "4"))
+
+
+def _min_max(scores: np.ndarray) -> np.ndarray:
+    """
+    Scales scores to [0, 1]. A list of identical scores maps to all ones.
+    """
+    if not scores.size:
+        return scores
+    low, high = scores.min(), scores.max()
+    if high - low <= 1e-12:
+        return np.ones_like(scores)
+    return (scores - low) / (high - low)
+
+
+class HybridSearchEngine:
+    """
+    Hybrid keyword + semantic search over a FAISS store and its BM25 index.
+
+    Both sides are scored as NumPy arrays, min-max normalized and fused with
+    fixed weights in a single vectorized pass, so the cost of a search depends
+    on the number of candidates rather than on the size of the corpus.
+    """
+
+    def __init__(
+        self,
+        vector_store: Any,
+        bm25_index: Any = None,
+        bm25_weight: float = HYBRID_BM25_WEIGHT,
+        dense_weight: float = HYBRID_DENSE_WEIGHT,
+        candidate_multiplier: int = HYBRID_CANDIDATE_MULTIPLIER,
+    ):
+        """
+        Args:
+            vector_store: A LangChain FAISS vector store.
+            bm25_index: The pre-built `BM25Index` for the same documents, or
+                None for a dense-only search.
+            bm25_weight: Weight of the normalized BM25 scores.
+            dense_weight: Weight of the normalized FAISS similarities.
+            candidate_multiplier: Each side fetches `k * candidate_multiplier`
+                candidates before fusion.
+        """
+        self.vector_store = vector_store
+        self.bm25_index = bm25_index
+        self.bm25_weight = bm25_weight
+        self.dense_weight = dense_weight
+        self.candidate_multiplier = max(1, candidate_multiplier)
+
+    def _dense_candidates(self, query_vector: Sequence[float], fetch_k: int) -> Tuple[List[str], np.ndarray]:
+        """
+        Runs the FAISS search and returns candidate ids with similarities
+        where higher is better.
+        """
+        index = self.vector_store.index
+        fetch_k = min(fetch_k, index.ntotal)
+        if fetch_k <= 0:
+            return [], np.empty(0, dtype=np.float32)
+
+        vector = np.asarray([query_vector], dtype=np.float32)
+        if getattr(self.vector_store, "_normalize_L2", False):
+            vector /= max(float(np.linalg.norm(vector)), 1e-12)
+
+        distances, positions = index.search(vector, fetch_k)
+        valid = positions[0] >= 0
+        positions, distances = positions[0][valid], distances[0][valid]
+
+        if self.vector_store.distance_strategy in (DistanceStrategy.MAX_INNER_PRODUCT, DistanceStrategy.DOT_PRODUCT):
+            similarities = distances
+        else:
+            # Euclidean / Jaccard distances: smaller is better
+            similarities = -distances
+
+        index_to_docstore_id = self.vector_store.index_to_docstore_id
+        return [index_to_docstore_id[int(p)] for p in positions], similarities.astype(np.float32)
+
+    def _keyword_candidates(self, query: str, fetch_k: int) -> Tuple[List[str], np.ndarray]:
+        """
+        Scores the query against the BM25 index and keeps the best positive hits.
+        """
+        if self.bm25_index is None or not len(self.bm25_index):
+            return [], np.empty(0, dtype=np.float32)
+
+        scores = self.bm25_index.get_scores(query)
+        fetch_k = min(fetch_k, scores.size)
+        top = np.argpartition(-scores, fetch_k - 1)[:fetch_k]
+        top = top[scores[top] > 0]
+        doc_ids = self.bm25_index.doc_ids
+        return [doc_ids[int(p)] for p in top], scores[top]
+
+    def search_by_vector(self, query: str, query_vector: Sequence[float], k: int) -> List[Tuple[str, float]]:
+        """
+        Returns up to k `(doc_id, fused_score)` pairs, best first.
+
+        Args:
+            query: The raw query text, used for BM25.
+            query_vector: The embedding of the query, used for FAISS.
+            k: The number of results to return.
+        """
+        if k <= 0:
+            return []
+        fetch_k = k * self.candidate_multiplier
+
+        dense_ids, dense_scores = self._dense_candidates(query_vector, fetch_k)
+        keyword_ids, keyword_scores = self._keyword_candidates(query, fetch_k)
+
+        # Union of candidates; each id gets one slot in the fused arrays.
+        candidate_ids = list(dict.fromkeys(dense_ids + keyword_ids))
+        if not candidate_ids:
+            return []
+        slots = {doc_id: i for i, doc_id in enumerate(candidate_ids)}
+
+        fused = np.zeros(len(candidate_ids), dtype=np.float32)
+        if dense_ids:
+            fused[[slots[d] for d in dense_ids]] += self.dense_weight * _min_max(dense_scores)
+        if keyword_ids:
+            fused[[slots[d] for d in keyword_ids]] += self.bm25_weight * _min_max(keyword_scores)
+
+        k = min(k, fused.size)
+        top = np.argpartition(-fused, k - 1)[:k]
+        top = top[np.argsort(-fused[top], kind="stable")]
+        return [(candidate_ids[int(i)], float(fused[i])) for i in top]
+
+    async def asearch(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Embeds the query and runs the hybrid search.
+        """
+        query_vector = await self.vector_store.embeddings.aembed_query(query)
+        return self.search_by_vector(query, query_vector, k)
+
+    async def asearch_documents(self, query: str, k: int) -> List[Any]:
+        """
+        Runs the hybrid search and resolves the ids to stored documents.
+        """
+        documents = []
+        for doc_id, _ in await self.asearch(query, k):
+            doc: Optional[Any] = self.vector_store.docstore.search(doc_id)
+            if hasattr(doc, "page_content"):
+                documents.append(doc)
+        return documents
@@ -1,17 +1,18 @@
-import os 
 import logging
+import re
+from typing import List, Optional, Set
 # Import the manager to get the pre-loaded store
-from vector_store_manager import  get_vector_store
+from vector_store_manager import  get_vector_store, get_device_document
+from device_doc_sections import device_doc_sections, device_doc_text, select_device_sections
+from backend.utils.token_utils import fit_blocks
+from metrics import CONTEXT_BLOCKS_DROPPED
 from dotenv import load_dotenv
 
 # Load environment variables at the earliest possible moment
 load_dotenv()
 
-# Explicitly get the API key from the environment
-google_api_key = os.getenv("GOOGLE_API_KEY")
-if not google_api_key:
-    # This will make the app crash immediately if the key is missing, which is good for debugging.
-    raise ValueError("GOOGLE_API_KEY environment variable not found.")
+# No API key check here: the embeddings backend is chosen by
+# EMBEDDINGS_PROVIDER in vector_store_manager, and the local one needs none.
 
 
 
@@ -19,7 +20,7 @@ logger = logging.getLogger(__name__)
 
 # --- Main Asynchronous Query Function ---
 # --- Device RAG Function (Refactored from your code) ---
-async def get_device_context(user_query: str, k: int) -> str:
+async def get_device_context(user_query: str, k: int, referenced_names: Optional[Set[str]] = None) -> str:
     """
     Asynchronously queries the pre-loaded 'device_rag' FAISS DB for the top k devices.
     """
@@ -43,10 +44,93 @@ async def get_device_context(user_query: str, k: int) -> str:
         return f"No results found for the query: '{user_query}'"
 
     # 3. Format the results into a single string.
+    return _format_device_docs(results, referenced_names)
+
+
+def _device_blocks(docs, referenced_names: Optional[Set[str]] = None) -> List[str]:
+    """
+    Formats device documents as "Device: <name>\nInfo: <docs>" blocks.
+
+    When `referenced_names` is given, only the documentation sections relevant
+    to those events/functions are included instead of the whole document.
+    """
     all_info = []
-    for doc in results:
+    for doc in docs:
         device_name = doc.page_content.replace("Device Name:", "").strip()
-        info_string = doc.metadata.get('info', 'No information available.')
+        if referenced_names is None:
+            info_string = device_doc_text(doc.metadata)
+        else:
+            info_string = select_device_sections(device_doc_sections(doc.metadata), referenced_names)
+        info_string = info_string or 'No information available.'
         all_info.append(f"Device: {device_name}\nInfo: {info_string}\n")
+    return all_info
+
+
+def _format_device_docs(docs, referenced_names: Optional[Set[str]] = None) -> str:
+    return "\n---\n".join(_device_blocks(docs, referenced_names))
+
+
+def _rank_device_blocks(docs, blocks: List[str], referenced_names: Optional[Set[str]], draft_code: Optional[str]) -> List[str]:
+    """
+    Orders device blocks most relevant first: by how many of the draft's
+    events/functions they document, then by how often the draft uses the
+    device. Ties keep the original order.
+    """
+    # Whole words only, as in select_device_sections: "Enable" must not match "Disable"
+    pattern = re.compile(r"\b(" + "|".join(map(re.escape, sorted(referenced_names))) + r")\b") if referenced_names else None
+
+    def relevance(pair):
+        doc, block = pair
+        device_name = doc.page_content.replace("Device Name:", "").strip()
+        mentioned = len(set(pattern.findall(block))) if pattern is not None else 0
+        uses = len(re.findall(r"\b" + re.escape(device_name) + r"\b", draft_code)) if draft_code and device_name else 0
+        return (mentioned, uses)
+
+    return [block for _, block in sorted(zip(docs, blocks), key=relevance, reverse=True)]
+
+
+async def get_device_context_by_names(
+    devices_used: List[str],
+    referenced_names: Optional[Set[str]] = None,
+    draft_code: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+) -> str:
+    """
+    Resolves device names to their documentation by exact lookup in the
+    startup-built name index. Only names that are not found fall back to the
+    embedding + FAISS search of `get_device_context`.
+
+    Args:
+        devices_used: Device type names, e.g. ['trigger_device'].
+        referenced_names: Events/functions used by the draft. When given, only
+            the matching documentation sections are included.
+        draft_code: The draft Verse code, used to rank devices by relevance.
+        max_tokens: When given, the least relevant devices are left out
+            until the context fits.
+    """
+    if not devices_used:
+        return await get_device_context("No devices info.", 2, referenced_names)
+
+    # 1. Exact lookups, keeping the order in which devices were listed
+    found_docs = []
+    unknown_devices = []
+    for device_name in dict.fromkeys(devices_used):
+        doc = get_device_document(device_name)
+        if doc is None:
+            unknown_devices.append(device_name)
+        elif doc not in found_docs:
+            found_docs.append(doc)
+
+    blocks = _rank_device_blocks(found_docs, _device_blocks(found_docs, referenced_names), referenced_names, draft_code)
+
+    # 2. Vector search for the names we could not resolve
+    if unknown_devices:
+        logger.info(f"No exact device match for {unknown_devices}; falling back to vector search.")
+        devices_query = "The devices used are " + ", ".join(unknown_devices) + "."
+        # Search results rank below exact matches
+        blocks.append(await get_device_context(devices_query, len(unknown_devices) + 2, referenced_names))
 
-    return "\n---\n".join(all_info)
+    blocks, dropped = fit_blocks(blocks, max_tokens, separator="\n---\n")
+    if dropped:
+        CONTEXT_BLOCKS_DROPPED.inc(dropped, context="Device_Context")
+    return "\n---\n".join(blocks)
@@ -0,0 +1,104 @@
+# backend/utils/token_utils.py
+
+import logging
+import math
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from metrics import LLM_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# --- Prompt Budget Configuration ---
+# Upper bound on the estimated input tokens of one LLM call. The RAG context
+# (helper_context / Device_Context) is trimmed to whatever the static
+# prompts, question and history leave free. 0 disables the budget.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "32000"))
+# The context always gets at least this much, even over budget.
+MIN_CONTEXT_TOKENS = int(os.getenv("MIN_CONTEXT_TOKENS", "1000"))
+# Rough characters-per-token ratio of the Gemini tokenizer on English/code.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(*texts: Optional[str]) -> int:
+    """A fast, local estimate of the tokens in some texts."""
+    return math.ceil(sum(len(text) for text in texts if text) / CHARS_PER_TOKEN)
+
+
+def context_token_budget(*fixed_texts: Optional[str], fixed_tokens: int = 0, budget: int = PROMPT_TOKEN_BUDGET) -> Optional[int]:
+    """
+    The tokens left for RAG context once the fixed parts of a prompt are
+    counted, or None when no budget is configured.
+
+    Args:
+        fixed_texts: The per-call parts, e.g. question and history.
+        fixed_tokens: Pre-computed tokens of the static prompt templates.
+    """
+    if budget <= 0:
+        return None
+    return max(MIN_CONTEXT_TOKENS, budget - fixed_tokens - estimate_tokens(*fixed_texts))
+
+
+def fit_blocks(blocks: List[str], max_tokens: Optional[int], separator: str = "\n\n") -> Tuple[List[str], int]:
+    """
+    Keeps the leading blocks (callers pass them most relevant first) that fit
+    in `max_tokens`. If not even the first block fits, it is truncated.
+
+    Returns:
+        `(kept blocks, number of dropped blocks)`.
+    """
+    if max_tokens is None or not blocks:
+        return blocks, 0
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    kept: List[str] = []
+    used = 0
+    for block in blocks:
+        cost = len(block) + (len(separator) if kept else 0)
+        if used + cost > max_chars:
+            break
+        kept.append(block)
+        used += cost
+    if not kept:
+        kept = [blocks[0][:max_chars]]
+    dropped = len(blocks) - len(kept)
+    if dropped:
+        logger.info(f"Prompt budget: kept {len(kept)} of {len(blocks)} context blocks (~{max_tokens} tokens).")
+    return kept, dropped
+
+
+# --- Token Accounting ---
+def structured_output_usage(call: str, response: Dict[str, Any]) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Unpacks the result of a `with_structured_output(..., include_raw=True)`
+    chain into the parsed object and a token usage entry for the call.
+
+    Raises:
+        The parsing error, if the model's answer did not match the schema.
+    """
+    parsed = response.get("parsed")
+    if parsed is None:
+        raise response.get("parsing_error") or ValueError("The model returned no structured output.")
+    usage = getattr(response.get("raw"), "usage_metadata", None) or {}
+    entry = {
+        "call": call,
+        "input_tokens": int(usage.get("input_tokens", 0)),
+        "output_tokens": int(usage.get("output_tokens", 0)),
+        "total_tokens": int(usage.get("total_tokens", 0)),
+    }
+    # Prompt tokens served from a provider-side context cache, when reported
+    cached = (usage.get("input_token_details") or {}).get("cache_read")
+    if cached:
+        entry["cached_input_tokens"] = int(cached)
+        LLM_TOKENS.inc(entry["cached_input_tokens"], chain=call, kind="cached_input")
+    LLM_TOKENS.inc(entry["input_tokens"], chain=call, kind="input")
+    LLM_TOKENS.inc(entry["output_tokens"], chain=call, kind="output")
+    return parsed, entry
+
+
+def summarize_token_usage(calls: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals the per-call usage entries of a job."""
+    calls = list(calls)
+    summary: Dict[str, Any] = {"calls": calls}
+    for key in ("input_tokens", "output_tokens", "total_tokens", "cached_input_tokens"):
+        summary[key] = sum(call.get(key, 0) for call in calls)
+    return summary
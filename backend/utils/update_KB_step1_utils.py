@@ -3,12 +3,11 @@
 import os
 import logging
 import asyncio
-from typing import Dict, Any
+from typing import Any, AsyncIterable, Dict, List, Optional
 
 from langchain.schema.document import Document
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from dotenv import load_dotenv
+from vector_store_manager import append_documents, embeddings, get_vector_store
 
 # --- Basic Configuration ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -16,55 +15,37 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 # --- Global Configuration ---
-DB_PATH = "faiss_index"
-MODEL_NAME = "models/text-embedding-004"
+STORE_NAME = "verse_rag"
+# Texts per embedding request (the Gemini embedding API accepts up to 100).
+KB_BULK_EMBED_BATCH_SIZE = int(os.getenv("KB_BULK_EMBED_BATCH_SIZE", "100"))
+KB_BULK_MAX_RECORDS = int(os.getenv("KB_BULK_MAX_RECORDS", "10000"))
 
-# --- Embedding Model Initialization ---
-try:
-    embeddings = GoogleGenerativeAIEmbeddings(model=MODEL_NAME)
-except Exception as e:
-    logger.critical(f"Fatal: Could not initialize embeddings. Check GOOGLE_API_KEY. Error: {e}")
-    embeddings = None
 
-def _add_to_faiss_sync(doc_to_add: Document, db_path: str, embeddings_model: GoogleGenerativeAIEmbeddings):
+def _build_document(data: Dict[str, Any]) -> Optional[Document]:
     """
-    Synchronous helper function to perform blocking I/O operations.
-    It loads the FAISS index, adds a new document, and saves it back to disk.
-    This function is designed to be run in a separate thread.
+    Creates the LangChain Document for a knowledge base entry, or returns None
+    if it is missing 'question' or 'verse_code'.
     """
-    try:
-        # Load the existing vector store from the specified path
-        logger.info(f"Loading FAISS index from '{db_path}' for update...")
-        vector_store = FAISS.load_local(
-            db_path,
-            embeddings_model,
-            allow_dangerous_deserialization=True
-        )
-
-        # Add the new document to the in-memory index
-        logger.info(f"Adding new document to index...")
-        vector_store.add_documents([doc_to_add])
-
-        # Save the updated index back to the same location
-        logger.info(f"Saving updated index back to '{db_path}'...")
-        vector_store.save_local(db_path)
-        logger.info("✅ Index updated and saved successfully.")
-        return True
+    question = data.get("question")
+    verse_code = data.get("verse_code")
+    if not question or not verse_code:
+        return None
 
-    except FileNotFoundError:
-        logger.error(f"❌ FAISS database not found at '{db_path}'. Cannot add document.")
-        return False
-    except Exception as e:
-        logger.error(f"❌ An unexpected error occurred during the FAISS update process: {e}")
-        return False
+    metadata = {
+        "file_name": data.get("file_name", ""),
+        "explanation": data.get("explanation", ""),
+        "code": verse_code
+    }
+    return Document(page_content=question, metadata=metadata)
 
 async def add_to_knowledge_base_async(data: Dict[str, Any]) -> bool:
     """
     Asynchronously adds a new document to the FAISS vector database.
 
-    This function validates input, creates a LangChain Document, and then runs
-    the synchronous, blocking file I/O operations in a separate thread to
-    keep the main application responsive.
+    This function validates input, creates a LangChain Document, embeds it and
+    appends it to the live in-memory store (through its write-ahead log), so
+    it is used by the very next retrieval. The saved index is updated by the
+    background snapshot instead of being rewritten on every call.
 
     Args:
         data (Dict[str, Any]): A dictionary containing the data for the new document.
@@ -73,35 +54,101 @@ async def add_to_knowledge_base_async(data: Dict[str, Any]) -> bool:
     Returns:
         bool: True if the document was added successfully, False otherwise.
     """
-    if not embeddings:
-        logger.error("Cannot add document because embeddings are not initialized.")
+    if get_vector_store(STORE_NAME) is None:
+        logger.error(f"Cannot add document because the '{STORE_NAME}' vector store is not loaded.")
         return False
 
-    question = data.get("question")
-    verse_code = data.get("verse_code")
-
-    if not question or not verse_code:
+    # Create the LangChain Document object
+    new_document = _build_document(data)
+    if new_document is None:
         logger.warning("Input data is missing 'question' or 'verse_code'.")
         return False
 
-    # Create the LangChain Document object
-    metadata = {
-        "file_name": data.get("file_name", ""),
-        "explanation": data.get("explanation", ""),
-        "code": verse_code
-    }
-    new_document = Document(page_content=question, metadata=metadata)
+    try:
+        vectors = await embeddings.aembed_documents([new_document.page_content])
+        await append_documents(STORE_NAME, [new_document], vectors)
+        logger.info("✅ Document added to the live knowledge base.")
+        return True
+    except Exception as e:
+        logger.error(f"❌ An unexpected error occurred while adding the document: {e}")
+        return False
+
+
+async def add_many_to_knowledge_base_async(records: AsyncIterable[Any]) -> List[Dict[str, Any]]:
+    """
+    Adds many entries to the FAISS vector database in one go.
 
-    # Get the current running event loop
-    loop = asyncio.get_running_loop()
+    Records are consumed as they arrive and embedded in batches of
+    KB_BULK_EMBED_BATCH_SIZE. All successfully embedded entries are then
+    appended to the live store in a single write-ahead log write, so either
+    all of them become visible or none do.
 
-    # Run the synchronous (blocking) save function in a thread pool executor
-    success = await loop.run_in_executor(
-        None,  # Use the default executor
-        _add_to_faiss_sync,
-        new_document,
-        DB_PATH,
-        embeddings
-    )
+    Args:
+        records: The entries, each a dictionary like the one taken by
+                 `add_to_knowledge_base_async`. Non-dict items (e.g. lines that
+                 were not valid JSON) are reported as invalid.
 
-    return success
\ No newline at end of file
+    Returns:
+        One `{"index", "status", ...}` result per record, where status is
+        "added" (with the new "id"), "invalid" or "failed" (with an "error").
+        Past KB_BULK_MAX_RECORDS reading stops, and a single "truncated"
+        result marks the first record that was ignored.
+    """
+    results: List[Dict[str, Any]] = []
+    documents: List[Document] = []
+    vectors: List[List[float]] = []
+    batch: List[tuple] = []  # (result, document) pairs waiting to be embedded
+
+    if get_vector_store(STORE_NAME) is None:
+        raise RuntimeError(f"The '{STORE_NAME}' vector store is not loaded.")
+
+    async def embed_batch():
+        try:
+            batch_vectors = await embeddings.aembed_documents([doc.page_content for _, doc in batch])
+        except Exception as e:
+            logger.error(f"Embedding a batch of {len(batch)} knowledge entries failed: {e}")
+            for result, _ in batch:
+                result.update(status="failed", error=f"Embedding failed: {e}")
+        else:
+            for (result, doc), vector in zip(batch, batch_vectors):
+                result["status"] = "embedded"
+                documents.append(doc)
+                vectors.append(vector)
+        batch.clear()
+
+    index = 0
+    async for record in records:
+        result: Dict[str, Any] = {"index": index}
+        results.append(result)
+        if index >= KB_BULK_MAX_RECORDS:
+            # Stop reading: the rest of the stream is neither parsed nor kept
+            result.update(status="truncated", error=f"Only the first {KB_BULK_MAX_RECORDS} records of a request are read; this one and any after it were ignored.")
+            break
+        index += 1
+
+        if not isinstance(record, dict):
+            result.update(status="invalid", error="Not a JSON object.")
+            continue
+        document = _build_document(record)
+        if document is None:
+            result.update(status="invalid", error="Missing 'question' or 'verse_code'.")
+            continue
+        batch.append((result, document))
+        if len(batch) >= KB_BULK_EMBED_BATCH_SIZE:
+            await embed_batch()
+    if batch:
+        await embed_batch()
+
+    embedded = [r for r in results if r.get("status") == "embedded"]
+    if embedded:
+        try:
+            doc_ids = await append_documents(STORE_NAME, documents, vectors)
+        except Exception as e:
+            logger.error(f"❌ Appending {len(documents)} knowledge entries failed: {e}")
+            for result in embedded:
+                result.update(status="failed", error=f"Could not add to the knowledge base: {e}")
+        else:
+            for result, doc_id in zip(embedded, doc_ids):
+                result.update(status="added", id=doc_id)
+            logger.info(f"✅ Added {len(doc_ids)} documents to the live knowledge base.")
+    return results
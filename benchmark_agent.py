@@ -0,0 +1,161 @@
+# benchmark_agent.py
+# ==============================================================================
+# End-to-end load benchmark of the code generation pipeline.
+# ==============================================================================
+# Drives a running server through POST /generate-code and the job WebSocket
+# with N jobs at a given concurrency, and reports end-to-end latency
+# percentiles, throughput, time spent queued, and the time spent in each
+# graph node (from the server timestamps of the WebSocket events).
+#
+# To measure the pipeline's own overhead, start the server with the local
+# backends, e.g.
+#   LLM_PROVIDER=fake FAKE_LLM_LATENCY_SECONDS=0.5 EMBEDDINGS_PROVIDER=hash \
+#       uvicorn app:app --port 8000
+#   python benchmark_agent.py --jobs 200 --concurrency 20
+#
+# Every job gets a distinct question so the answer cache and request
+# coalescing do not short-circuit it (use --repeat-question to measure them).
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+import websockets
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUESTION = "Create a Verse device that counts how many times a trigger is activated and shows the count on a HUD message."
+PERCENTILES = (50, 95, 99)
+
+
+def _server_time(message: Dict[str, Any]) -> Optional[float]:
+    timestamp = message.get("timestamp")
+    return datetime.fromisoformat(timestamp).timestamp() if timestamp else None
+
+
+async def run_job(client: httpx.AsyncClient, ws_url: str, question: str, timeout: float) -> Dict[str, Any]:
+    """
+    Submits one job and follows its WebSocket until the final result.
+
+    Returns:
+        `{"status", "latency", "queued", "nodes", "cached"}`, where `nodes` is
+        a list of `(node, seconds)` in execution order.
+    """
+    started = time.perf_counter()
+    # Compared with server timestamps, so assumes the clocks agree
+    submitted_at = time.time()
+    response = await client.post("/generate-code", json={"user_question": question})
+    if response.status_code == 503:
+        return {"status": "rejected", "latency": time.perf_counter() - started}
+    response.raise_for_status()
+    body = response.json()
+    result: Dict[str, Any] = {"status": "failed", "nodes": [], "cached": bool(body.get("cached"))}
+    if body.get("cached"):
+        result.update(status="completed", latency=time.perf_counter() - started)
+        return result
+
+    previous_at = None
+    # Events are replayed from the start, so nothing is missed if the job
+    # finishes before the socket is open
+    async with websockets.connect(f"{ws_url}{body['websocket_url']}?last_seq=0", open_timeout=timeout) as ws:
+        while True:
+            message = json.loads(await asyncio.wait_for(ws.recv(), timeout))
+            message_type = message.get("type")
+            at = _server_time(message)
+            if message_type == "status_update" and message["data"].get("status") == "processing":
+                result["queued"] = at - submitted_at
+                previous_at = at
+            elif message_type == "state_update" and previous_at is not None:
+                result["nodes"].append((message["data"]["current_node"], at - previous_at))
+                previous_at = at
+            elif message_type in ("final_result", "error"):
+                result["status"] = "completed" if message_type == "final_result" else "failed"
+                result["cached"] = result["cached"] or bool(message["data"].get("cached"))
+                break
+    result["latency"] = time.perf_counter() - started
+    return result
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES} | {"mean": float(np.mean(values))}
+
+
+async def run_benchmark(url: str, jobs: int, concurrency: int, question: str, repeat_question: bool, timeout: float) -> Dict[str, Any]:
+    ws_url = url.replace("http://", "ws://", 1).replace("https://", "wss://", 1)
+    run_id = uuid.uuid4().hex[:6]
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[Dict[str, Any]] = []
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+        async def worker(n: int):
+            job_question = question if repeat_question else f"{question} (benchmark {run_id} job {n})"
+            async with semaphore:
+                try:
+                    results.append(await run_job(client, ws_url, job_question, timeout))
+                except Exception as e:
+                    logger.warning(f"Job {n} errored: {e}")
+                    results.append({"status": "errored", "error": str(e)})
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(jobs)))
+        wall_seconds = time.perf_counter() - started
+
+    completed = [r for r in results if r["status"] == "completed"]
+    node_times: Dict[str, List[float]] = defaultdict(list)
+    for r in completed:
+        for node, seconds in r["nodes"]:
+            node_times[node].append(seconds)
+
+    return {
+        "jobs": jobs,
+        "concurrency": concurrency,
+        "wall_seconds": wall_seconds,
+        "throughput_jobs_per_second": len(completed) / wall_seconds if wall_seconds else 0.0,
+        "outcomes": {status: sum(1 for r in results if r["status"] == status) for status in ("completed", "failed", "rejected", "errored")},
+        "cached": sum(1 for r in completed if r.get("cached")),
+        "latency_seconds": _percentiles([r["latency"] for r in completed]),
+        "queued_seconds": _percentiles([r["queued"] for r in completed if "queued" in r]),
+        "node_seconds": {node: _percentiles(times) for node, times in node_times.items()},
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    def row(label: str, stats: Dict[str, float]) -> str:
+        return f"  {label:<18}" + "".join(f"{stats.get(key, 0.0) * 1000:>11.1f}" for key in ("p50", "p95", "p99", "mean"))
+
+    print(f"\n📊 {report['jobs']} jobs at concurrency {report['concurrency']} in {report['wall_seconds']:.1f}s")
+    print(f"   Throughput: {report['throughput_jobs_per_second']:.2f} jobs/s   Outcomes: {report['outcomes']}   Cached: {report['cached']}")
+    print(f"\n  {'(ms)':<18}{'p50':>11}{'p95':>11}{'p99':>11}{'mean':>11}")
+    print(row("end to end", report["latency_seconds"]))
+    print(row("queued", report["queued_seconds"]))
+    for node, stats in report["node_seconds"].items():
+        print(row(node, stats))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Load-test /generate-code and report latency, throughput and per-node time.")
+    parser.add_argument("--url", default="http://localhost:8000", help="Base URL of the running server.")
+    parser.add_argument("--jobs", type=int, default=50, help="Number of jobs to submit.")
+    parser.add_argument("--concurrency", type=int, default=10, help="Jobs in flight at once.")
+    parser.add_argument("--question", default=DEFAULT_QUESTION)
+    parser.add_argument("--repeat-question", action="store_true", help="Send the same question every time (exercises the cache and coalescing).")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds to wait for any single response or event.")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this file.")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(args.url, args.jobs, args.concurrency, args.question, args.repeat_question, args.timeout))
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
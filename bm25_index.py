@@ -0,0 +1,167 @@
+# bm25_index.py
+# ==============================================================================
+# A small, persistent Okapi BM25 index for the keyword half of hybrid search.
+# ==============================================================================
+# Unlike `BM25Retriever.from_documents`, which tokenizes the whole corpus and
+# recomputes IDF every time it is called, this index is built once, pickled
+# next to the FAISS files and updated in place when new documents are added.
+
+import logging
+import math
+import os
+import pickle
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# File name used when the index is persisted inside a vector store folder.
+BM25_INDEX_FILENAME = "bm25_index.pkl"
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cases the text and splits it into word tokens.
+    """
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    An incrementally updatable BM25 index over a list of documents.
+
+    Documents are addressed by their docstore id and kept in insertion order,
+    so when they are added in the same order as the FAISS index, position `i`
+    refers to the same document in both.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids: List[str] = []
+        self.doc_lengths: List[int] = []
+        # term -> {document position: term frequency}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self._positions: Dict[str, int] = {}
+        self._total_length = 0
+        self._lengths_array: Optional[np.ndarray] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Locks and cached arrays are process-local and rebuilt on load.
+        state.pop("_lock", None)
+        state["_lengths_array"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def position_of(self, doc_id: str) -> Optional[int]:
+        """Returns the position of a document in the index, if present."""
+        return self._positions.get(doc_id)
+
+    def add_documents(self, doc_ids: Iterable[str], texts: Iterable[str]) -> None:
+        """
+        Adds documents to the index. Cost is proportional to the size of the
+        new documents, not to the size of the corpus.
+        """
+        with self._lock:
+            for doc_id, text in zip(doc_ids, texts):
+                if doc_id in self._positions:
+                    continue
+                position = len(self.doc_ids)
+                term_counts = Counter(tokenize(text or ""))
+                for term, frequency in term_counts.items():
+                    self.postings.setdefault(term, {})[position] = frequency
+                length = sum(term_counts.values())
+                self.doc_ids.append(doc_id)
+                self.doc_lengths.append(length)
+                self._positions[doc_id] = position
+                self._total_length += length
+            self._lengths_array = None
+
+    def idf(self, term: str) -> float:
+        """Inverse document frequency of a term (always non-negative)."""
+        document_frequency = len(self.postings.get(term, ()))
+        total = len(self.doc_ids)
+        return math.log(1.0 + (total - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def get_scores(self, query: str) -> np.ndarray:
+        """
+        Returns the BM25 score of every document for the query, indexed by
+        document position. Only the postings of the query terms are visited.
+        """
+        with self._lock:
+            total = len(self.doc_ids)
+            scores = np.zeros(total, dtype=np.float32)
+            if not total:
+                return scores
+
+            if self._lengths_array is None:
+                self._lengths_array = np.asarray(self.doc_lengths, dtype=np.float32)
+            lengths = self._lengths_array
+            average_length = max(self._total_length / total, 1e-9)
+
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                positions = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+                frequencies = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+                norm = self.k1 * (1.0 - self.b + self.b * lengths[positions] / average_length)
+                scores[positions] += self.idf(term) * frequencies * (self.k1 + 1.0) / (frequencies + norm)
+            return scores
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Returns up to k `(doc_id, score)` pairs with a positive score,
+        best first.
+        """
+        scores = self.get_scores(query)
+        if not len(scores) or k <= 0:
+            return []
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.doc_ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def save(self, folder_path: str) -> None:
+        """
+        Atomically writes the index into `folder_path`.
+        """
+        file_path = os.path.join(folder_path, BM25_INDEX_FILENAME)
+        tmp_path = f"{file_path}.tmp"
+        with self._lock:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, file_path)
+
+    @classmethod
+    def load(cls, folder_path: str) -> Optional["BM25Index"]:
+        """
+        Loads a previously saved index from `folder_path`, or returns None if
+        there is none or it cannot be read.
+        """
+        file_path = os.path.join(folder_path, BM25_INDEX_FILENAME)
+        if not os.path.exists(file_path):
+            return None
+        try:
+            with open(file_path, "rb") as f:
+                index = pickle.load(f)
+            if isinstance(index, cls):
+                return index
+            logger.warning(f"Ignoring unexpected object in '{file_path}'.")
+        except Exception as e:
+            logger.warning(f"Could not load BM25 index from '{file_path}': {e}")
+        return None
@@ -3,9 +3,13 @@ import os
 import logging
 from langchain.schema.document import Document
 from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from dotenv import load_dotenv
-import time
+from embedding_pipeline import EmbeddingPipeline, EMBEDDING_BATCH_SIZE
+from embedding_providers import create_embeddings, embedding_model_name
+from faiss_index_factory import optimize_store_index
+from kb_build_manifest import embed_incrementally
+from mmap_docstore import save_compact_store
+from vector_store_versions import new_version_folder, publish_version
 
 # --- Configure Logging and Environment ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -18,10 +22,12 @@ logger.info("Environment variables loaded if .env file exists.")
 DATA_FOLDER_PATH = "Data/Projects"
 DB_PATH = "faiss_index"
 FORCE_RECREATE = True # Set to True to overwrite existing database
+# The backend is picked by EMBEDDINGS_PROVIDER ("google" or the offline "hash")
+EMBEDDING_MODEL = embedding_model_name()
 
 # --- Initialize Embeddings ---
     
-embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+embeddings = create_embeddings()
 
 def load_documents_from_folder(folder_path: str) -> list[Document]:
     """
@@ -168,7 +174,7 @@ my_timer := class():
 #         print("   Please ensure your GOOGLE_API_KEY is correctly set in your environment.")
 
 
-def populate_vector_db(data_folder_path: str, db_path: str, force_recreate: bool = False, batch_size: int = 50):
+def populate_vector_db(data_folder_path: str, db_path: str, force_recreate: bool = False, batch_size: int = EMBEDDING_BATCH_SIZE):
     if os.path.exists(db_path) and not force_recreate:
         print(f"✅ FAISS database already exists at '{db_path}'. Skipping population.")
         return
@@ -183,27 +189,42 @@ def populate_vector_db(data_folder_path: str, db_path: str, force_recreate: bool
 
     print(f"\n⏳ Populating FAISS vector database from {len(all_documents)} documents...")
 
-    vector_store = None
-    for i in range(0, len(all_documents), batch_size):
-        batch = all_documents[i:i+batch_size]
-        print(f"🔹 Processing batch {i//batch_size + 1} ({len(batch)} docs)...")
-        try:
-            # Create FAISS index for this batch
-            batch_store = FAISS.from_documents(batch, embeddings)
-
-            if vector_store is None:
-                vector_store = batch_store
-            else:
-                vector_store.merge_from(batch_store)
+    # Only new or changed records are embedded; the rest reuse the vectors
+    # cached by the previous build. Batches are embedded concurrently, paced
+    # by the embedding quota (EMBEDDING_TEXTS_PER_MINUTE) and retried with
+    # backoff on 429s.
+    pipeline = EmbeddingPipeline(embeddings, batch_size=batch_size)
+    try:
+        ids, vectors = embed_incrementally(all_documents, pipeline.embed, db_path, EMBEDDING_MODEL)
+    except Exception as e:
+        print(f"❌ Embedding failed after {pipeline.retries} retries: {e}")
+        print("   Finished batches were checkpointed; run the script again to resume.")
+        return
 
-            time.sleep(5)  # small pause to avoid quota hit
-        except Exception as e:
-            print(f"⚠️ Error with batch {i//batch_size+1}: {e}")
+    # One index built from all vectors, instead of one per batch merged together
+    vector_store = FAISS.from_embeddings(
+        [(doc.page_content, vector) for doc, vector in zip(all_documents, vectors)],
+        embeddings,
+        metadatas=[doc.metadata for doc in all_documents],
+        ids=ids
+    )
 
     if vector_store:
-        print(f"💾 Saving FAISS index to '{db_path}'...")
-        vector_store.save_local(db_path)
-        print(f"✅ FAISS database population complete.")
+        # Swap the exact flat index for an ANN index when the corpus is large
+        # enough (FAISS_INDEX_TYPE), and report its recall against the flat one
+        report = optimize_store_index(vector_store)
+        if "recall" in report:
+            print(f"📈 {report['index_type']} index: recall@{report['k']}={report['recall']:.3f} "
+                  f"on {report['held_out_queries']} held-out queries, "
+                  f"{report['latency_ms']:.3f} ms/query vs {report['reference_latency_ms']:.3f} ms/query flat")
+
+        # Saved as a new version and published atomically, so a running
+        # server can pick it up with a reload instead of a restart.
+        version, version_folder = new_version_folder(db_path)
+        print(f"💾 Saving FAISS index to '{version_folder}'...")
+        save_compact_store(vector_store, version_folder)
+        publish_version(db_path, version)
+        print(f"✅ FAISS database population complete (version {version}).")
 
 
 if __name__ == "__main__":
@@ -3,9 +3,15 @@ import os
 import getpass
 import logging
 from langchain_core.documents import Document
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from dotenv import load_dotenv
+from device_doc_sections import split_device_markdown
+from embedding_pipeline import EmbeddingPipeline
+from embedding_providers import EMBEDDINGS_PROVIDER, create_embeddings, embedding_model_name
+from faiss_index_factory import optimize_store_index
+from kb_build_manifest import embed_incrementally
+from mmap_docstore import save_compact_store
+from vector_store_versions import new_version_folder, publish_version
 
 # --- Configure Logging and Environment ---
 # Sets up basic logging to see the script's progress and any potential issues.
@@ -22,6 +28,8 @@ logger.info("Environment variables loaded if .env file exists.")
 SOURCE_DOCUMENTS_PATH = "Data/Devices"
 # Set the path where you want to store the FAISS vector database locally.
 PERSIST_DIRECTORY = "./Device_context_db"
+# The backend is picked by EMBEDDINGS_PROVIDER ("google" or the offline "hash")
+EMBEDDING_MODEL = embedding_model_name()
 
 
 def load_markdown_documents(folder_path: str) -> list[Document]:
@@ -31,7 +39,9 @@ def load_markdown_documents(folder_path: str) -> list[Document]:
     For each file:
     - The 'page_content' is derived from the filename (e.g., "player_spawn_device.md"
       becomes "Device Name: player_spawn_device").
-    - The 'metadata' contains the full content of the markdown file.
+    - The 'metadata' holds the markdown split into 'sections' (events,
+      functions, editable properties, examples, ...), so the correction step
+      can include only the parts a draft actually uses.
 
     Args:
         folder_path: The path to the folder containing the .md files.
@@ -71,7 +81,7 @@ def load_markdown_documents(folder_path: str) -> list[Document]:
                 # Create the LangChain Document
                 doc = Document(
                     page_content=page_content,
-                    metadata={"info": content}
+                    metadata={"sections": split_device_markdown(content)}
                 )
                 documents.append(doc)
                 logger.info(f"Successfully loaded and processed '{filename}'")
@@ -89,11 +99,11 @@ def ingest_from_folder_faiss():
     """
     # --- 1. Set up Google API Key and Embeddings Model ---
     # Will prompt for the key if the environment variable is not set.
-    if not os.environ.get("GOOGLE_API_KEY"):
+    if EMBEDDINGS_PROVIDER == "google" and not os.environ.get("GOOGLE_API_KEY"):
         os.environ["GOOGLE_API_KEY"] = getpass.getpass("Enter your Google API Key: ")
 
-    print("Initializing Google Generative AI Embeddings with 'models/text-embedding-004'...")
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+    print(f"Initializing embeddings with '{EMBEDDING_MODEL}'...")
+    embeddings = create_embeddings()
 
     # --- 2. Load Documents from Folder ---
     print(f"\nLoading documents from '{SOURCE_DOCUMENTS_PATH}'...")
@@ -114,17 +124,30 @@ def ingest_from_folder_faiss():
         os.makedirs(PERSIST_DIRECTORY)
         print(f"Created directory: '{PERSIST_DIRECTORY}'")
 
-    # Create the FAISS index from the documents and embeddings
-    vector_store = FAISS.from_documents(
-        documents=documents,
-        embedding=embeddings
+    # Embed only new or changed device names; reuse the cached vectors of the rest
+    pipeline = EmbeddingPipeline(embeddings)
+    ids, vectors = embed_incrementally(documents, pipeline.embed, PERSIST_DIRECTORY, EMBEDDING_MODEL)
+
+    # Create the FAISS index from the documents and their vectors
+    vector_store = FAISS.from_embeddings(
+        [(doc.page_content, vector) for doc, vector in zip(documents, vectors)],
+        embeddings,
+        metadatas=[doc.metadata for doc in documents],
+        ids=ids
     )
 
-    # Save the created index to the specified local path
-    vector_store.save_local(folder_path=PERSIST_DIRECTORY)
+    # Use an ANN index instead of the flat one for large corpora (FAISS_INDEX_TYPE)
+    report = optimize_store_index(vector_store)
+    if "recall" in report:
+        print(f"{report['index_type']} index: recall@{report['k']}={report['recall']:.3f} on {report['held_out_queries']} held-out queries")
+
+    # Save the created index as a new version of the store and publish it
+    version, version_folder = new_version_folder(PERSIST_DIRECTORY)
+    save_compact_store(vector_store, version_folder)
+    publish_version(PERSIST_DIRECTORY, version)
 
     print("\n✅ Ingestion complete!")
-    print(f"FAISS vector store has been successfully created and saved at '{PERSIST_DIRECTORY}'.")
+    print(f"FAISS vector store has been successfully created and saved at '{version_folder}' (version {version}).")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,199 @@
+# device_doc_sections.py
+# ==============================================================================
+# Section-level chunking of the device markdown documentation.
+# ==============================================================================
+# Each device doc is split on its top-level headings into sections that are
+# tagged with categories (overview, events, functions, editable properties,
+# examples, pitfalls). The correction step then pastes only the sections that
+# mention the events and functions the draft code actually uses.
+
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+# Heading keywords -> category. A section can belong to several categories,
+# e.g. "Core Events & Methods" is both "events" and "functions".
+SECTION_CATEGORY_KEYWORDS = {
+    "overview": ("description", "import", "using statement", "inheritance", "overview"),
+    "events": ("event", "data member"),
+    "functions": ("function", "method", "api"),
+    "editable_properties": ("configuration", "details panel", "editable", "propert"),
+    "examples": ("example", "usage", "step-by-step"),
+    "pitfalls": ("issue", "incorrect", "mistake", "fix", "best practice", "tip"),
+}
+
+# Names that show up in nearly every draft and say nothing about a device.
+_GENERIC_NAMES = {
+    "Subscribe", "Await", "Print", "Sleep", "Length", "Get", "Set",
+    "OnBegin", "OnEnd", "GetPlayspace", "GetPlayers", "GetFortCharacter",
+}
+
+_HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*?)\s*$")
+# Some docs use bold lines such as "🔹 **Description**" instead of headings.
+_BOLD_HEADING_PATTERN = re.compile(r"^[^\w\s*`|#]*\s*\*\*([^*]+?)\*\*:?\s*$")
+_MEMBER_PATTERN = re.compile(r"\.([A-Za-z_]\w*)")
+_CALL_PATTERN = re.compile(r"\b([A-Z]\w*)\s*[\(\[]")
+
+
+def _classify(title: str) -> List[str]:
+    lowered = title.lower()
+    categories = [
+        category for category, keywords in SECTION_CATEGORY_KEYWORDS.items()
+        if any(keyword in lowered for keyword in keywords)
+    ]
+    return categories or ["notes"]
+
+
+def split_device_markdown(content: str) -> List[Dict[str, object]]:
+    """
+    Splits a device markdown document into sections.
+
+    The document is split on its shallowest repeated heading level below the
+    title (`##` in most docs, `###` in some), so sub-headings such as
+    "### Explanation" stay with their parent section. Lines inside fenced code
+    blocks are never treated as headings. Text before the first section
+    (usually the `#` title) becomes an "overview" section.
+
+    Returns:
+        A list of `{"title", "categories", "text"}` dictionaries.
+    """
+    lines = content.splitlines()
+
+    # 1. Find the heading lines outside of code fences
+    headings = []
+    in_fence = False
+    for i, line in enumerate(lines):
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+            continue
+        match = None if in_fence else _HEADING_PATTERN.match(line)
+        if match and len(match.group(1)) > 1:
+            headings.append((i, len(match.group(1)), match.group(2)))
+
+    if not headings:
+        in_fence = False
+        for i, line in enumerate(lines):
+            if line.lstrip().startswith("```"):
+                in_fence = not in_fence
+                continue
+            match = None if in_fence else _BOLD_HEADING_PATTERN.match(line.strip())
+            if match:
+                headings.append((i, 2, match.group(1)))
+
+    if not headings:
+        return [{"title": "Overview", "categories": ["overview"], "text": content.strip()}]
+
+    # 2. Split on the shallowest level used by more than one heading; a lone
+    #    "## device_name" title then stays in the overview.
+    level_counts = Counter(level for _, level, _ in headings)
+    repeated_levels = [level for level, count in level_counts.items() if count > 1]
+    split_level = min(repeated_levels or level_counts)
+    starts = [(i, title) for i, level, title in headings if level == split_level]
+
+    sections = []
+    preamble = "\n".join(lines[:starts[0][0]]).strip()
+    if preamble:
+        sections.append({"title": "Overview", "categories": ["overview"], "text": preamble})
+
+    for n, (start, title) in enumerate(starts):
+        end = starts[n + 1][0] if n + 1 < len(starts) else len(lines)
+        text = "\n".join(lines[start:end]).strip()
+        sections.append({"title": title, "categories": _classify(title), "text": text})
+    return sections
+
+
+def device_doc_text(metadata: Dict[str, object]) -> str:
+    """
+    Returns the full documentation of a device document, whether it was
+    stored as a single `info` blob or as `sections`.
+    """
+    if metadata.get("info"):
+        return metadata["info"]
+    return "\n\n".join(section["text"] for section in metadata.get("sections", []))
+
+
+def device_doc_sections(metadata: Dict[str, object]) -> List[Dict[str, object]]:
+    """
+    Returns the sections of a device document, splitting the legacy `info`
+    blob on the fly for indexes built before section-level chunking.
+    """
+    return metadata.get("sections") or split_device_markdown(metadata.get("info", ""))
+
+
+def extract_referenced_names(events_used: Optional[Iterable[str]] = None, draft_code: Optional[str] = None) -> Set[str]:
+    """
+    Collects the event, function and member names a draft refers to.
+
+    Args:
+        events_used: Events formatted as 'device_name.EventName'.
+        draft_code: The generated Verse code.
+    """
+    names = set()
+    for event in events_used or []:
+        names.add(event.rsplit(".", 1)[-1].strip())
+    if draft_code:
+        names.update(_MEMBER_PATTERN.findall(draft_code))
+        names.update(_CALL_PATTERN.findall(draft_code))
+    return {name for name in names if len(name) > 2 and name not in _GENERIC_NAMES}
+
+
+def _filter_table_rows(text: str, pattern: re.Pattern) -> str:
+    """
+    Keeps the header of each markdown table and only the rows that match.
+    """
+    kept = []
+    table_line = 0
+    for line in text.splitlines():
+        if line.lstrip().startswith("|"):
+            table_line += 1
+            # Header and separator rows
+            if table_line <= 2 or pattern.search(line):
+                kept.append(line)
+        else:
+            table_line = 0
+            kept.append(line)
+    return "\n".join(kept)
+
+
+def select_device_sections(sections: List[Dict[str, object]], referenced_names: Set[str]) -> str:
+    """
+    Builds the documentation text for one device from only the sections that
+    matter for the draft: the overview, the event/function sections (and
+    table rows) mentioning a referenced name, and the first example and the
+    pitfalls that mention one.
+    """
+    pattern = re.compile(r"\b(" + "|".join(map(re.escape, sorted(referenced_names))) + r")\b") if referenced_names else None
+
+    def mentions(section) -> bool:
+        return pattern is not None and bool(pattern.search(section["text"]))
+
+    api_sections = [s for s in sections if {"events", "functions"} & set(s["categories"])]
+    if not api_sections:
+        # Unrecognized layout: we cannot tell what is relevant, keep it all.
+        return "\n\n".join(section["text"] for section in sections)
+    matched_api = [s for s in api_sections if mentions(s)]
+
+    selected = []
+    example_added = False
+    for section in sections:
+        categories = set(section["categories"])
+        text = section["text"]
+        if "overview" in categories:
+            selected.append(text)
+        elif section in api_sections:
+            if not matched_api:
+                # Nothing referenced matched: the draft uses this device in a
+                # way we cannot see, so keep its whole API.
+                selected.append(text)
+            elif section in matched_api:
+                selected.append(_filter_table_rows(text, pattern))
+        elif "pitfalls" in categories:
+            if mentions(section):
+                selected.append(text)
+        elif "examples" in categories:
+            if not example_added and (mentions(section) or pattern is None):
+                selected.append(text)
+                example_added = True
+        elif "editable_properties" in categories and mentions(section):
+            selected.append(text)
+    return "\n\n".join(selected)
@@ -0,0 +1,182 @@
+# embedding_pipeline.py
+# ==============================================================================
+# Rate-limited, concurrent embedding of large document sets.
+# ==============================================================================
+# Used by the knowledge base build scripts. Texts are embedded in batches
+# that run concurrently, gated by a token bucket sized to the embedding quota
+# (counted in texts per minute), and batches that hit the rate limit (HTTP
+# 429 / ResourceExhausted) or a transient server error are retried with
+# exponential backoff and jitter instead of sleeping a fixed time.
+
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Awaitable, Callable, List, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# --- Pipeline Configuration ---
+# Texts per embedding request (the Gemini embedding API accepts up to 100).
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+# The embedding quota, counted in texts per minute.
+EMBEDDING_TEXTS_PER_MINUTE = float(os.getenv("EMBEDDING_TEXTS_PER_MINUTE", "1500"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+EMBEDDING_BACKOFF_BASE_SECONDS = float(os.getenv("EMBEDDING_BACKOFF_BASE_SECONDS", "2"))
+EMBEDDING_BACKOFF_MAX_SECONDS = float(os.getenv("EMBEDDING_BACKOFF_MAX_SECONDS", "60"))
+# Rough characters-per-token ratio used for the tokens/sec estimate.
+CHARS_PER_TOKEN = 4
+
+# Exception class names (google.api_core and httpx flavours) worth retrying.
+_RETRYABLE_ERROR_NAMES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded", "InternalServerError"}
+
+BatchCallback = Callable[[int, Sequence[str], List[List[float]]], Awaitable[None]]
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """True for rate-limit (429) and transient server errors."""
+    message = str(error)
+    return (
+        type(error).__name__ in _RETRYABLE_ERROR_NAMES
+        or "429" in message
+        or "RESOURCE_EXHAUSTED" in message
+        or "503" in message
+    )
+
+
+class TokenBucket:
+    """
+    An asyncio token bucket: `rate_per_second` tokens are added continuously,
+    up to `capacity`. `acquire(n)` waits until n tokens are available.
+    """
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        tokens = min(tokens, self.capacity)
+        # The lock keeps waiters in FIFO order so large batches do not starve.
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate_per_second)
+                self._refill()
+            self._tokens -= tokens
+
+
+class BuildProgress:
+    """
+    Tracks embedded texts and reports throughput (docs/sec, estimated
+    tokens/sec) and the time left.
+    """
+
+    def __init__(self, total_texts: int, total_chars: int):
+        self.total_texts = total_texts
+        self.total_chars = total_chars
+        self.done_texts = 0
+        self.done_chars = 0
+        self.started_at = time.monotonic()
+
+    def update(self, texts: Sequence[str]) -> str:
+        self.done_texts += len(texts)
+        self.done_chars += sum(len(text) for text in texts)
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        docs_per_second = self.done_texts / elapsed
+        tokens_per_second = self.done_chars / CHARS_PER_TOKEN / elapsed
+        remaining = (self.total_texts - self.done_texts) / docs_per_second if docs_per_second else 0.0
+        minutes, seconds = divmod(int(remaining), 60)
+        return (
+            f"Embedded {self.done_texts}/{self.total_texts} texts "
+            f"({docs_per_second:.1f} docs/s, ~{tokens_per_second:.0f} tokens/s, ETA {minutes}m{seconds:02d}s)"
+        )
+
+
+class EmbeddingPipeline:
+    """
+    Embeds many texts in concurrent, rate-limited batches and returns the
+    vectors in input order.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        texts_per_minute: float = EMBEDDING_TEXTS_PER_MINUTE,
+        max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+        max_retries: int = EMBEDDING_MAX_RETRIES,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        # A full minute of quota may be spent in a burst, but never more.
+        self._bucket = TokenBucket(texts_per_minute / 60.0, max(texts_per_minute, self.batch_size))
+        self.retries = 0
+
+    async def _embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            await self._bucket.acquire(len(texts))
+            try:
+                return await self.embeddings.aembed_documents(list(texts))
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    raise
+                delay = min(EMBEDDING_BACKOFF_MAX_SECONDS, EMBEDDING_BACKOFF_BASE_SECONDS * 2 ** attempt)
+                delay *= random.uniform(0.5, 1.0)
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Embedding batch hit a retryable error ({e}); retry {attempt}/{self.max_retries} in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+    async def aembed(self, texts: Sequence[str], on_batch: Optional[BatchCallback] = None) -> List[List[float]]:
+        """
+        Embeds all texts.
+
+        Args:
+            texts: The texts to embed.
+            on_batch: Awaited with `(batch_number, texts, vectors)` as each
+                batch finishes (in completion order).
+
+        Raises:
+            The last error of a batch that still fails after all retries.
+        """
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results: List[Optional[List[List[float]]]] = [None] * len(batches)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        progress = BuildProgress(len(texts), sum(len(text) for text in texts))
+
+        async def run(batch_number: int):
+            async with semaphore:
+                vectors = await self._embed_batch(batches[batch_number])
+            results[batch_number] = vectors
+            logger.info(progress.update(batches[batch_number]))
+            if on_batch is not None:
+                await on_batch(batch_number, batches[batch_number], vectors)
+
+        tasks = [asyncio.create_task(run(n)) for n in range(len(batches))]
+        try:
+            await asyncio.gather(*tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    def embed(self, texts: Sequence[str], on_batch: Optional[BatchCallback] = None) -> List[List[float]]:
+        """Synchronous wrapper of `aembed` for scripts."""
+        return asyncio.run(self.aembed(texts, on_batch))
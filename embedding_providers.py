@@ -0,0 +1,119 @@
+# embedding_providers.py
+# ==============================================================================
+# Pluggable embedding backends for the vector stores and build scripts.
+# ==============================================================================
+# EMBEDDINGS_PROVIDER selects the backend:
+#   "google"  GoogleGenerativeAIEmbeddings (models/text-embedding-004), the
+#             default; needs GOOGLE_API_KEY.
+#   "hash"    A local, deterministic hashed n-gram embedding with the same
+#             dimension. No network, no key and no latency, so retrieval,
+#             ingestion and load benchmarks can run offline.
+#
+# Vectors of different providers are not comparable: a store built with one
+# provider must be searched with the same one. The model name of each
+# provider is part of the embedding cache and build manifest keys, so
+# cached vectors are never mixed up.
+
+import hashlib
+import logging
+import os
+import re
+from typing import List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# The provider settings may come from .env, which importers load later
+load_dotenv()
+
+# --- Provider Configuration ---
+EMBEDDINGS_PROVIDER = os.getenv("EMBEDDINGS_PROVIDER", "google").lower()
+GOOGLE_EMBEDDING_MODEL = os.getenv("GOOGLE_EMBEDDING_MODEL", "models/text-embedding-004")
+# 768 matches text-embedding-004, so index sizes and search costs stay realistic.
+HASH_EMBEDDING_DIMENSION = int(os.getenv("HASH_EMBEDDING_DIMENSION", "768"))
+# Character n-gram lengths hashed besides the word tokens.
+HASH_EMBEDDING_NGRAMS = (3, 4)
+
+PROVIDERS = ("google", "hash")
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Embeds text by hashing its words and character n-grams into a fixed
+    number of signed buckets (the "hashing trick"), then L2-normalizing.
+    Texts that share words land close together, which is enough for
+    realistic retrieval behaviour in tests and benchmarks.
+    """
+
+    def __init__(self, dimension: int = HASH_EMBEDDING_DIMENSION, ngrams=HASH_EMBEDDING_NGRAMS):
+        self.dimension = dimension
+        self.ngrams = tuple(ngrams)
+
+    @property
+    def model_name(self) -> str:
+        return f"local/hash-ngram-{self.dimension}"
+
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN_PATTERN.findall(text.lower())
+        features = [f"w:{word}" for word in words]
+        for word in words:
+            padded = f"<{word}>"
+            for n in self.ngrams:
+                features.extend(f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1))
+        return features
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            # The low bit picks the sign, so collisions cancel out on average
+            vector[(value >> 1) % self.dimension] += 1.0 if value & 1 else -1.0
+        norm = float(np.linalg.norm(vector))
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    # CPU-bound and fast: skip the executor hop of the default async methods
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def embedding_model_name(provider: Optional[str] = None) -> str:
+    """The model name of a provider, used to key cached vectors."""
+    provider = (provider or EMBEDDINGS_PROVIDER).lower()
+    if provider == "google":
+        return GOOGLE_EMBEDDING_MODEL
+    if provider == "hash":
+        return HashingEmbeddings().model_name
+    raise ValueError(f"Unknown embeddings provider '{provider}'. Expected one of {PROVIDERS}.")
+
+
+def create_embeddings(provider: Optional[str] = None) -> Embeddings:
+    """
+    Creates the embeddings backend of a provider (EMBEDDINGS_PROVIDER by
+    default). The Google client is only imported when it is used.
+    """
+    provider = (provider or EMBEDDINGS_PROVIDER).lower()
+    if provider == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        return GoogleGenerativeAIEmbeddings(model=GOOGLE_EMBEDDING_MODEL)
+    if provider == "hash":
+        logger.info(f"Using the local hashed n-gram embeddings ({HASH_EMBEDDING_DIMENSION} dimensions).")
+        return HashingEmbeddings()
+    raise ValueError(f"Unknown embeddings provider '{provider}'. Expected one of {PROVIDERS}.")
@@ -0,0 +1,181 @@
+# faiss_index_factory.py
+# ==============================================================================
+# Approximate nearest-neighbour index types for the FAISS vector stores.
+# ==============================================================================
+# `FAISS.from_documents` always builds an exact flat index, whose search cost
+# grows linearly with the number of entries. The build scripts call
+# `optimize_store_index` to replace it with an HNSW or IVF (optionally int8
+# scalar- or product-quantized) index picked by corpus size, and report the
+# recall of the new index against the flat one, measured with held-out
+# vectors. Vector positions are kept, so the store's index_to_docstore_id
+# mapping stays valid.
+
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+
+logger = logging.getLogger(__name__)
+
+# --- Index Configuration ---
+# "auto", "flat", "hnsw", "ivf", "ivf_sq8" or "ivf_pq"
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto")
+# "auto" switches from flat to HNSW, and from HNSW to IVF-SQ8, at these sizes.
+FAISS_AUTO_HNSW_MIN_VECTORS = int(os.getenv("FAISS_AUTO_HNSW_MIN_VECTORS", "20000"))
+FAISS_AUTO_IVF_MIN_VECTORS = int(os.getenv("FAISS_AUTO_IVF_MIN_VECTORS", "500000"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "80"))
+# Search-time knobs, applied whenever an index is loaded.
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+FAISS_IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+# Upper bound on the number of PQ sub-quantizers (the largest divisor of the
+# dimension below it is used).
+FAISS_PQ_MAX_SUBQUANTIZERS = int(os.getenv("FAISS_PQ_MAX_SUBQUANTIZERS", "64"))
+
+INDEX_TYPES = ("flat", "hnsw", "ivf", "ivf_sq8", "ivf_pq")
+# FAISS wants at least this many training points per IVF centroid.
+_MIN_POINTS_PER_CENTROID = 39
+
+
+def choose_index_type(vector_count: int) -> str:
+    """Picks an index type for a corpus of this size."""
+    if vector_count >= FAISS_AUTO_IVF_MIN_VECTORS:
+        return "ivf_sq8"
+    if vector_count >= FAISS_AUTO_HNSW_MIN_VECTORS:
+        return "hnsw"
+    return "flat"
+
+
+def _factory_string(index_type: str, dimension: int, vector_count: int) -> str:
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{FAISS_HNSW_M}"
+
+    nlist = int(4 * math.sqrt(vector_count))
+    nlist = max(1, min(nlist, vector_count // _MIN_POINTS_PER_CENTROID))
+    if index_type == "ivf":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_sq8":
+        return f"IVF{nlist},SQ8"
+    if index_type == "ivf_pq":
+        subquantizers = max(m for m in range(1, min(FAISS_PQ_MAX_SUBQUANTIZERS, dimension) + 1) if dimension % m == 0)
+        return f"IVF{nlist},PQ{subquantizers}x8"
+    raise ValueError(f"Unknown index type '{index_type}'. Expected one of {INDEX_TYPES}.")
+
+
+def apply_search_params(index: Any, nprobe: int = FAISS_IVF_NPROBE, ef_search: int = FAISS_HNSW_EF_SEARCH) -> None:
+    """Sets the IVF nprobe / HNSW efSearch of an index (no-op for flat indexes)."""
+    faiss = dependable_faiss_import()
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = ef_search
+
+
+def build_index(vectors: np.ndarray, index_type: str, metric_type: Optional[int] = None) -> Any:
+    """
+    Builds (and trains, if needed) an index of the given type over `vectors`.
+    Vector i gets position i, exactly as in a flat index.
+    """
+    faiss = dependable_faiss_import()
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dimension = vectors.shape
+    metric_type = faiss.METRIC_L2 if metric_type is None else metric_type
+
+    index = faiss.index_factory(dimension, _factory_string(index_type, dimension, count), metric_type)
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        hnsw.efConstruction = FAISS_HNSW_EF_CONSTRUCTION
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    apply_search_params(index)
+    return index
+
+
+def measure_recall(index: Any, reference: Any, queries: np.ndarray, k: int = 10) -> Dict[str, float]:
+    """
+    Compares an approximate index with an exact reference index.
+
+    Returns:
+        `{"recall", "latency_ms", "reference_latency_ms"}`: the fraction of
+        the reference top-k found by the index, and mean per-query latencies.
+    """
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    k = min(k, reference.ntotal)
+
+    started = time.perf_counter()
+    _, expected = reference.search(queries, k)
+    reference_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    started = time.perf_counter()
+    _, found = index.search(queries, k)
+    index_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    hits = sum(len(set(e[e >= 0]) & set(f[f >= 0])) for e, f in zip(expected, found))
+    return {
+        "recall": hits / float(expected.size),
+        "latency_ms": index_ms,
+        "reference_latency_ms": reference_ms,
+    }
+
+
+def optimize_store_index(store: Any, index_type: str = FAISS_INDEX_TYPE, sample_queries: int = 200, k: int = 10) -> Dict[str, Any]:
+    """
+    Replaces the flat index of a LangChain FAISS store with the configured
+    (or automatically chosen) index type and measures its recall.
+
+    Args:
+        store: A LangChain FAISS store holding a flat index.
+        index_type: One of INDEX_TYPES, or "auto" to choose by corpus size.
+        sample_queries: How many stored vectors to hold out as queries for
+            the recall measurement (at most a tenth of the corpus).
+        k: The k of recall@k.
+
+    Returns:
+        A report with the chosen index type and the recall measurement
+        ("recall" is missing if the corpus is too small to hold any out).
+    """
+    flat = store.index
+    count = flat.ntotal
+    if index_type == "auto":
+        index_type = choose_index_type(count)
+    report: Dict[str, Any] = {"index_type": index_type, "vectors": count}
+    if index_type == "flat" or count == 0:
+        report["index_type"] = "flat"
+        return report
+
+    vectors = flat.reconstruct_n(0, count)
+
+    # A stored vector is its own nearest neighbour, which inflates recall, so
+    # the measurement uses a trial index built without the query vectors.
+    held_out = min(sample_queries, count // 10)
+    if held_out:
+        rng = np.random.default_rng(0)
+        is_query = np.zeros(count, dtype=bool)
+        is_query[rng.choice(count, size=held_out, replace=False)] = True
+        corpus = vectors[~is_query]
+        trial = build_index(corpus, index_type, flat.metric_type)
+        reference = build_index(corpus, "flat", flat.metric_type)
+        report.update(measure_recall(trial, reference, vectors[is_query], k))
+        report.update(k=k, held_out_queries=held_out)
+
+    started = time.perf_counter()
+    index = build_index(vectors, index_type, flat.metric_type)
+    report["build_seconds"] = time.perf_counter() - started
+
+    store.index = index
+    if "recall" in report:
+        logger.info(
+            f"Built {index_type} index over {count} vectors: recall@{k}={report['recall']:.3f} on {held_out} held-out queries, "
+            f"{report['latency_ms']:.3f} ms/query (flat: {report['reference_latency_ms']:.3f} ms/query)."
+        )
+    else:
+        logger.info(f"Built {index_type} index over {count} vectors (too few to measure recall).")
+    return report
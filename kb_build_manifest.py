@@ -0,0 +1,206 @@
+# kb_build_manifest.py
+# ==============================================================================
+# Content-hash manifest for incremental knowledge base rebuilds.
+# ==============================================================================
+# The build scripts keep, next to each store, a manifest of
+#   record hash (page content + metadata) -> docstore id
+#   text hash (embedding model + page content) -> row in a cached vector file
+# On the next build, unchanged records keep their ids, texts that were
+# embedded before reuse their cached vector, and only new or edited texts
+# are sent to the embedding API. Records that disappeared from the source
+# data are simply not carried over, and their vectors are dropped from the
+# cache.
+#
+# While a build is embedding, every finished batch is appended to a
+# checkpoint file. If the build dies, the next run loads those vectors like
+# cached ones and only embeds what is still missing.
+
+import hashlib
+import json
+import logging
+import os
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+BUILD_CACHE_DIRNAME = "build_cache"
+MANIFEST_FILENAME = "manifest.json"
+VECTORS_FILENAME = "vectors.npy"
+CHECKPOINT_FILENAME = "checkpoint.jsonl"
+
+
+def record_hash(doc: Document) -> str:
+    payload = json.dumps({"p": doc.page_content, "m": doc.metadata}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def text_hash(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class BuildManifest:
+    """
+    The record ids and cached vectors of a store's previous build.
+    """
+
+    def __init__(self, db_path: str, model_name: str):
+        self.folder = os.path.join(db_path, BUILD_CACHE_DIRNAME)
+        self.model_name = model_name
+        self.record_ids: Dict[str, str] = {}
+        self.vectors: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def load(cls, db_path: str, model_name: str) -> "BuildManifest":
+        """Loads the manifest of the previous build (empty if there is none)."""
+        manifest = cls(db_path, model_name)
+        manifest._load_checkpoint()
+        manifest_path = os.path.join(manifest.folder, MANIFEST_FILENAME)
+        if not os.path.exists(manifest_path):
+            return manifest
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            matrix = np.load(os.path.join(manifest.folder, VECTORS_FILENAME))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable build manifest in '{manifest.folder}': {e}")
+            return manifest
+
+        manifest.record_ids = data.get("records", {})
+        # Vectors of another embedding model have other text hashes and are
+        # never matched.
+        for key, row in data.get("vectors", {}).items():
+            manifest.vectors.setdefault(key, matrix[row])
+        return manifest
+
+    @property
+    def checkpoint_path(self) -> str:
+        return os.path.join(self.folder, CHECKPOINT_FILENAME)
+
+    def _load_checkpoint(self) -> None:
+        """Loads the vectors of batches finished by an interrupted build."""
+        if not os.path.exists(self.checkpoint_path):
+            return
+        resumed = 0
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write
+                    continue
+                self.vectors[record["key"]] = np.asarray(record["vector"], dtype=np.float32)
+                resumed += 1
+        if resumed:
+            print(f"♻️ Resuming: {resumed} vectors recovered from the last interrupted build.")
+
+    async def checkpoint_batch(self, batch_number: int, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """Durably records a finished batch (an `EmbeddingPipeline` batch callback)."""
+        self.add_vectors(texts, vectors)
+        os.makedirs(self.folder, exist_ok=True)
+        payload = "".join(
+            json.dumps({"key": text_hash(self.model_name, text), "vector": list(map(float, vector))}) + "\n"
+            for text, vector in zip(texts, vectors)
+        )
+        with open(self.checkpoint_path, "a", encoding="utf-8") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def plan(self, documents: Sequence[Document]) -> Tuple[List[str], List[str], Dict[str, int]]:
+        """
+        Works out what a build of `documents` has to do.
+
+        Returns:
+            `(ids, texts_to_embed, stats)`: a docstore id per document, the
+            distinct texts with no cached vector, and unchanged / new /
+            removed record counts.
+        """
+        ids, seen_records, to_embed = [], set(), {}
+        unchanged = 0
+        for doc in documents:
+            key = record_hash(doc)
+            if key in self.record_ids and key not in seen_records:
+                ids.append(self.record_ids[key])
+                unchanged += 1
+            else:
+                ids.append(uuid.uuid4().hex)
+            seen_records.add(key)
+            if text_hash(self.model_name, doc.page_content) not in self.vectors:
+                to_embed.setdefault(doc.page_content, None)
+
+        stats = {
+            "unchanged": unchanged,
+            "new_or_changed": len(documents) - unchanged,
+            "removed": len(set(self.record_ids) - seen_records),
+            "texts_to_embed": len(to_embed),
+        }
+        return ids, list(to_embed), stats
+
+    def add_vectors(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        for text, vector in zip(texts, vectors):
+            self.vectors[text_hash(self.model_name, text)] = np.asarray(vector, dtype=np.float32)
+
+    def vectors_for(self, documents: Sequence[Document]) -> List[List[float]]:
+        return [self.vectors[text_hash(self.model_name, doc.page_content)].tolist() for doc in documents]
+
+    def save(self, documents: Sequence[Document], ids: Sequence[str]) -> None:
+        """
+        Records this build: only the given documents and their vectors are
+        kept, so removed records do not linger in the cache.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        keys = list(dict.fromkeys(text_hash(self.model_name, doc.page_content) for doc in documents))
+        matrix = np.vstack([self.vectors[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+
+        tmp_vectors = os.path.join(self.folder, "vectors.tmp.npy")
+        np.save(tmp_vectors, matrix)
+        os.replace(tmp_vectors, os.path.join(self.folder, VECTORS_FILENAME))
+        data = {
+            "embedding_model": self.model_name,
+            "records": {record_hash(doc): doc_id for doc, doc_id in zip(documents, ids)},
+            "vectors": {key: row for row, key in enumerate(keys)},
+        }
+        tmp_manifest = os.path.join(self.folder, MANIFEST_FILENAME + ".tmp")
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_manifest, os.path.join(self.folder, MANIFEST_FILENAME))
+        # Everything in the checkpoint is now in the manifest
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+
+def embed_incrementally(
+    documents: Sequence[Document],
+    embed: Callable[[List[str], Optional[Callable[..., Any]]], List[List[float]]],
+    db_path: str,
+    model_name: str,
+) -> Tuple[List[str], List[List[float]]]:
+    """
+    Embeds only the new or changed texts of a build and reuses the cached
+    vectors of everything else.
+
+    Args:
+        documents: Every document of the new build.
+        embed: Embeds a list of texts, awaiting a batch callback after each
+            finished batch, e.g. `EmbeddingPipeline.embed`.
+        db_path: The store folder that holds the build cache.
+        model_name: The embedding model; changing it invalidates the cache.
+
+    Returns:
+        `(ids, vectors)` aligned with `documents`.
+    """
+    manifest = BuildManifest.load(db_path, model_name)
+    ids, texts_to_embed, stats = manifest.plan(documents)
+    print(
+        f"🧮 {stats['unchanged']} unchanged, {stats['new_or_changed']} new or changed, "
+        f"{stats['removed']} removed records; {stats['texts_to_embed']} texts to embed."
+    )
+    if texts_to_embed:
+        # Batches are checkpointed as they finish, so a failed build resumes
+        manifest.add_vectors(texts_to_embed, embed(texts_to_embed, manifest.checkpoint_batch))
+    manifest.save(documents, ids)
+    return ids, manifest.vectors_for(documents)
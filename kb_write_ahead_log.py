@@ -0,0 +1,89 @@
+# kb_write_ahead_log.py
+# ==============================================================================
+# Append-only write-ahead log for knowledge base additions.
+# ==============================================================================
+# Documents added at runtime go to the live in-memory FAISS store right away
+# and are appended here first, so they survive a restart without rewriting
+# the whole index. A snapshot folds the log into the saved index: the log is
+# rotated before the snapshot is taken and the rotated file is deleted once
+# the snapshot is on disk.
+
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+WAL_FILENAME = "kb_wal.jsonl"
+ROTATED_SUFFIX = ".snapshotting"
+
+
+class WriteAheadLog:
+    """
+    A JSON-lines log of `{"id", "page_content", "metadata", "vector"}` records.
+    Records carry their embedding, so replaying the log never calls the
+    embedding model.
+    """
+
+    def __init__(self, folder: str, filename: str = WAL_FILENAME):
+        self.path = os.path.join(folder, filename)
+        self.rotated_path = self.path + ROTATED_SUFFIX
+        self._lock = threading.Lock()
+        self.pending_records = sum(1 for _ in self._read(self.path))
+
+    def append(self, records: List[Dict[str, Any]]) -> None:
+        """Durably appends records (one write and fsync for the whole batch)."""
+        if not records:
+            return
+        payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            self.pending_records += len(records)
+
+    @staticmethod
+    def _read(path: str) -> Iterator[Dict[str, Any]]:
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append
+                    logger.warning(f"Skipping unreadable WAL record {path}:{line_number}.")
+
+    def replay(self) -> Iterator[Dict[str, Any]]:
+        """Yields every logged record, including those of an interrupted snapshot."""
+        yield from self._read(self.rotated_path)
+        yield from self._read(self.path)
+
+    def rotate(self) -> bool:
+        """
+        Moves the current log aside before a snapshot. New appends start a
+        fresh file. Returns False if there was nothing to rotate.
+        """
+        with self._lock:
+            if not os.path.exists(self.path):
+                return False
+            if os.path.exists(self.rotated_path):
+                # A previous snapshot failed; keep its records in front of ours.
+                with open(self.path, "r", encoding="utf-8") as src, open(self.rotated_path, "a", encoding="utf-8") as dst:
+                    dst.write(src.read())
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self.rotated_path)
+            self.pending_records = 0
+            return True
+
+    def commit_rotation(self) -> None:
+        """Drops the rotated log once the snapshot containing it is saved."""
+        with self._lock:
+            if os.path.exists(self.rotated_path):
+                os.remove(self.rotated_path)
@@ -0,0 +1,180 @@
+# metrics.py
+# ==============================================================================
+# In-process metrics in the Prometheus text exposition format.
+# ==============================================================================
+# Counters, gauges and histograms for where job latency goes: graph nodes,
+# retrieval, embedding and LLM calls, plus job outcomes. Values that already
+# live elsewhere (queue depth, cache hit counters) are read through callbacks
+# at scrape time instead of being duplicated. `render()` produces the body of
+# the /metrics endpoint.
+#
+# The server runs as a single process, so a small registry here does the job
+# without adding prometheus_client as a dependency.
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+
+# Seconds; spans the sub-millisecond lookups up to multi-minute jobs.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelValues = Tuple[str, ...]
+CallbackValue = Union[float, Dict[LabelValues, float]]
+
+_registry: List["_Metric"] = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric '{self.name}' takes labels {self.labelnames}, got {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]:
+        """The sample lines of the metric, without the HELP/TYPE header."""
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.metric_type}\n"
+        return header + "".join(f"{line}\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    """A monotonically increasing count, e.g. of finished jobs."""
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Observed durations (or sizes) counted into cumulative buckets."""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> (bucket counts, sum, count)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observes the seconds spent in the `with` block, even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+
+class CallbackMetric(_Metric):
+    """
+    A gauge or counter whose value is read from `function` at scrape time.
+    The function returns a number, or `{label values tuple: number}` when
+    the metric has labels.
+    """
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], CallbackValue],
+                 metric_type: str = "gauge", labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.metric_type = metric_type
+        self.function = function
+
+    def samples(self) -> Iterator[str]:
+        value = self.function()
+        values = value if isinstance(value, dict) else {(): value}
+        for key, sample in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(sample)}"
+
+
+def render() -> str:
+    """Renders every registered metric in the Prometheus text format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    parts = []
+    for metric in metrics:
+        try:
+            parts.append(metric.render())
+        except Exception as e:
+            # A broken callback must not take the whole endpoint down
+            parts.append(f"# {metric.name} unavailable: {_escape(str(e))}\n")
+    return "".join(parts)
+
+
+# --- Shared Metrics ---
+NODE_SECONDS = Histogram("verse_agent_node_seconds", "Time spent in each agent graph node.", ["node"])
+RETRIEVAL_SECONDS = Histogram("verse_agent_retrieval_seconds", "Time spent retrieving RAG context, by store.", ["store"])
+EMBEDDING_SECONDS = Histogram("verse_agent_embedding_request_seconds", "Time spent in embedding API calls (cache misses only).", ["kind"])
+EMBEDDING_TEXTS = Counter("verse_agent_embedded_texts_total", "Texts sent to the embedding API.", ["kind"])
+LLM_SECONDS = Histogram("verse_agent_llm_request_seconds", "Time spent in LLM calls, by chain.", ["chain"])
+LLM_ERRORS = Counter("verse_agent_llm_errors_total", "LLM calls that raised, by chain.", ["chain"])
+JOB_SECONDS = Histogram("verse_agent_job_seconds", "Time from a worker picking up a job to its final status.", ["outcome"])
+LLM_TOKENS = Counter("verse_agent_llm_tokens_total", "Tokens reported by the LLM, by chain and kind (input, output, cached_input).", ["chain", "kind"])
+CONTEXT_BLOCKS_DROPPED = Counter("verse_agent_context_blocks_dropped_total", "RAG context blocks left out to fit the prompt budget.", ["context"])
+JOBS = Counter("verse_agent_jobs_total", "Finished code generation jobs, by outcome.", ["outcome"])
@@ -0,0 +1,183 @@
+# mmap_docstore.py
+# ==============================================================================
+# Compact, memory-mapped on-disk format for the FAISS vector stores.
+# ==============================================================================
+# A store folder in this format holds:
+#   index.faiss            the FAISS index, opened with IO_FLAG_MMAP
+#   docstore.bin           the documents, one compact JSON record after another
+#   docstore.offsets.npy   int64 byte offsets of the records (N + 1 entries)
+#   docstore.ids.json      the docstore id of every record, in index order
+#
+# Nothing but the ids is read at startup: records are decoded only when a
+# search hits them, and the index and payload pages are shared by every
+# worker process that maps the same files. Documents added at runtime live
+# in a small in-memory overlay until the next snapshot rewrites the files.
+#
+# Run `python mmap_docstore.py <folder>` to convert a folder saved with
+# `FAISS.save_local` (index.faiss + index.pkl) in place.
+
+import json
+import logging
+import mmap
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "index.faiss"
+PAYLOAD_FILENAME = "docstore.bin"
+OFFSETS_FILENAME = "docstore.offsets.npy"
+IDS_FILENAME = "docstore.ids.json"
+
+
+def encode_document(doc: Document) -> bytes:
+    return json.dumps({"p": doc.page_content, "m": doc.metadata}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode_document(data: bytes) -> Document:
+    record = json.loads(data)
+    return Document(page_content=record["p"], metadata=record["m"])
+
+
+class MmapDocstore(Docstore, AddableMixin):
+    """
+    A read-mostly docstore over a memory-mapped payload file, with an
+    in-memory overlay for documents added after it was saved.
+    """
+
+    def __init__(self, folder: Optional[str] = None):
+        self._mm: Optional[mmap.mmap] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._positions: Dict[str, int] = {}
+        self._added: Dict[str, Document] = {}
+        self._deleted: set = set()
+        if folder is None:
+            return
+
+        with open(os.path.join(folder, IDS_FILENAME), "r", encoding="utf-8") as f:
+            doc_ids = json.load(f)
+        self._positions = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+        self._offsets = np.load(os.path.join(folder, OFFSETS_FILENAME), mmap_mode="r")
+        if os.path.getsize(os.path.join(folder, PAYLOAD_FILENAME)):
+            with open(os.path.join(folder, PAYLOAD_FILENAME), "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self._positions) + len(self._added) - len(self._deleted)
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Returns the document with this id, decoding it from disk if needed."""
+        if search in self._added:
+            return self._added[search]
+        position = self._positions.get(search)
+        if position is None or search in self._deleted:
+            return f"ID {search} not found."
+        return decode_document(self._mm[int(self._offsets[position]):int(self._offsets[position + 1])])
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = (set(texts) & set(self._positions)) - self._deleted
+        if overlapping or set(texts) & set(self._added):
+            raise ValueError(f"Tried to add ids that already exist: {overlapping or set(texts) & set(self._added)}")
+        self._added.update(texts)
+
+    def delete(self, ids: List) -> None:
+        for doc_id in ids:
+            if doc_id in self._added:
+                del self._added[doc_id]
+            elif doc_id in self._positions:
+                self._deleted.add(doc_id)
+            else:
+                raise ValueError(f"ID {doc_id} not found.")
+
+    def record_bytes(self, doc_id: str) -> bytes:
+        """Returns the encoded record of a document without decoding it."""
+        position = self._positions.get(doc_id)
+        if doc_id in self._added or position is None:
+            return encode_document(self._added[doc_id])
+        return self._mm[int(self._offsets[position]):int(self._offsets[position + 1])]
+
+
+def is_compact_store(folder: str) -> bool:
+    return os.path.exists(os.path.join(folder, PAYLOAD_FILENAME))
+
+
+def _record_bytes(docstore: Any, doc_id: str) -> bytes:
+    if isinstance(docstore, MmapDocstore):
+        return docstore.record_bytes(doc_id)
+    return encode_document(docstore.search(doc_id))
+
+
+def write_compact_docstore(folder: str, doc_ids: Iterable[str], docstore: Any) -> None:
+    """
+    Writes the documents of `doc_ids` (in index order) from any docstore to
+    the payload, offsets and ids files of a folder.
+    """
+    doc_ids = list(doc_ids)
+    offsets = np.zeros(len(doc_ids) + 1, dtype=np.int64)
+    with open(os.path.join(folder, PAYLOAD_FILENAME), "wb") as f:
+        for i, doc_id in enumerate(doc_ids):
+            data = _record_bytes(docstore, doc_id)
+            f.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+        f.flush()
+        os.fsync(f.fileno())
+    np.save(os.path.join(folder, OFFSETS_FILENAME), offsets)
+    with open(os.path.join(folder, IDS_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(doc_ids, f)
+
+
+def save_compact_store(store: FAISS, folder: str) -> None:
+    """Saves a LangChain FAISS store to a folder in the compact format."""
+    os.makedirs(folder, exist_ok=True)
+    faiss = dependable_faiss_import()
+    faiss.write_index(store.index, os.path.join(folder, INDEX_FILENAME))
+    doc_ids = [store.index_to_docstore_id[i] for i in range(store.index.ntotal)]
+    write_compact_docstore(folder, doc_ids, store.docstore)
+
+
+def load_compact_store(folder: str, embeddings: Embeddings, writable: bool = False, **kwargs: Any) -> FAISS:
+    """
+    Opens a compact store: the FAISS index is memory-mapped and documents are
+    read lazily. No pickle is involved.
+
+    Args:
+        writable: The store will get runtime additions. Memory-mapped IVF
+            inverted lists are read-only, so IVF indexes are then read into
+            memory instead (flat and HNSW indexes stay mapped).
+    """
+    faiss = dependable_faiss_import()
+    index_path = os.path.join(folder, INDEX_FILENAME)
+    index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+    if writable and faiss.try_extract_index_ivf(index) is not None:
+        index = faiss.read_index(index_path)
+    docstore = MmapDocstore(folder)
+    with open(os.path.join(folder, IDS_FILENAME), "r", encoding="utf-8") as f:
+        index_to_docstore_id = dict(enumerate(json.load(f)))
+    if len(index_to_docstore_id) != index.ntotal:
+        raise ValueError(f"'{folder}' has {index.ntotal} vectors but {len(index_to_docstore_id)} documents.")
+    return FAISS(embeddings, index, docstore, index_to_docstore_id, **kwargs)
+
+
+def convert_pickle_store(folder: str) -> None:
+    """Rewrites a folder saved with `FAISS.save_local` in the compact format."""
+    import pickle
+
+    with open(os.path.join(folder, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    doc_ids = [index_to_docstore_id[i] for i in range(len(index_to_docstore_id))]
+    write_compact_docstore(folder, doc_ids, docstore)
+    logger.info(f"Converted {len(doc_ids)} documents in '{folder}' to the compact format.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    for target in sys.argv[1:]:
+        convert_pickle_store(target)
@@ -0,0 +1,11 @@
+# tests/conftest.py
+
+import os
+
+# Importing `backend` creates the shared embeddings in vector_store_manager
+# (the agent itself is only built by `get_agent()`, and its chat model with
+# it); use the local backends so the tests need neither credentials nor
+# network.
+os.environ.setdefault("EMBEDDINGS_PROVIDER", "hash")
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("PROMPT_CACHE_ENABLED", "false")
@@ -0,0 +1,26 @@
+# tests/test_admin_auth.py
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as app_module
+
+
+@pytest.fixture
+def client():
+    # Not used as a context manager: the startup handlers (stores, workers)
+    # are not needed to check the admin guard.
+    return TestClient(app_module.app)
+
+
+def test_admin_endpoints_are_closed_without_a_configured_key(client, monkeypatch):
+    monkeypatch.setattr(app_module, "ADMIN_API_KEY", "")
+    assert client.get("/admin/vector-stores").status_code == 403
+    assert client.get("/admin/vector-stores", headers={"X-Admin-Key": ""}).status_code == 403
+    assert client.post("/admin/vector-stores/verse_rag/reload").status_code == 403
+
+
+def test_admin_endpoints_require_the_configured_key(client, monkeypatch):
+    monkeypatch.setattr(app_module, "ADMIN_API_KEY", "secret")
+    assert client.get("/admin/vector-stores", headers={"X-Admin-Key": "wrong"}).status_code == 403
+    assert client.get("/admin/vector-stores", headers={"X-Admin-Key": "secret"}).status_code == 200
@@ -0,0 +1,59 @@
+# tests/test_answer_cache.py
+
+import asyncio
+
+from backend.services.answer_cache import AnswerCache
+
+
+class _ConstantEmbeddings:
+    """Embeds every question to the same vector, so any lookup is a near-duplicate."""
+
+    async def aembed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+
+class _Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+def _cache(**kwargs):
+    clock = _Clock()
+    return AnswerCache(_ConstantEmbeddings(), ttl_seconds=60, near_match_mode="serve", clock=clock.time, **kwargs), clock
+
+
+def test_recently_read_entry_is_not_served_past_its_ttl():
+    cache, clock = _cache()
+    asyncio.run(cache.store("first question", "code 1"))
+    clock.now += 30
+    asyncio.run(cache.store("second question", "code 2"))
+    # Reading the first entry makes it the most recently used, behind a live one
+    assert cache.get_exact("first question")["final_code"] == "code 1"
+
+    clock.now += 40
+    assert cache.get_exact("first question") is None
+    assert cache.get_exact("second question")["final_code"] == "code 2"
+    assert cache.stats()["entries"] == 1
+
+
+def test_semantic_hit_is_not_served_past_its_ttl():
+    cache, clock = _cache()
+    asyncio.run(cache.store("first question", "code 1"))
+    assert asyncio.run(cache.lookup("a different question"))["match"] == "semantic"
+
+    clock.now += 61
+    assert asyncio.run(cache.lookup("a different question")) is None
+
+
+def test_least_recently_used_entry_is_evicted_past_the_size_cap():
+    cache, clock = _cache(max_entries=2)
+    asyncio.run(cache.store("first question", "code 1"))
+    asyncio.run(cache.store("second question", "code 2"))
+    cache.get_exact("first question")
+    asyncio.run(cache.store("third question", "code 3"))
+
+    assert cache.get_exact("second question") is None
+    assert cache.get_exact("first question")["final_code"] == "code 1"
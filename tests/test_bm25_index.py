@@ -0,0 +1,57 @@
+# tests/test_bm25_index.py
+
+import numpy as np
+
+from bm25_index import BM25Index, tokenize
+
+TEXTS = {
+    "a": "Subscribe to the trigger device TriggeredEvent",
+    "b": "Show a HUD message with the score",
+    "c": "Spawn a prop when the button is pressed",
+}
+
+
+def _index(items=TEXTS):
+    index = BM25Index()
+    index.add_documents(list(items), list(items.values()))
+    return index
+
+
+def test_tokenize_lowercases_words():
+    assert tokenize("HUD_message, Score!") == ["hud_message", "score"]
+
+
+def test_search_ranks_documents_containing_the_query_terms():
+    results = _index().search("trigger event device", k=3)
+    assert [doc_id for doc_id, _ in results] == ["a"]
+    assert results[0][1] > 0
+
+
+def test_incremental_adds_score_like_a_single_build():
+    incremental = BM25Index()
+    for doc_id, text in TEXTS.items():
+        incremental.add_documents([doc_id], [text])
+    np.testing.assert_allclose(incremental.get_scores("the HUD score"), _index().get_scores("the HUD score"))
+
+
+def test_documents_already_indexed_are_skipped():
+    index = _index()
+    index.add_documents(["a"], ["something else entirely"])
+    assert len(index) == 3
+    assert index.position_of("a") == 0
+    assert index.search("something", k=3) == []
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = _index()
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    assert loaded.doc_ids == index.doc_ids
+    assert loaded.search("prop button", k=2) == index.search("prop button", k=2)
+    # The loaded index is still updatable
+    loaded.add_documents(["d"], ["button"])
+    assert loaded.search("button", k=1)[0][0] == "d"
+
+
+def test_load_returns_none_without_a_saved_index(tmp_path):
+    assert BM25Index.load(str(tmp_path)) is None
@@ -0,0 +1,62 @@
+# tests/test_hybrid_search.py
+
+import asyncio
+
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from backend.utils.hybrid_search_utils import HybridSearchEngine, _min_max
+from bm25_index import BM25Index
+from embedding_providers import HashingEmbeddings
+
+TEXTS = [
+    "Subscribe to the trigger device TriggeredEvent",
+    "Show a HUD message with the player score",
+    "Spawn a prop when the button device is pressed",
+    "Teleport the player to a checkpoint",
+]
+
+
+@pytest.fixture(scope="module")
+def store():
+    return FAISS.from_documents([Document(page_content=text) for text in TEXTS], HashingEmbeddings())
+
+
+def _bm25(store):
+    index = BM25Index()
+    doc_ids = [store.index_to_docstore_id[i] for i in range(store.index.ntotal)]
+    index.add_documents(doc_ids, TEXTS)
+    return index
+
+
+def test_min_max_scales_to_unit_range():
+    assert _min_max(np.array([2.0, 4.0, 3.0])).tolist() == [0.0, 1.0, 0.5]
+    assert _min_max(np.array([5.0, 5.0])).tolist() == [1.0, 1.0]
+
+
+def test_results_are_fused_best_first_and_capped_at_k(store):
+    engine = HybridSearchEngine(store, _bm25(store))
+    results = asyncio.run(engine.asearch("trigger device event", k=2))
+    assert len(results) == 2
+    assert results[0][1] >= results[1][1]
+    top = store.docstore.search(results[0][0])
+    assert top.page_content == TEXTS[0]
+
+
+def test_keyword_only_engine_weights_follow_bm25(store):
+    engine = HybridSearchEngine(store, _bm25(store), bm25_weight=1.0, dense_weight=0.0)
+    [(doc_id, score)] = asyncio.run(engine.asearch("checkpoint", k=1))
+    assert store.docstore.search(doc_id).page_content == TEXTS[3]
+    assert score == pytest.approx(1.0)
+
+
+def test_dense_only_search_without_a_bm25_index(store):
+    engine = HybridSearchEngine(store, None)
+    documents = asyncio.run(engine.asearch_documents("Show a HUD message with the player score", k=1))
+    assert [doc.page_content for doc in documents] == [TEXTS[1]]
+
+
+def test_non_positive_k_returns_nothing(store):
+    assert HybridSearchEngine(store, _bm25(store)).search_by_vector("trigger", [0.0] * 768, 0) == []
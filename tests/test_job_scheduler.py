@@ -0,0 +1,89 @@
+# tests/test_job_scheduler.py
+
+import asyncio
+
+import pytest
+
+from backend.services.job_scheduler import JobQueueFullError, JobScheduler
+
+
+def test_jobs_run_at_most_worker_count_at_a_time():
+    async def run():
+        scheduler = JobScheduler(worker_count=2, max_queue_size=10)
+        await scheduler.start()
+        running, peak, done = 0, 0, []
+
+        def job(n):
+            async def body():
+                nonlocal running, peak
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+                done.append(n)
+            return body
+
+        for n in range(6):
+            scheduler.submit(f"job-{n}", job(n))
+        while len(done) < 6:
+            await asyncio.sleep(0.01)
+        await scheduler.stop()
+        return peak, done
+
+    peak, done = asyncio.run(run())
+    assert peak == 2
+    assert sorted(done) == list(range(6))
+
+
+def test_full_queue_rejects_with_retry_after_and_reports_positions():
+    async def run():
+        release = asyncio.Event()
+        positions = []
+
+        async def on_queue_position(job_id, position, depth):
+            positions.append((job_id, position, depth))
+
+        scheduler = JobScheduler(worker_count=1, max_queue_size=2, on_queue_position=on_queue_position)
+        await scheduler.start()
+
+        async def blocked():
+            await release.wait()
+
+        scheduler.submit("running", lambda: blocked())
+        await asyncio.sleep(0.01)
+        assert scheduler.submit("first", lambda: blocked()) == 1
+        assert scheduler.submit("second", lambda: blocked()) == 2
+        assert scheduler.queue_position("second") == 2
+        with pytest.raises(JobQueueFullError) as rejected:
+            scheduler.submit("third", lambda: blocked())
+        assert rejected.value.retry_after >= 1
+
+        release.set()
+        while scheduler.queue_depth or scheduler.running_count:
+            await asyncio.sleep(0.01)
+        await scheduler.stop()
+        return positions
+
+    positions = asyncio.run(run())
+    # When "first" started, "second" moved to the front of the queue
+    assert ("second", 1, 1) in positions
+
+
+def test_a_failing_job_does_not_stop_its_worker():
+    async def run():
+        scheduler = JobScheduler(worker_count=1, max_queue_size=5)
+        await scheduler.start()
+        done = asyncio.Event()
+
+        async def failing():
+            raise RuntimeError("boom")
+
+        async def succeeding():
+            done.set()
+
+        scheduler.submit("failing", failing)
+        scheduler.submit("succeeding", succeeding)
+        await asyncio.wait_for(done.wait(), 1)
+        await scheduler.stop()
+
+    asyncio.run(run())
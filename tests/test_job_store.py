@@ -0,0 +1,105 @@
+# tests/test_job_store.py
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from backend.services.job_store import InMemoryJobStore, SQLiteJobStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    stores = []
+
+    def make(**kwargs):
+        if request.param == "memory":
+            store = InMemoryJobStore(**kwargs)
+        else:
+            store = SQLiteJobStore(str(tmp_path / "jobs.sqlite"), **kwargs)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        asyncio.run(store.close())
+
+
+def test_set_and_get_round_trip(make_store):
+    store = make_store()
+    usage = {"input_tokens": 10, "calls": [{"call": "generate"}]}
+
+    async def run():
+        await store.set("job", "queued")
+        await store.set("job", "completed", result="code", usage=usage)
+        return await store.get("job"), await store.get("missing"), await store.count()
+
+    record, missing, count = asyncio.run(run())
+    assert record == {"status": "completed", "result": "code", "error": None, "usage": usage}
+    assert missing is None
+    assert count == 1
+
+
+def test_oldest_jobs_are_evicted_past_the_size_cap(make_store):
+    store = make_store(max_jobs=2)
+
+    async def run():
+        for n in range(3):
+            await store.set(f"job-{n}", "queued")
+        return [await store.get(f"job-{n}") for n in range(3)], await store.count()
+
+    records, count = asyncio.run(run())
+    assert records[0] is None and records[1] and records[2]
+    assert count == 2
+
+
+def test_expired_jobs_are_not_returned(make_store):
+    store = make_store(ttl_seconds=-1)
+    asyncio.run(store.set("job", "completed"))
+    assert asyncio.run(store.get("job")) is None
+
+
+def test_writes_are_applied_in_order(make_store):
+    store = make_store()
+
+    async def run():
+        # Submitted without waiting in between, as concurrent status updates are
+        await asyncio.gather(*(store.set("job", status) for status in ("queued", "processing", "completed")))
+        return await store.get("job")
+
+    assert asyncio.run(run())["status"] == "completed"
+
+
+def test_sqlite_store_fails_unfinished_jobs_on_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    store = SQLiteJobStore(path)
+
+    async def fill():
+        await store.set("running", "processing")
+        await store.set("done", "completed", result="code")
+        await store.close()
+
+    asyncio.run(fill())
+    reopened = SQLiteJobStore(path)
+    try:
+        assert asyncio.run(reopened.get("running"))["status"] == "failed"
+        assert asyncio.run(reopened.get("done"))["result"] == "code"
+    finally:
+        asyncio.run(reopened.close())
+
+
+def test_sqlite_store_adds_the_usage_column_to_old_files(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (job_id TEXT PRIMARY KEY, status TEXT NOT NULL, result TEXT, error TEXT, updated_at REAL NOT NULL)"
+    )
+    conn.commit()
+    conn.close()
+
+    store = SQLiteJobStore(path)
+    try:
+        asyncio.run(store.set("job", "completed", usage={"total_tokens": 3}))
+        assert asyncio.run(store.get("job"))["usage"] == {"total_tokens": 3}
+    finally:
+        asyncio.run(store.close())
@@ -0,0 +1,28 @@
+# tests/test_request_coalescer.py
+
+from backend.services.request_coalescer import RequestCoalescer
+
+
+def test_identical_questions_share_the_leader_until_it_finishes():
+    coalescer = RequestCoalescer()
+    coalescer.register_leader("How do I use a trigger?", "leader")
+    # Normalized the same way as the answer cache keys
+    assert coalescer.in_flight_leader("  how do I use a TRIGGER ") == "leader"
+
+    coalescer.add_follower("leader", "follower-1")
+    coalescer.add_follower("leader", "follower-2")
+    assert coalescer.followers("leader") == ["follower-1", "follower-2"]
+    assert coalescer.leader_of("follower-1") == "leader"
+    assert coalescer.coalesced_count == 2
+
+    assert coalescer.finish("How do I use a trigger?", "leader") == ["follower-1", "follower-2"]
+    assert coalescer.in_flight_leader("How do I use a trigger?") is None
+    assert coalescer.leader_of("follower-1") is None
+
+
+def test_finishing_an_old_leader_keeps_a_newer_one_registered():
+    coalescer = RequestCoalescer()
+    coalescer.register_leader("question", "old")
+    coalescer.register_leader("question", "new")
+    coalescer.finish("question", "old")
+    assert coalescer.in_flight_leader("question") == "new"
@@ -0,0 +1,37 @@
+# tests/test_vector_store_versions.py
+
+import os
+
+from vector_store_versions import current_version, list_versions, new_version_folder, publish_version, resolve_store_folder
+
+
+def test_flat_layout_without_a_published_version(tmp_path):
+    assert current_version(str(tmp_path)) is None
+    assert resolve_store_folder(str(tmp_path)) == str(tmp_path)
+
+
+def test_publish_points_readers_at_the_new_version(tmp_path):
+    store = str(tmp_path)
+    version, folder = new_version_folder(store)
+    publish_version(store, version)
+    assert current_version(store) == version
+    assert resolve_store_folder(store) == folder
+
+
+def test_publish_keeps_only_the_newest_versions(tmp_path):
+    store = str(tmp_path)
+    versions = []
+    for _ in range(4):
+        version, _ = new_version_folder(store)
+        versions.append(version)
+        publish_version(store, version, keep=2)
+    assert list_versions(store) == sorted(versions)[-2:]
+    assert current_version(store) == versions[-1]
+
+
+def test_missing_published_version_falls_back_to_the_flat_layout(tmp_path):
+    store = str(tmp_path)
+    version, folder = new_version_folder(store)
+    publish_version(store, version)
+    os.rmdir(folder)
+    assert resolve_store_folder(store) == store
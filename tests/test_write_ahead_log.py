@@ -0,0 +1,115 @@
+# tests/test_write_ahead_log.py
+
+import asyncio
+import threading
+
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+import vector_store_manager
+from kb_write_ahead_log import WriteAheadLog
+from vector_store_versions import current_version
+
+STORE = "verse_rag"
+
+
+def _record(doc_id):
+    return {"id": doc_id, "page_content": f"question {doc_id}", "metadata": {}, "vector": [0.0, 1.0]}
+
+
+def test_log_replays_records_across_a_failed_snapshot(tmp_path):
+    wal = WriteAheadLog(str(tmp_path))
+    wal.append([_record("a"), _record("b")])
+    assert wal.rotate()
+    wal.append([_record("c")])
+    # The snapshot failed: the rotated records come first, then the new ones
+    assert [r["id"] for r in wal.replay()] == ["a", "b", "c"]
+    assert wal.rotate()
+    wal.commit_rotation()
+    assert list(wal.replay()) == []
+
+
+def test_torn_final_line_is_skipped(tmp_path):
+    wal = WriteAheadLog(str(tmp_path))
+    wal.append([_record("a")])
+    with open(wal.path, "a", encoding="utf-8") as f:
+        f.write('{"id": "b", "page_con')
+    assert [r["id"] for r in WriteAheadLog(str(tmp_path)).replay()] == ["a"]
+
+
+@pytest.fixture
+def live_store(tmp_path, monkeypatch):
+    """A small verse_rag store on disk, loaded through vector_store_manager."""
+    path = str(tmp_path / STORE)
+    documents = [Document(page_content=f"how to use device {n}", metadata={"code": str(n)}) for n in range(5)]
+    FAISS.from_documents(documents, vector_store_manager.embeddings).save_local(path)
+
+    for attribute, value in (
+        ("DB_PATHS", {STORE: path}),
+        ("_vector_stores", {}),
+        ("_bm25_indexes", {}),
+        ("_write_ahead_logs", {}),
+        ("_store_versions", {}),
+        ("_store_locks", {STORE: threading.RLock()}),
+        ("_unapplied_records", {STORE: 0}),
+    ):
+        monkeypatch.setattr(vector_store_manager, attribute, value)
+
+    def load():
+        vector_store_manager._vector_stores.clear()
+        vector_store_manager._write_ahead_logs.clear()
+        vector_store_manager.load_all_vector_stores()
+        return vector_store_manager.get_vector_store(STORE)
+
+    return path, load
+
+
+def _append(text):
+    async def run():
+        vectors = await vector_store_manager.embeddings.aembed_documents([text])
+        return await vector_store_manager.append_documents(STORE, [Document(page_content=text, metadata={})], vectors)
+    return asyncio.run(run())
+
+
+def test_appended_documents_are_searchable_and_survive_a_restart(live_store):
+    path, load = live_store
+    store = load()
+    [doc_id] = _append("a brand new knowledge entry")
+    assert store.index.ntotal == 6
+    assert store.docstore.search(doc_id).page_content == "a brand new knowledge entry"
+    assert vector_store_manager.get_bm25_index(STORE).position_of(doc_id) == 5
+
+    # A restart replays the log on top of the saved index
+    restarted = load()
+    assert restarted is not store
+    assert restarted.index.ntotal == 6
+    assert restarted.docstore.search(doc_id).page_content == "a brand new knowledge entry"
+
+
+def test_snapshot_publishes_a_version_and_empties_the_log(live_store):
+    path, load = live_store
+    load()
+    [doc_id] = _append("an entry to snapshot")
+    assert vector_store_manager.snapshot_vector_store(STORE)
+    assert current_version(path) is not None
+    assert vector_store_manager._write_ahead_logs[STORE].pending_records == 0
+
+    restarted = load()
+    assert restarted.index.ntotal == 6
+    assert restarted.docstore.search(doc_id).page_content == "an entry to snapshot"
+
+
+def test_snapshot_waits_for_logged_records_to_be_applied(live_store):
+    path, load = live_store
+    load()
+    vector = vector_store_manager.embeddings.embed_documents(["pending"])
+    logged_store, records = vector_store_manager._log_documents(STORE, [Document(page_content="pending", metadata={})], vector)
+
+    # Logged but not applied yet: rotating now would drop it from disk
+    assert not vector_store_manager.snapshot_vector_store(STORE)
+
+    with vector_store_manager._store_locks[STORE]:
+        vector_store_manager._apply_logged_documents(STORE, logged_store, records)
+    assert vector_store_manager.snapshot_vector_store(STORE)
+    assert load().index.ntotal == 6
@@ -3,13 +3,31 @@
 # ==============================================================================
 # This module now loads and manages BOTH of your FAISS vector stores.
 
+import asyncio
 import os
 import getpass
+import hashlib
 import logging
-from typing import Dict, Optional
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
 from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from dotenv import load_dotenv
+from bm25_index import BM25Index, BM25_INDEX_FILENAME
+from embedding_providers import EMBEDDINGS_PROVIDER, create_embeddings, embedding_model_name
+from kb_write_ahead_log import WriteAheadLog
+from metrics import EMBEDDING_SECONDS, EMBEDDING_TEXTS
+from mmap_docstore import is_compact_store, load_compact_store, write_compact_docstore, INDEX_FILENAME
+from faiss_index_factory import apply_search_params
+from vector_store_versions import current_version, list_versions, new_version_folder, publish_version, resolve_store_folder
 
 # --- Configure Logging and Environment ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -27,42 +45,697 @@ DB_PATHS = {
     "device_rag": "Device_context_db"   # Path for your Device context RAG
 }
 
+# Stores that also get a persistent BM25 keyword index for hybrid search.
+BM25_STORES = ("verse_rag",)
+
+# Device documents are keyed by an exact "Device Name: <device>" page content.
+DEVICE_STORE = "device_rag"
+DEVICE_NAME_PREFIX = "Device Name:"
+
+# Stores that accept runtime additions through a write-ahead log.
+WAL_STORES = ("verse_rag",)
+# Runtime additions are folded into the saved index this often, or sooner
+# once this many records are waiting in the log.
+KB_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("KB_SNAPSHOT_INTERVAL_SECONDS", "300"))
+KB_SNAPSHOT_MAX_PENDING = int(os.getenv("KB_SNAPSHOT_MAX_PENDING", "500"))
+
 # --- In-memory cache for the loaded vector stores ---
 _vector_stores: Dict[str, FAISS] = {}
+_bm25_indexes: Dict[str, BM25Index] = {}
+_device_name_index: Dict[str, str] = {}
+_write_ahead_logs: Dict[str, WriteAheadLog] = {}
+# Version each live store was loaded from (None for the flat layout)
+_store_versions: Dict[str, Optional[str]] = {}
+# Serializes writes to a store with each other and with snapshotting.
+_store_locks: Dict[str, threading.RLock] = {name: threading.RLock() for name in DB_PATHS}
+# Records written to the log whose in-memory add is still to come.
+_unapplied_records: Dict[str, int] = {name: 0 for name in DB_PATHS}
+# How often the event loop retries the store lock while a snapshot holds it.
+STORE_LOCK_POLL_SECONDS = 0.01
+# Keeps snapshots from publishing over a version that is being reloaded.
+_publish_lock = threading.Lock()
+_snapshot_wakeup = threading.Event()
+_snapshot_stop = threading.Event()
+_snapshot_thread: Optional[threading.Thread] = None
+
+# --- Embedding Cache Configuration ---
+# Set by EMBEDDINGS_PROVIDER (see embedding_providers.py)
+EMBEDDING_MODEL_NAME = embedding_model_name()
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "4096"))
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Optional on-disk (SQLite) tier shared across restarts, e.g. "embedding_cache.sqlite"
+EMBEDDING_CACHE_DB_PATH = os.getenv("EMBEDDING_CACHE_DB_PATH", "")
+
+
+def _normalize_text(text: str) -> str:
+    """Collapses runs of whitespace so trivially different inputs share a cache entry."""
+    return " ".join(text.split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    An `Embeddings` wrapper that memoizes vectors so repeated and retried
+    queries skip the network round trip.
+
+    Entries are keyed by model name, embedding kind (query vs. document, which
+    the provider embeds differently) and normalized text. The in-memory tier is
+    an LRU bounded by entry count and approximate memory use, with a TTL; an
+    optional SQLite tier keeps vectors across restarts. Writes to that tier
+    are batched and committed by a background thread, and the async methods
+    read it in a worker thread, so the event loop never waits on SQLite.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_name: str,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+        max_bytes: int = EMBEDDING_CACHE_MAX_BYTES,
+        ttl_seconds: float = EMBEDDING_CACHE_TTL_SECONDS,
+        db_path: str = EMBEDDING_CACHE_DB_PATH,
+    ):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        # key -> (created_at, vector)
+        self._entries: "OrderedDict[str, tuple[float, array]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        # Serializes use of the SQLite connection between lookups and the writer
+        self._db_lock = threading.Lock()
+        # key -> (vector bytes, created_at), or None to delete; committed by the writer
+        self._pending_writes: Dict[str, Optional[tuple]] = {}
+        self._write_wakeup = threading.Event()
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB, created_at REAL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache disk tier disabled, could not open '{db_path}': {e}")
+                self._db = None
+            else:
+                threading.Thread(target=self._write_loop, name="embedding-cache-writer", daemon=True).start()
+
+    # --- Cache internals ---
+    def _key(self, kind: str, text: str) -> str:
+        raw = f"{self.model_name}\x00{kind}\x00{_normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _entry_size(key: str, vector: array) -> int:
+        return len(key) + vector.itemsize * len(vector)
+
+    def _get_memory(self, key: str) -> Optional[List[float]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created_at, vector = entry
+            if now - created_at <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector.tolist()
+            self._remove(key)
+            return None
+
+    def _get_disk(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Looks keys up in the SQLite tier (blocking: keep it off the event loop)."""
+        found: Dict[str, List[float]] = {}
+        if self._db is None or not keys:
+            return found
+        now = time.time()
+        with self._db_lock:
+            rows = [
+                (key, self._db.execute("SELECT vector, created_at FROM embeddings WHERE key = ?", (key,)).fetchone())
+                for key in keys
+            ]
+        for key, row in rows:
+            if row is None:
+                continue
+            if now - row[1] > self.ttl_seconds:
+                self._queue_write(key, None)
+                continue
+            vector = array("f")
+            vector.frombytes(row[0])
+            with self._lock:
+                self._insert(key, vector, row[1])
+                self.disk_hits += 1
+            found[key] = vector.tolist()
+        return found
+
+    def _count_misses(self, vectors: List[Optional[List[float]]]) -> None:
+        with self._lock:
+            self.misses += sum(1 for vector in vectors if vector is None)
+
+    def _get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        vectors = [self._get_memory(key) for key in keys]
+        found = self._get_disk(list(dict.fromkeys(k for k, v in zip(keys, vectors) if v is None)))
+        vectors = [vector if vector is not None else found.get(key) for key, vector in zip(keys, vectors)]
+        self._count_misses(vectors)
+        return vectors
+
+    async def _aget_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Like `_get_many`, with the disk tier read in a worker thread."""
+        vectors = [self._get_memory(key) for key in keys]
+        disk_keys = list(dict.fromkeys(k for k, v in zip(keys, vectors) if v is None)) if self._db is not None else []
+        if disk_keys:
+            found = await asyncio.get_running_loop().run_in_executor(None, self._get_disk, disk_keys)
+            vectors = [vector if vector is not None else found.get(key) for key, vector in zip(keys, vectors)]
+        self._count_misses(vectors)
+        return vectors
+
+    def _put(self, key: str, values: List[float]) -> None:
+        vector = array("f", values)
+        created_at = time.time()
+        with self._lock:
+            self._insert(key, vector, created_at)
+        if self._db is not None:
+            self._queue_write(key, (vector.tobytes(), created_at))
+
+    def _queue_write(self, key: str, row: Optional[tuple]) -> None:
+        with self._lock:
+            self._pending_writes[key] = row
+        self._write_wakeup.set()
+
+    def _write_loop(self) -> None:
+        while True:
+            self._write_wakeup.wait()
+            self._write_wakeup.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Commits the queued disk tier writes."""
+        with self._lock:
+            pending, self._pending_writes = self._pending_writes, {}
+        if not pending or self._db is None:
+            return
+        upserts = [(key, row[0], row[1]) for key, row in pending.items() if row is not None]
+        deletes = [(key,) for key, row in pending.items() if row is None]
+        try:
+            with self._db_lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)", upserts
+                )
+                self._db.executemany("DELETE FROM embeddings WHERE key = ?", deletes)
+                self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not write {len(pending)} entries to the embedding cache disk tier: {e}")
+
+    def _insert(self, key: str, vector: array, created_at: float) -> None:
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (created_at, vector)
+        self._bytes += self._entry_size(key, vector)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, vector = self._entries.pop(key)
+        self._bytes -= self._entry_size(key, vector)
+
+    @staticmethod
+    def _missing(keys: List[str], texts: List[str], vectors: List[Optional[List[float]]]) -> Dict[str, str]:
+        """Unique texts that still need to be embedded, in first-seen order."""
+        missing: Dict[str, str] = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        return missing
+
+    def _fill_many(self, keys, vectors, missing: Dict[str, str], embedded: List[List[float]]) -> List[List[float]]:
+        fresh = dict(zip(missing.keys(), embedded))
+        for key, vector in fresh.items():
+            self._put(key, vector)
+        return [vector if vector is not None else fresh[key] for key, vector in zip(keys, vectors)]
+
+    # --- Embeddings interface ---
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key("query", text)
+        vector = self._get_many([key])[0]
+        if vector is None:
+            EMBEDDING_TEXTS.inc(kind="query")
+            with EMBEDDING_SECONDS.time(kind="query"):
+                vector = self.underlying.embed_query(text)
+            self._put(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self._key("query", text)
+        vector = (await self._aget_many([key]))[0]
+        if vector is None:
+            EMBEDDING_TEXTS.inc(kind="query")
+            with EMBEDDING_SECONDS.time(kind="query"):
+                vector = await self.underlying.aembed_query(text)
+            self._put(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key("document", text) for text in texts]
+        vectors = self._get_many(keys)
+        missing = self._missing(keys, texts, vectors)
+        embedded = []
+        if missing:
+            EMBEDDING_TEXTS.inc(len(missing), kind="document")
+            with EMBEDDING_SECONDS.time(kind="document"):
+                embedded = self.underlying.embed_documents(list(missing.values()))
+        return self._fill_many(keys, vectors, missing, embedded)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key("document", text) for text in texts]
+        vectors = await self._aget_many(keys)
+        missing = self._missing(keys, texts, vectors)
+        embedded = []
+        if missing:
+            EMBEDDING_TEXTS.inc(len(missing), kind="document")
+            with EMBEDDING_SECONDS.time(kind="document"):
+                embedded = await self.underlying.aembed_documents(list(missing.values()))
+        return self._fill_many(keys, vectors, missing, embedded)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters and current size of the cache."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "model": self.model_name,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "disk_tier": self._db is not None,
+                "disk_pending_writes": len(self._pending_writes),
+            }
+
 
 # --- Initialize Embeddings Once ---
 # This is shared by all vector stores that use it.
-embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+embeddings = CachedEmbeddings(create_embeddings(), EMBEDDING_MODEL_NAME)
 
 def load_all_vector_stores():
     """
     Loads all defined FAISS vector stores into memory.
-    This function should be called once when the application starts.
+    This function should be called once when the application starts;
+    use `reload_vector_store` to pick up a new version afterwards.
     """
     logger.info("Starting to load all vector stores...")
     
-    if not os.environ.get("GOOGLE_API_KEY"):
+    if EMBEDDINGS_PROVIDER == "google" and not os.environ.get("GOOGLE_API_KEY"):
         os.environ["GOOGLE_API_KEY"] = getpass.getpass("Enter your Google API Key: ")
 
     for name, path in DB_PATHS.items():
         if not os.path.exists(path):
             logger.warning(f"Database path not found for '{name}' at '{path}'. Skipping.")
             continue
-        
+        if name in WAL_STORES:
+            _write_ahead_logs[name] = WriteAheadLog(path)
         try:
-            logger.info(f"Loading vector store for '{name}' from '{path}'...")
-            store = FAISS.load_local(
-                folder_path=path,
-                embeddings=embeddings,
-                allow_dangerous_deserialization=True
-            )
-            _vector_stores[name] = store
-            logger.info(f"Successfully loaded vector store for '{name}'.")
+            _install_store(name, _load_store(name))
         except Exception as e:
             logger.error(f"Failed to load vector store for '{name}' from '{path}': {e}")
+            continue
+
+
+def _load_store(name: str) -> Dict[str, Any]:
+    """
+    Loads the published version of a store, with its BM25 and device name
+    indexes, without touching the live state.
+    """
+    path = DB_PATHS[name]
+    folder = resolve_store_folder(path)
+    logger.info(f"Loading vector store for '{name}' from '{folder}'...")
+    if is_compact_store(folder):
+        # Memory-mapped index and lazily read documents
+        store = load_compact_store(folder, embeddings, writable=name in WAL_STORES)
+    else:
+        store = FAISS.load_local(
+            folder_path=folder,
+            embeddings=embeddings,
+            allow_dangerous_deserialization=True
+        )
+    # nprobe / efSearch are not saved with the index
+    apply_search_params(store.index)
+    loaded = {"store": store, "version": current_version(path), "bm25_index": None, "device_name_index": None}
+    if name in BM25_STORES:
+        loaded["bm25_index"] = _load_or_build_bm25_index(name, folder, store)
+    logger.info(f"Successfully loaded vector store for '{name}' ({store.index.ntotal} vectors).")
+    return loaded
+
+
+def _install_store(name: str, loaded: Dict[str, Any]) -> None:
+    """
+    Makes a loaded store the live one. Write-ahead log records that are not
+    in it yet are applied first, under the store lock, so no addition is
+    lost; searches already running keep using the previous objects.
+    """
+    global _device_name_index
+    with _store_locks[name]:
+        if name in _write_ahead_logs:
+            _replay_write_ahead_log(name, loaded["store"], loaded["bm25_index"])
+        if name == DEVICE_STORE:
+            # Built after the replay so it covers every document
+            device_name_index = _build_device_name_index(loaded["store"])
+            logger.info(f"Indexed {len(device_name_index)} device names for exact lookup.")
+        _vector_stores[name] = loaded["store"]
+        _store_versions[name] = loaded["version"]
+        if loaded["bm25_index"] is not None:
+            _bm25_indexes[name] = loaded["bm25_index"]
+        if name == DEVICE_STORE:
+            _device_name_index = device_name_index
+
+
+def reload_vector_store(name: str) -> Optional[str]:
+    """
+    Loads the currently published version of a store and atomically swaps it
+    in. This blocks while loading, so run it in a worker thread.
+
+    Returns:
+        The version now being served (None for the flat layout).
+    """
+    if name not in DB_PATHS:
+        raise ValueError(f"Unknown vector store '{name}'.")
+    with _publish_lock:
+        loaded = _load_store(name)
+        _install_store(name, loaded)
+    logger.info(f"Reloaded vector store '{name}' (version {loaded['version']}).")
+    return loaded["version"]
+
+
+def get_vector_store_info() -> Dict[str, Dict[str, Any]]:
+    """Returns the served version, size and saved versions of every store."""
+    return {
+        name: {
+            "loaded": name in _vector_stores,
+            "version": _store_versions.get(name),
+            "published_version": current_version(path),
+            "available_versions": list_versions(path),
+            "vectors": _vector_stores[name].index.ntotal if name in _vector_stores else 0,
+            "pending_wal_records": _write_ahead_logs[name].pending_records if name in _write_ahead_logs else 0,
+        }
+        for name, path in DB_PATHS.items()
+    }
+
+
+def _ordered_doc_ids(store: FAISS) -> List[str]:
+    """
+    Returns the docstore ids of a FAISS store in index position order.
+    """
+    return [store.index_to_docstore_id[i] for i in range(store.index.ntotal)]
+
+
+def _replay_write_ahead_log(name: str, store: FAISS, bm25_index: Optional[BM25Index]) -> None:
+    """
+    Re-applies the runtime additions logged since the last snapshot. Records
+    already in the store (e.g. from a snapshot that finished but did not get
+    to delete its log) are skipped.
+    """
+    known_ids = set(store.index_to_docstore_id.values())
+    records = [r for r in _write_ahead_logs[name].replay() if r["id"] not in known_ids]
+    if not records:
+        return
+    _add_records(store, bm25_index, records)
+    logger.info(f"Replayed {len(records)} write-ahead log records into '{name}'.")
+
+
+def _add_records(store: FAISS, bm25_index: Optional[BM25Index], records: List[Dict[str, Any]]) -> List[str]:
+    """Adds pre-embedded records to a FAISS store and its BM25 index."""
+    doc_ids = store.add_embeddings(
+        [(r["page_content"], r["vector"]) for r in records],
+        metadatas=[r["metadata"] for r in records],
+        ids=[r["id"] for r in records],
+    )
+    if bm25_index is not None:
+        bm25_index.add_documents(doc_ids, [r["page_content"] for r in records])
+    return doc_ids
+
+
+def _load_or_build_bm25_index(name: str, path: str, store: FAISS) -> BM25Index:
+    """
+    Loads the persisted BM25 index for a store, rebuilding (and re-saving) it
+    when it is missing or no longer matches the documents in the FAISS index.
+    """
+    doc_ids = _ordered_doc_ids(store)
+    index = BM25Index.load(path)
+    if index is not None and index.doc_ids == doc_ids:
+        logger.info(f"Loaded BM25 index for '{name}' ({len(index)} documents).")
+        return index
+
+    logger.info(f"Building BM25 index for '{name}' from {len(doc_ids)} documents...")
+    index = BM25Index()
+    texts = [getattr(store.docstore.search(doc_id), "page_content", "") for doc_id in doc_ids]
+    index.add_documents(doc_ids, texts)
+    try:
+        index.save(path)
+    except OSError as e:
+        logger.warning(f"Could not persist BM25 index for '{name}' to '{path}': {e}")
+    return index
+
+
+def normalize_device_name(name: str) -> str:
+    """
+    Canonical form of a device name, e.g. " `Trigger_Device` " -> "trigger_device".
+    """
+    name = name.strip().strip("`'\"").strip().lower()
+    if name.startswith(DEVICE_NAME_PREFIX.lower()):
+        name = name[len(DEVICE_NAME_PREFIX):].strip()
+    return "_".join(name.replace("-", " ").split())
+
+
+def _build_device_name_index(store: FAISS) -> Dict[str, str]:
+    """
+    Maps every normalized device name to the docstore id of its document.
+    """
+    index = {}
+    for doc_id in _ordered_doc_ids(store):
+        doc = store.docstore.search(doc_id)
+        page_content = getattr(doc, "page_content", "")
+        if page_content.startswith(DEVICE_NAME_PREFIX):
+            index.setdefault(normalize_device_name(page_content), doc_id)
+    return index
+
+
+def get_device_document(device_name: str) -> Optional[Any]:
+    """
+    Looks up a device document by exact (normalized) name without any
+    embedding or vector search. Returns None for unknown names.
+    """
+    doc_id = _device_name_index.get(normalize_device_name(device_name))
+    store = _vector_stores.get(DEVICE_STORE)
+    if doc_id is None or store is None:
+        return None
+    doc = store.docstore.search(doc_id)
+    return doc if hasattr(doc, "page_content") else None
+
 
 def get_vector_store(name: str) -> Optional[FAISS]:
     """
     Retrieves a pre-loaded vector store by its name.
     """
-    return _vector_stores.get(name)
\ No newline at end of file
+    return _vector_stores.get(name)
+
+
+def get_bm25_index(name: str) -> Optional[BM25Index]:
+    """
+    Retrieves the pre-built BM25 index of a vector store by its name.
+    """
+    return _bm25_indexes.get(name)
+
+
+def get_embedding_cache_stats() -> Dict[str, Any]:
+    """
+    Returns the hit/miss counters of the shared query-embedding cache.
+    """
+    return embeddings.stats()
+
+
+def _log_documents(name: str, documents: List[Document], vectors: List[List[float]]):
+    """
+    Durably appends already-embedded documents to a store's write-ahead log.
+    This waits on the fsync and on a running snapshot, so it runs in a worker
+    thread. Returns the live store it was logged against and the records.
+    """
+    if name not in _vector_stores or name not in _write_ahead_logs:
+        raise ValueError(f"Vector store '{name}' is not loaded or does not accept additions.")
+    if len(documents) != len(vectors):
+        raise ValueError("Expected one vector per document.")
+
+    records = [
+        {"id": uuid.uuid4().hex, "page_content": doc.page_content, "metadata": doc.metadata, "vector": list(vector)}
+        for doc, vector in zip(documents, vectors)
+    ]
+    with _store_locks[name]:
+        _write_ahead_logs[name].append(records)
+        # Logged but not in memory yet: snapshots wait until they are applied
+        _unapplied_records[name] += len(records)
+        return _vector_stores[name], records
+
+
+def _apply_logged_documents(name: str, logged_store: FAISS, records: List[Dict[str, Any]]) -> List[str]:
+    """Adds logged records to the live store. The caller holds the store lock."""
+    _unapplied_records[name] -= len(records)
+    store = _vector_stores[name]
+    if store is not logged_store:
+        # A reload swapped the store in between and replayed the log into it
+        known_ids = set(store.index_to_docstore_id.values())
+        if all(r["id"] in known_ids for r in records):
+            return [r["id"] for r in records]
+        records = [r for r in records if r["id"] not in known_ids]
+    return _add_records(store, _bm25_indexes.get(name), records)
+
+
+async def append_documents(name: str, documents: List[Document], vectors: List[List[float]]) -> List[str]:
+    """
+    Appends already-embedded documents to a live store.
+
+    The records are written to the store's write-ahead log first, in a worker
+    thread, and then added to the in-memory FAISS index and BM25 index on the
+    event loop. Searches run on the loop without the store lock, so the index
+    and the docstore are never seen half updated; the lock is only awaited,
+    never blocked on, so a running snapshot does not stall the loop.
+
+    Returns:
+        The docstore ids of the new documents.
+    """
+    loop = asyncio.get_running_loop()
+    logged_store, records = await loop.run_in_executor(None, _log_documents, name, documents, vectors)
+
+    lock = _store_locks[name]
+    while not lock.acquire(blocking=False):
+        await asyncio.sleep(STORE_LOCK_POLL_SECONDS)
+    try:
+        doc_ids = _apply_logged_documents(name, logged_store, records)
+    finally:
+        lock.release()
+    if _write_ahead_logs[name].pending_records >= KB_SNAPSHOT_MAX_PENDING:
+        _snapshot_wakeup.set()
+    return doc_ids
+
+
+def _write_atomically(path: str, data: bytes) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def snapshot_vector_store(name: str) -> bool:
+    """
+    Saves a store (and its BM25 index) to disk as a new published version in
+    the compact memory-mappable format, and drops the write-ahead log records
+    it now contains. The index is copied under the store lock; the slow file
+    writes happen outside it.
+
+    Returns:
+        True if a snapshot was written.
+    """
+    with _publish_lock:
+        return _snapshot_vector_store(name)
+
+
+def _snapshot_vector_store(name: str) -> bool:
+    wal = _write_ahead_logs.get(name)
+    if name not in _vector_stores or wal is None:
+        return False
+    path = DB_PATHS[name]
+    if _store_versions.get(name) != current_version(path):
+        # A rebuilt version was published but is not loaded yet; the log is
+        # replayed on top of it by the reload instead.
+        logger.info(f"Skipping snapshot of '{name}': a newer version is waiting to be reloaded.")
+        return False
+
+    faiss = dependable_faiss_import()
+    with _store_locks[name]:
+        if _unapplied_records[name]:
+            # The log holds records the index does not have yet; the next
+            # round picks them up once they are applied.
+            logger.info(f"Skipping snapshot of '{name}': an addition is being applied.")
+            return False
+        store = _vector_stores[name]
+        if not wal.rotate():
+            return False
+        ntotal = store.index.ntotal
+        index_bytes = faiss.serialize_index(store.index).tobytes()
+        # Documents are never changed once added, so they can be written
+        # out after the lock is released.
+        doc_ids = _ordered_doc_ids(store)
+        bm25_index = _bm25_indexes.get(name)
+        bm25_bytes = pickle.dumps(bm25_index) if bm25_index is not None else None
+
+    try:
+        version, folder = new_version_folder(path)
+        _write_atomically(os.path.join(folder, INDEX_FILENAME), index_bytes)
+        write_compact_docstore(folder, doc_ids, store.docstore)
+        if bm25_bytes is not None:
+            _write_atomically(os.path.join(folder, BM25_INDEX_FILENAME), bm25_bytes)
+        publish_version(path, version)
+    except OSError as e:
+        # The rotated log is kept and replayed (or retried) later.
+        logger.error(f"Failed to snapshot vector store '{name}': {e}")
+        return False
+    wal.commit_rotation()
+    with _store_locks[name]:
+        if _vector_stores.get(name) is store:
+            _store_versions[name] = version
+    logger.info(f"Snapshot '{version}' of '{name}' saved ({ntotal} vectors).")
+    return True
+
+
+def snapshot_all_vector_stores() -> None:
+    """Snapshots every store with pending write-ahead log records."""
+    for name, wal in list(_write_ahead_logs.items()):
+        if wal.pending_records or os.path.exists(wal.rotated_path):
+            snapshot_vector_store(name)
+
+
+def _snapshot_worker(interval_seconds: float) -> None:
+    while not _snapshot_stop.is_set():
+        _snapshot_wakeup.wait(interval_seconds)
+        _snapshot_wakeup.clear()
+        if _snapshot_stop.is_set():
+            break
+        try:
+            snapshot_all_vector_stores()
+        except Exception as e:
+            logger.error(f"Background snapshot failed: {e}", exc_info=True)
+
+
+def start_snapshot_worker(interval_seconds: float = KB_SNAPSHOT_INTERVAL_SECONDS) -> None:
+    """Starts the background thread that periodically snapshots the stores."""
+    global _snapshot_thread
+    if _snapshot_thread is not None and _snapshot_thread.is_alive():
+        return
+    _snapshot_stop.clear()
+    _snapshot_thread = threading.Thread(
+        target=_snapshot_worker, args=(interval_seconds,), name="kb-snapshot", daemon=True
+    )
+    _snapshot_thread.start()
+
+
+def stop_snapshot_worker() -> None:
+    """Stops the snapshot thread and writes a final snapshot."""
+    global _snapshot_thread
+    _snapshot_stop.set()
+    _snapshot_wakeup.set()
+    if _snapshot_thread is not None:
+        _snapshot_thread.join()
+        _snapshot_thread = None
+    snapshot_all_vector_stores()
@@ -0,0 +1,85 @@
+# vector_store_versions.py
+# ==============================================================================
+# Versioned on-disk layout for the FAISS vector stores.
+# ==============================================================================
+# Every snapshot or rebuild of a store is written to its own folder under
+# "<store>/versions/<version>" and only then published by atomically
+# replacing the "<store>/CURRENT" pointer file, so a reader never sees a
+# half-written index. Stores without a CURRENT file are read from the store
+# folder itself (the original flat layout).
+
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIRNAME = "versions"
+CURRENT_FILENAME = "CURRENT"
+KEEP_VERSIONS = int(os.getenv("VECTOR_STORE_KEEP_VERSIONS", "3"))
+
+
+def current_version(store_path: str) -> Optional[str]:
+    """Returns the published version of a store, or None for the flat layout."""
+    try:
+        with open(os.path.join(store_path, CURRENT_FILENAME), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def resolve_store_folder(store_path: str) -> str:
+    """Returns the folder holding the files of the published version."""
+    version = current_version(store_path)
+    if version is None:
+        return store_path
+    folder = os.path.join(store_path, VERSIONS_DIRNAME, version)
+    if not os.path.isdir(folder):
+        logger.warning(f"Published version '{version}' of '{store_path}' is missing. Using the flat layout.")
+        return store_path
+    return folder
+
+
+def new_version_folder(store_path: str) -> Tuple[str, str]:
+    """
+    Creates an empty folder for a new version.
+
+    Returns:
+        `(version, folder)`. Versions sort by creation time.
+    """
+    now = time.time()
+    version = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}.{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:6]}"
+    folder = os.path.join(store_path, VERSIONS_DIRNAME, version)
+    os.makedirs(folder)
+    return version, folder
+
+
+def publish_version(store_path: str, version: str, keep: int = KEEP_VERSIONS) -> None:
+    """
+    Atomically makes a version the current one, then deletes the oldest
+    versions beyond `keep`.
+    """
+    pointer = os.path.join(store_path, CURRENT_FILENAME)
+    tmp_pointer = pointer + ".tmp"
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, pointer)
+    logger.info(f"Published version '{version}' of '{store_path}'.")
+
+    for old_version in list_versions(store_path)[:-max(1, keep)]:
+        if old_version != version:
+            shutil.rmtree(os.path.join(store_path, VERSIONS_DIRNAME, old_version), ignore_errors=True)
+
+
+def list_versions(store_path: str) -> List[str]:
+    """Returns the saved versions of a store, oldest first."""
+    versions_dir = os.path.join(store_path, VERSIONS_DIRNAME)
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted(name for name in os.listdir(versions_dir) if os.path.isdir(os.path.join(versions_dir, name)))